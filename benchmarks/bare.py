@@ -0,0 +1,18 @@
+# the modules benchmarked here do not need octoprint -- the plugin's __init__
+# does, so they are loaded from a bare package instead
+import importlib
+import os
+import sys
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = "octoprint_bettergrblsupport"
+
+if not PACKAGE in sys.modules:
+    package = types.ModuleType(PACKAGE)
+    package.__path__ = [os.path.join(ROOT, PACKAGE)]
+    sys.modules[PACKAGE] = package
+
+
+def load(name):
+    return importlib.import_module(PACKAGE + "." + name)
@@ -0,0 +1,96 @@
+# seconds to scan a file for its extents -- the old line by line regexes, the
+# mmap scanner and the parallel scanner (whatever the file's size)
+#
+# python benchmarks/bench_extents.py [file.gcode]
+#
+import mmap
+import os
+import re
+import sys
+import tempfile
+
+from timeit import default_timer as timer
+
+import bare
+
+extents = bare.load("extents")
+
+
+def legacy_scan(path, positioning=0):
+    minX = minY = float("inf")
+    maxX = maxY = float("-inf")
+    x = y = float(0)
+    lastGCommand = ""
+
+    with open(path, "r") as f:
+        for line in f:
+            if line.upper().lstrip().startswith((";", "(", "%")): continue
+
+            if line.upper().lstrip().startswith("G"):
+                lastGCommand = line.lstrip()[:3] if line.lstrip()[2:3].isnumeric() else line.lstrip()[:2]
+
+            if line.upper().lstrip().startswith(("X", "Y", "Z")):
+                command = lastGCommand.upper() + " " + line.upper().strip()
+            else:
+                command = line.upper().strip()
+
+            if not command.upper().lstrip().startswith("G") or "G53" in command.upper():
+                continue
+
+            if "G90" in command.upper(): positioning = 0
+            if "G91" in command.upper(): positioning = 1
+
+            match = re.search(r".*[X]\ *(-?[\d.]+).*", command)
+            if not match is None:
+                x = float(match.groups(1)[0]) if positioning == 0 else x + float(match.groups(1)[0])
+                minX = min(minX, x)
+                maxX = max(maxX, x)
+
+            match = re.search(r".*[Y]\ *(-?[\d.]+).*", command)
+            if not match is None:
+                y = float(match.groups(1)[0]) if positioning == 0 else y + float(match.groups(1)[0])
+                minY = min(minY, y)
+                maxY = max(maxY, y)
+
+    return minX, maxX, minY, maxY
+
+
+def parallel_scan(path, workers):
+    # scan() only goes parallel past PARALLEL_SIZE -- this always does
+    result = extents.Extents()
+
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            extents.scan_parallel(path, mm, result, workers)
+
+    return result
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        path = sys.argv[1]
+    else:
+        # a laser raster -- the worst case for the old scanner
+        f = tempfile.NamedTemporaryFile("w", suffix=".gcode", delete=False)
+        f.write("; raster\nG21\nG90\nM4 S0\n")
+        for row in range(2000):
+            f.write("G0 X0 Y{:.2f}\n".format(row * .1))
+            for col in range(100):
+                f.write("G1 X{:.2f} S{}\n".format(col * .5 if row % 2 == 0 else 50 - col * .5, (row * col) % 1000))
+        f.write("M5\nG0 X0 Y0\n")
+        f.close()
+        path = f.name
+
+    start = timer()
+    legacy = legacy_scan(path)
+    elapsed = timer() - start
+    print("{:>14}: {:>8.3f}s {}".format("legacy regex", elapsed, legacy))
+
+    for name, scan in (("mmap scanner", lambda path: extents.scan(path, workers=1)),
+                       ("parallel", lambda path: parallel_scan(path, os.cpu_count() or 1))):
+        start = timer()
+        result = scan(path)
+        elapsed = timer() - start
+        print("{:>14}: {:>8.3f}s {}".format(name, elapsed, result.bounds()))
+
+    print("width=[{}] length=[{}] origin=[{}] lines=[{}]".format(result.width(), result.length(), result.origin(), result.lines))
@@ -0,0 +1,37 @@
+# reports/sec of the split based status parser against the regexes it replaced
+#
+# python benchmarks/bench_status.py
+#
+import re
+
+from timeit import default_timer as timer
+
+import bare
+
+status = bare.load("status")
+
+
+def legacy_parse(msg):
+    match = re.search(r'<(-?[^,]+)[,|][WM]Pos:(-?[\d\.]+),(-?[\d\.]+),(-?[\d\.]+),?(-?[\d\.]+)?,?(-?[\d\.]+)?', msg)
+    response = 'X:{1} Y:{2} Z:{3} E:0 {original}'.format(*match.groups(), original=msg)
+    re.search(r'.*\|Pn:([XYZABPDHRS]+)', msg)
+    re.search(r'.*\|FS:(-?[\d\.]+),(-?[\d\.]+)', msg)
+
+    return response
+
+
+if __name__ == "__main__":
+    reports = []
+    for i in range(20000):
+        reports.append("<Run|MPos:{:.3f},{:.3f},-1.000|Bf:15,128|Ln:{}|FS:3000,{}>".format(i * .1, (i % 400) * .1, i, i % 1000))
+        reports.append("<Run|MPos:{:.3f},{:.3f},-1.000,0.000|Bf:12,100|FS:3000,{}|WCO:10.000,10.000,0.000,0.000>".format(i * .1, (i % 400) * .1, i % 1000))
+        reports.append("<Hold:0|WPos:{:.3f},{:.3f},0.000|FS:0,0|Pn:Z|Ov:100,100,100|A:S>".format(i * .1, (i % 400) * .1))
+
+    parser = status.StatusParser()
+
+    for name, parse in (("legacy regex", legacy_parse), ("split parser", parser.parse)):
+        start = timer()
+        for report in reports:
+            parse(report)
+        elapsed = timer() - start
+        print("{:>14}: {:>10.0f} reports/sec".format(name, len(reports) / elapsed))
@@ -0,0 +1,55 @@
+# lines/sec of the tokenizer against the regexes it replaced
+#
+# python benchmarks/bench_tokenizer.py
+#
+import re
+
+from timeit import default_timer as timer
+
+import bare
+
+tokenizer = bare.load("tokenizer")
+
+
+def legacy_parse(cmd):
+    values = {}
+    for letter in ("X", "Y", "Z", "A", "B", "F", "S"):
+        match = re.search(r".*[{}{}]\ *(-?[\d.]+).*".format(letter, letter.lower()), cmd)
+        if match:
+            values[letter] = float(match.groups(1)[0])
+
+    cmd.upper().startswith("G")
+    cmd.upper().startswith(("X", "Y", "Z"))
+    "G90" in cmd.upper()
+    "G91" in cmd.upper()
+
+    return values
+
+
+def tokenized_parse(cmd):
+    line = tokenizer.tokenize(cmd)
+    values = {}
+    for letter in ("X", "Y", "Z", "A", "B", "F", "S"):
+        value = line.get(letter)
+        if value is not None:
+            values[letter] = value
+
+    line.first()
+    line.codes("G")
+
+    return values
+
+
+if __name__ == "__main__":
+    lines = []
+    for i in range(20000):
+        lines.append("G1 X{:.3f} Y{:.3f} S{} F3000".format(i * .1, (i % 400) * .1, i % 1000))
+        lines.append("X{:.3f} S0".format(i * .1 + .05))
+        lines.append("G0 X{:.3f} Y{:.3f}".format(i * .1, (i % 400) * .1 + .1))
+
+    for name, parse in (("legacy regex", legacy_parse), ("tokenizer", tokenized_parse)):
+        start = timer()
+        for line in lines:
+            parse(line)
+        elapsed = timer() - start
+        print("{:>14}: {:>10.0f} lines/sec".format(name, len(lines) / elapsed))
@@ -0,0 +1,34 @@
+# lines/sec of the offline validator
+#
+# python benchmarks/bench_validator.py [file.gcode]
+#
+import sys
+import tempfile
+
+from timeit import default_timer as timer
+
+import bare
+
+validator = bare.load("validator")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        path = sys.argv[1]
+    else:
+        with tempfile.NamedTemporaryFile("w", suffix=".gcode", delete=False) as f:
+            f.write("G21 G90 G54\nM3 S1000\nG0 X0 Y0 Z5\nG1 Z-1 F300\n")
+            for i in range(200000):
+                if i % 50 == 49:
+                    # a half circle to the right of wherever we are
+                    f.write("G2 X{:.3f} Y{:.3f} I5 J0 F800\n".format((i - 1) * .1 + 10, (i - 1) * .05))
+                else:
+                    f.write("G1 X{:.3f} Y{:.3f} S{}\n".format(i * .1, i * .05, i % 1000))
+            f.write("G0 Z5\nM5\nM30\n")
+            path = f.name
+
+    start = timer()
+    checker = validator.validate(path)
+    elapsed = timer() - start
+
+    print("{} lines in {:.3f}s ({:.0f} lines/sec) -- {} errors {}".format(checker.lines, elapsed, checker.lines / elapsed, len(checker.errors), checker.errors[:10]))
@@ -28,18 +28,34 @@
 #
 from __future__ import absolute_import
 from pydoc import Helper
-from octoprint.events import Events
 from shutil import copyfile
 
 from . import _bgs
+from . import overrides
+from . import tokenizer
+from .router import CommandRouter
+from .streaming import CharacterCountingStreamer
+from .realtime import RealtimeWriter
+from .status import StatusParser
+from .telemetry import TelemetryPublisher
+from .poller import StatusPoller
+from .cmdqueue import CommandQueue
+from .executor import Executor
+from .metadata import MetadataScheduler
+from .cache import AnalysisCache
+from .preprocessor import UploadAnalyzer
+from .analysis import GrblAnalysisQueue
+from .progress import ProgressTracker, GrblPrintTimeEstimator
+from . import resume
+from .journal import JobJournal
+from . import preflight
+from .checkmode import CheckModeVerifier
 
 import octoprint.plugin
 
 import sys
 import os
 import time
-import subprocess
-import threading
 
 import re
 import logging
@@ -67,10 +83,8 @@ class BetterGrblSupportPlugin(octoprint.plugin.SettingsPlugin,
         self.positionCommand = "?"
         self.suppressM114 = True
         self.suppressM400 = True
-        self.suppressM105 = True
         self.suppressM115 = True
         self.suppressM110 = True
-        self.disablePolling = True
         self.disableModelSizeDetection = True
         self.neverSendChecksum = True
         self.reOrderSidebar = True
@@ -99,8 +113,6 @@ class BetterGrblSupportPlugin(octoprint.plugin.SettingsPlugin,
         self.coolant = "M9"
         self.grblCoordinateSystem = "G54"
 
-        self.timeRef = 0
-
         self.grblErrors = {}
         self.grblAlarms = {}
         self.grblSettingsNames = {}
@@ -110,7 +122,13 @@ class BetterGrblSupportPlugin(octoprint.plugin.SettingsPlugin,
         self.ignoreErrors = False
         self.doSmoothie = False
 
-        self.grblCmdQueue = []
+        self.grblCmdQueue = CommandQueue(self)
+        self.executor = Executor(self)
+        self.metadataScheduler = MetadataScheduler(self, _bgs.defer_generate_metadata_for_file)
+        self.analysisCache = AnalysisCache(self)
+        self.uploadAnalyzer = UploadAnalyzer(self)
+        self.progressTracker = ProgressTracker(self)
+        self.journal = JobJournal(self)
         self.notifications = []
 
         self.grblVersion = "unknown"
@@ -123,6 +141,19 @@ class BetterGrblSupportPlugin(octoprint.plugin.SettingsPlugin,
         self.plungeRate = float(0)
         self.powerRate = float(0)
 
+        # feed, rapid, spindle (as last reported by Ov:)
+        self.grblOverrides = [100, 100, 100]
+        # nothing is confirmed until grbl reports Ov: itself
+        self.grblOverridesConfirmed = [False, False, False]
+
+        self.statusParser = StatusParser()
+        self.grblStatus = None
+
+        self.telemetryWindow = 100
+        self.telemetry = TelemetryPublisher(self, self.telemetryWindow / 1000)
+
+        self.statusPoller = StatusPoller(self)
+
         self.autoSleep = False
         self.autoSleepInterval = 20
 
@@ -142,6 +173,9 @@ class BetterGrblSupportPlugin(octoprint.plugin.SettingsPlugin,
         self.pausedPower = 0
         self.pausedPositioning = 0
 
+        self.resumePreamble = None
+        self.resumeLine = 0
+
         self.trackedCmds = ["$CD", "$CONFIG/DUMP", "$$", "$+", "$S", "M115", "$SETTINGS/LIST", "$I", "$BUILD/INFO", "$G", "$GCODE/MODES", "$#"]
         self.lastRequest = []
         self.lastResponse = ""
@@ -164,6 +198,16 @@ class BetterGrblSupportPlugin(octoprint.plugin.SettingsPlugin,
 
         self.offsets = {}
 
+        self.commandRouter = CommandRouter(self)
+
+        self.streamingMode = False
+        self.streamer = CharacterCountingStreamer(self)
+        self.realtime = RealtimeWriter(self)
+        self.checkMode = CheckModeVerifier(self)
+
+        self.optimizeUploads = False
+        self.simplifyTolerance = 0.0
+
         self.bgs_filters = [
             {"name": "Suppress status report requests", "regex": "^Send: \\?$"},
             {"name": "Suppress acknowledgement responses", "regex": "^Recv: ok$"},
@@ -193,7 +237,7 @@ class BetterGrblSupportPlugin(octoprint.plugin.SettingsPlugin,
 
         self.bgsFilters = self.bgs_filters
 
-        self.settingsVersion = 8
+        self.settingsVersion = 9
         self.wizardVersion = 19
         
         self.whenConnected = time.time()
@@ -217,10 +261,8 @@ class BetterGrblSupportPlugin(octoprint.plugin.SettingsPlugin,
             positionCommand = "?",
             suppressM114 = True,
             suppressM400 = True,
-            suppressM105 = True,
             suppressM115 = True,
             suppressM110 = True,
-            disablePolling = True,
             frame_length = 100,
             frame_width = 100,
             frame_origin = None,
@@ -276,7 +318,14 @@ class BetterGrblSupportPlugin(octoprint.plugin.SettingsPlugin,
             originOffsets = False,
             originXOffset = 0.0,
             originYOffset = 0.0,
-            originZOffset = 0.0
+            originZOffset = 0.0,
+            streamingMode = False,
+            streamingAckMax = None,
+            optimizeUploads = False,
+            simplifyTolerance = 0.0,
+            telemetryWindow = 100,
+            statusPollActive = 200,
+            statusPollIdle = 2000
         )
 
 
@@ -311,12 +360,10 @@ class BetterGrblSupportPlugin(octoprint.plugin.SettingsPlugin,
         self.statusCommand = self._settings.get(["statusCommand"])
         self.dwellCommand = self._settings.get(["dwellCommand"])
         self.positionCommand = self._settings.get(["positionCommand"])
-        self.suppressM105 = self._settings.get_boolean(["suppressM105"])
         self.suppressM114 = self._settings.get_boolean(["suppressM114"])
         self.suppressM115 = self._settings.get_boolean(["suppressM115"])
         self.suppressM110 = self._settings.get_boolean(["suppressM110"])
         self.suppressM400 = self._settings.get_boolean(["suppressM400"])
-        self.disablePolling = self._settings.get_boolean(["disablePolling"])
 
         self.disableModelSizeDetection = self._settings.get_boolean(["disableModelSizeDetection"])
         self.neverSendChecksum = self._settings.get_boolean(["neverSendChecksum"])
@@ -330,6 +377,24 @@ class BetterGrblSupportPlugin(octoprint.plugin.SettingsPlugin,
 
         self.ignoreErrors = self._settings.get(["ignoreErrors"])
         self.doSmoothie = self._settings.get(["doSmoothie"])
+        self.streamingMode = self._settings.get_boolean(["streamingMode"])
+        self.optimizeUploads = self._settings.get_boolean(["optimizeUploads"])
+        self.simplifyTolerance = float(self._settings.get(["simplifyTolerance"]))
+
+        # grbl_state updates are merged over this many milliseconds
+        self.telemetryWindow = int(self._settings.get(["telemetryWindow"]))
+        self.telemetry.window = self.telemetryWindow / 1000
+        self.telemetry.start()
+
+        # status report rates (milliseconds) while moving / sitting idle
+        self.statusPoller.activeInterval = int(self._settings.get(["statusPollActive"])) / 1000
+        self.statusPoller.idleInterval = int(self._settings.get(["statusPollIdle"])) / 1000
+        self.statusPoller.start()
+
+        # did the last job get cut short?
+        interrupted = self.journal.recover()
+        if not interrupted is None:
+            _bgs.add_notifications(self, ["Job [{}] was interrupted at line {}".format(interrupted["path"], interrupted["line"])])
 
         self.weakLaserValue = float(self._settings.get(["weakLaserValue"]))
         self.framingPercentOfMaxSpeed = float(self._settings.get(["framingPercentOfMaxSpeed"]))
@@ -345,6 +410,17 @@ class BetterGrblSupportPlugin(octoprint.plugin.SettingsPlugin,
         self._settings.global_set_boolean(["feature", "modelSizeDetection"], not self.disableModelSizeDetection)
         self._settings.global_set_boolean(["feature", "sdSupport"], False)
         self._settings.global_set_boolean(["serial", "neverSendChecksum"], self.neverSendChecksum)
+        # streaming hands octoprint an extra "ok" per line -- it needs room to bank it.
+        # whatever the user had is put back once streaming is turned off again
+        savedAckMax = self._settings.get(["streamingAckMax"])
+
+        if self.streamingMode:
+            if savedAckMax is None:
+                self._settings.set(["streamingAckMax"], self._settings.global_get_int(["serial", "ackMax"]))
+            self._settings.global_set_int(["serial", "ackMax"], 2)
+        elif not savedAckMax is None:
+            self._settings.global_set_int(["serial", "ackMax"], int(savedAckMax))
+            self._settings.set(["streamingAckMax"], None)
 
         self.autoSleep = self._settings.get_boolean(["autoSleep"])
         self.autoSleepInterval = round(float(self._settings.get(["autoSleepInterval"])))
@@ -501,6 +577,9 @@ class BetterGrblSupportPlugin(octoprint.plugin.SettingsPlugin,
 
         _bgs.load_grbl_settings(self)
 
+        # settings and firmware dependent routes
+        self.commandRouter.rebuild()
+
     def get_settings_version(self):
         self._logger.debug("__init__: get_settings_version")
         return self.settingsVersion
@@ -546,6 +625,8 @@ class BetterGrblSupportPlugin(octoprint.plugin.SettingsPlugin,
             self._settings.remove(["showZ"])
             self._settings.remove(["distance"])
             self._settings.remove(["customControls"])
+            self._settings.remove(["suppressM105"])
+            self._settings.remove(["disablePolling"])
 
             self._settings.save()
             self._logger.info("Migrated to settings v%d from v%d", target, 1 if current == None else current)
@@ -631,7 +712,7 @@ class BetterGrblSupportPlugin(octoprint.plugin.SettingsPlugin,
                         self._printer.commands("$+" if _bgs.is_grbl_esp32(self) else "$$")
 
         # resume status requests (after 10 seconds)
-        threading.Thread(target=_bgs.defer_resuming_status_reports, args=(self, 10, "fluidYaml" in data or "fluidSettings" in data)).start()
+        _bgs.defer_resuming_status_reports(self, 10, "fluidYaml" in data or "fluidSettings" in data)
 
     # #~~ AssetPlugin mixin
     def get_assets(self):
@@ -697,408 +778,225 @@ class BetterGrblSupportPlugin(octoprint.plugin.SettingsPlugin,
         )
 
 
-    # #-- gcode sending hook
-    def hook_gcode_sending(self, comm_instance, phase, cmd, cmd_type, gcode, *args, **kwargs):
-        self._logger.debug("__init__: hook_gcode_sending phase=[{}] cmd=[{}] cmd_type=[{}] gcode=[{}]".format(phase, cmd, cmd_type, gcode))
+    # #-- file preprocessor hook
+    def hook_file_preprocessor(self, path, file_object, links=None, printer_profile=None, allow_overwrite=False, *args, **kwargs):
         # let's only do stuff if our profile is selected
         if self._printer_profile_manager.get_current_or_default()["id"] != "_bgs":
             return None
 
-        cmd = cmd.lstrip("\r").lstrip("\n").rstrip("\r").rstrip("\n")
-
-        # suppress temperature if machine is printing
-        if "M105" in cmd.upper() or cmd.startswith(self.statusCommand):
-            if (self.disablePolling and self._printer.is_printing()) or len(self.lastRequest) > 0 or self.noStatusRequests:
-                self._logger.debug('Ignoring %s', cmd)
-                return (None, )
-            else:
-                if self.suppressM105:
-                    # go to sleep if autosleep and now - last > interval
-                    # self._logger.debug("autosleep enabled={} interval={} timer={} time={} diff={}".format(self.autoSleep, self.autoSleepInterval, self.autoSleepTimer, time.time(), time.time() - self.autoSleepTimer))
-                    if self.autoSleep and time.time() - self.autoSleepTimer > self.autoSleepInterval * 60:
-                        if self.grblState.upper() != "SLEEP" and self._printer.is_operational() and not self._printer.is_printing():
-                            _bgs.queue_cmds_and_send(self, ["$SLP"])
-                        else:
-                            self._logger.debug("resetting autosleep timer")
-                            self.autoSleepTimer = time.time()
+        return self.uploadAnalyzer.wrap(path, file_object)
 
-                    self._logger.debug('Rewriting M105 as %s' % self.statusCommand)
-                    return (self.statusCommand, )
-
-        self.autoSleepTimer = time.time()
-
-        # forward on BGS_MULTIPOINT_ZPROBE_MOVE events to _bgs
-        if "BGS_MULTIPOINT_ZPROBE_MOVE" in cmd:
-            _bgs.multipoint_zprobe_move(self)
-            return (None, )
-
-        # hack for unacknowledged grbl commmands
-        if "$H" in cmd.upper() or "G38.2" in cmd.upper():
-            # threading.Thread(target=_bgs.do_fake_ack, args=(self._printer, self._logger)).start()
-            # self._logger.debug("fake_ack submitted")
-            self.grblState = "Home" if "$H" in cmd.upper() else "Run"
-            self._plugin_manager.send_plugin_message(self._identifier, dict(type="grbl_state", state="Run"))
-
-        # suppress comments and extraneous commands that may cause wayward
-        # grbl instances to error out
-        if cmd.upper().startswith((";", "(", "%")):
-            self._logger.debug('Ignoring extraneous [%s]', cmd)
-            return (None, )
-
-        # suppress reset line #s
-        if self.suppressM110 and cmd.upper().startswith('M110'):
-            self._logger.debug('Ignoring %s', cmd)
-
-            if self.connectionState == Events.CONNECTING and not self.handshakeSent:
-                self._logger.debug("sending initial handshake")
-                self.handshakeSent = True
-                cmd = "\n\n\x18"
-            else:
-                return (None, )
 
-        # suppress initialize SD - M21
-        if cmd.upper().startswith('M21'):
-            self._logger.debug('Ignoring %s', cmd)
-            return (None,)
-
-        # ignore all of these -- they do not apply to GRBL
-        # M108 (heater off)
-        # M84 (disable motors)
-        # M104 (set extruder temperature)
-        # M140 (set bed temperature)
-        # M106 (fan on/off)
-        # N -- suggests a line number and we don't roll like that
-        if cmd.upper().startswith(("M108", "M84", "M104", "M140", "M106", "N")):
-            self._logger.debug("ignoring [%s]", cmd)
-            return (None, )
-
-        # forward on coordinate system change
-        if cmd.upper() in ("G54", "G55", "G56", "G57", "G58", "G59"):
-            self.grblCoordinateSystem = cmd.upper()
-            self._plugin_manager.send_plugin_message(self._identifier, dict(type="grbl_state", coord=self.grblCoordinateSystem))
-
-        # M8 (air assist on) processing - work in progress
-        if cmd.upper() in ("M7", "M8"):
-            self.coolant = cmd.upper()
-            self._plugin_manager.send_plugin_message(self._identifier, dict(type="grbl_state", colant=self.coolant))
-
-            if self.overrideM8 and cmd.upper() == "M8":
-                self._logger.debug('Turning ON Air Assist')
-                subprocess.call(self.m8Command, shell=True)
-
-                return (None,)
-
-        # M9 (air assist off) processing - work in progress
-        if cmd.upper() == "M9":
-            self.coolant = cmd.upper()
-            self._plugin_manager.send_plugin_message(self._identifier, dict(type="grbl_state", colant=self.coolant))
-
-            if self.overrideM9:
-                self._logger.debug('Turning OFF Air Assist')
-                subprocess.call(self.m9Command, shell=True)
-
-                return (None,)
+    # #-- analysis queue factory hook
+    def get_analysis_queue_factories(self, *args, **kwargs):
+        # octoprint keeps its own analysis unless our profile is selected
+        if self._printer_profile_manager.get_current_or_default()["id"] != "_bgs":
+            return dict()
 
-        # Grbl 1.1 Realtime Commands (requires Octoprint 1.8.0+)
-        # see https://github.com/OctoPrint/OctoPrint/pull/4390
+        return dict(gcode=lambda finished_callback: GrblAnalysisQueue(finished_callback, self))
 
-        # safety door
-        if cmd.upper() == "SAFETYDOOR":
-            if _bgs.is_grbl_one_dot_one(self) and _bgs.is_latin_encoding_available(self):
-                self._logger.debug("Triggering safety door ")
-                cmd = "? {} ?".format("\x84")
-            else:
-                return (None, )
 
-        # cancel jog
-        if cmd.upper() == "CANCELJOG":
-            if _bgs.is_grbl_one_dot_one(self) and _bgs.is_latin_encoding_available(self):
-                self._logger.debug("Cancelling jog")
-                cmd = "? {} ?".format("\x85")
-            else:
-                return (None, )
+    # #-- gcode scripts hook
+    def hook_gcode_scripts(self, comm_instance, script_type, script_name, *args, **kwargs):
+        # the way back into a resumed job goes out ahead of its first line
+        if script_type == "gcode" and script_name == "beforePrintStarted" and not self.resumePreamble is None:
+            preamble = self.resumePreamble
+            self.resumePreamble = None
+            return ("\n".join(preamble), None)
 
-        # normal feed
-        if cmd.upper() == "FEEDNORMAL":
-            if _bgs.is_grbl_one_dot_one(self) and _bgs.is_latin_encoding_available(self):
-                self._logger.debug("Setting normal feed rate")
-                cmd = "? {} ?".format("\x90")
-            else:
-                return (None, )
-
-        # feed +10%
-        if cmd.upper() == "FEEDPLUS10":
-            if _bgs.is_grbl_one_dot_one(self) and _bgs.is_latin_encoding_available(self):
-                self._logger.debug("Setting feed rate +10%")
-                cmd = "? {} ?".format("\x91")
-            else:
-                return (None, )
+        return None
 
-        # feed -10%
-        if cmd.upper() == "FEEDMINUS10":
-            if _bgs.is_grbl_one_dot_one(self) and _bgs.is_latin_encoding_available(self):
-                self._logger.debug("Setting feed rate -10%")
-                cmd = "? {} ?".format("\x92")
-            else:
-                return (None, )
 
-        # feed +1%
-        if cmd.upper() == "FEEDPLUS1":
-            if _bgs.is_grbl_one_dot_one(self) and _bgs.is_latin_encoding_available(self):
-                self._logger.debug("Setting feed rate +1%")
-                cmd = "? {} ?".format("\x93")
-            else:
-                return (None, )
+    # #-- print time estimation factory hook
+    def get_print_time_estimator_factory(self, *args, **kwargs):
+        return lambda job_type: GrblPrintTimeEstimator(job_type, self)
 
-        # feed -1%
-        if cmd.upper() == "FEEDMINUS1":
-            if _bgs.is_grbl_one_dot_one(self) and _bgs.is_latin_encoding_available(self):
-                self._logger.debug("Setting feed rate -1%")
-                cmd = "? {} ?".format("\x94")
-            else:
-                return (None, )
 
-        # normal spindle
-        if cmd.upper() == "SPINDLENORMAL":
-            if _bgs.is_grbl_one_dot_one(self) and _bgs.is_latin_encoding_available(self):
-                self._logger.debug("Setting normal spindle speed")
-                cmd = "? {} ?".format("\x99")
-            else:
-                return (None, )
+    # #-- gcode queuing hook
+    def hook_gcode_queuing(self, comm_instance, phase, cmd, cmd_type, gcode, *args, **kwargs):
+        # let's only do stuff if our profile is selected
+        if self._printer_profile_manager.get_current_or_default()["id"] != "_bgs":
+            return None
 
-        # spindle +10%
-        if cmd.upper() == "SPINDLEPLUS10":
-            if _bgs.is_grbl_one_dot_one(self) and _bgs.is_latin_encoding_available(self):
-                self._logger.debug("Setting spindle speed +10%")
-                cmd = "? {} ?".format("\x9a") 
-            else:
-                return (None, )
+        self.realtime.attach(comm_instance)
 
-        # spindle -10%
-        if cmd.upper() == "SPINDLEMINUS10":
-            if _bgs.is_grbl_one_dot_one(self) and _bgs.is_latin_encoding_available(self):
-                self._logger.debug("Setting spindle speed -10%")
-                cmd = "? {} ?".format("\x9B")
-            else:
-                return (None, )
+        # realtime commands skip the queue entirely (feed hold can't wait behind a job)
+        byte = self.commandRouter.realtime(cmd.strip().upper())
+        if not byte is None and self.realtime.write(byte):
+            self._logger.debug("__init__: hook_gcode_queuing wrote realtime cmd=[{}]".format(hex(ord(byte))))
+            return (None, )
 
-        # spindle +1%
-        if cmd.upper() == "SPINDLEPLUS1":
-            if _bgs.is_grbl_one_dot_one(self) and _bgs.is_latin_encoding_available(self):
-                self._logger.debug("Setting spindle speed +1%")
-                cmd = "? {} ?".format("\x9C")
-            else:
-                return (None, )
+        return None
 
-        # spindle -1%
-        if cmd.upper() == "SPINDLEMINUS1":
-            if _bgs.is_grbl_one_dot_one(self) and _bgs.is_latin_encoding_available(self):
-                self._logger.debug("Setting spindle speed -1%")
-                cmd = "? {} ?".format("\x9D")
-            else:
-                return (None, )
 
-        # toggle spindle
-        if cmd.upper() == "TOGGLESPINDLE":
-            if _bgs.is_grbl_one_dot_one(self) and _bgs.is_latin_encoding_available(self):
-                self._logger.debug("Toggling spindle stop")
-                cmd = "? {} ?".format("\x9E")
-            else:
-                return (None, )
-
-        # rewrite M115 firmware as $$ (hello)
-        if self.suppressM115 and cmd.upper().startswith('M115'):
-            self._logger.debug('Rewriting M115 as %s' % self.helloCommand)
+    # #-- gcode sending hook
+    def hook_gcode_sending(self, comm_instance, phase, cmd, cmd_type, gcode, *args, **kwargs):
+        self._logger.debug("__init__: hook_gcode_sending phase=[{}] cmd=[{}] cmd_type=[{}] gcode=[{}]".format(phase, cmd, cmd_type, gcode))
+        # let's only do stuff if our profile is selected
+        if self._printer_profile_manager.get_current_or_default()["id"] != "_bgs":
+            return None
 
-            # let's not be in too big of a rush
-            time.sleep(.5)
+        self.realtime.attach(comm_instance)
 
-            if self.doSmoothie:
-                self.lastRequest.append("$$")
-                return "Cat /sd/config"
+        cmd = cmd.lstrip("\r").lstrip("\n").rstrip("\r").rstrip("\n")
 
-            cmd = "$+" if _bgs.is_grbl_esp32(self) else self.helloCommand
+        # status reports come from our own poller -- temperature polling has nothing to do with grbl
+        if "M105" in cmd.upper():
+            self._logger.debug('Ignoring %s', cmd)
+            return (None, )
 
-            # in the unlikely event our hello command has been remapped
-            if not cmd.upper() in self.trackedCmds:
-                self.trackedCmds.append(cmd.upper())
+        self.autoSleepTimer = time.time()
 
-        # Wait for moves to finish before turning off the spindle
-        if self.suppressM400 and cmd.upper().startswith('M400'):
-            self._logger.debug('Rewriting M400 as %s' % self.dwellCommand)
-            cmd = self.dwellCommand
+        # parse the line once -- everything below shares the result
+        line = tokenizer.tokenize(cmd)
 
-        # rewrite M114 current position as ? (typically)
-        if self.suppressM114 and cmd.upper().startswith('M114'):
-            self._logger.debug('Rewriting M114 as %s' % self.positionCommand)
-            cmd = self.positionCommand
+        # job lines feed our executing line estimate
+        self.progressTracker.sending(line, kwargs.get("tags"))
 
-        # soft reset / resume (stolen from Marlin)
-        if cmd.upper().startswith('M999') and not self.doSmoothie:
-            self._logger.debug('Sending Soft Reset')
-            _bgs.add_notifications(self, ["Machine has been reset"])
+        command = cmd.upper()
 
-            self.grblState = "Reset"
-            self._plugin_manager.send_plugin_message(self._identifier, dict(type="grbl_state", state="Reset"))
-            _bgs.queue_cmds_and_send(self, ["$G"])
+        # one lookup on the leading command word -- ordinary motion lines fall straight through
+        handler = self.commandRouter.route(command)
+        if not handler is None:
+            result = handler(self, cmd, command)
 
-            # sanity check on reset
-            self.lastRequest = []
-            self.lastResponse = ""
+            if isinstance(result, tuple):
+                if not result[0] is None:
+                    self.streamer.reserve(result[0])
+                return result
 
-            cmd = "\x18"
+            if not result is None:
+                cmd = result
+                command = cmd.upper()
+                line = tokenizer.tokenize(cmd)
 
-        # baby stepping (Marlin M290)
-        if cmd.upper().startswith("M290"):
-            match = re.search(r".*[Xx]\ *(-?[\d.]+).*", cmd)
-            if match:
-                _bgs.babystep_offset(self, self.grblCoordinateSystem, "X", float(match.groups(1)[0]))
-            match = re.search(r".*[Yy]\ *(-?[\d.]+).*", cmd)
-            if match:
-                _bgs.babystep_offset(self, self.grblCoordinateSystem, "Y", float(match.groups(1)[0]))
-            match = re.search(r".*[Zz]\ *(-?[\d.]+).*", cmd)
-            if match:
-                _bgs.babystep_offset(self, self.grblCoordinateSystem, "Z", float(match.groups(1)[0]))
-            match = re.search(r".*[Aa]\ *(-?[\d.]+).*", cmd)
-            if match:
-                _bgs.babystep_offset(self, self.grblCoordinateSystem, "A", float(match.groups(1)[0]))
-            match = re.search(r".*[Bb]\ *(-?[\d.]+).*", cmd)
-            if match:
-                _bgs.babystep_offset(self, self.grblCoordinateSystem, "B", float(match.groups(1)[0]))
-            return (None,)
+        gcodes = line.codes("G")
 
-        # grbl version info
-        if cmd.upper().startswith("$I"):
-            self.grblVersion = ""
-            self.fluidYaml = ""
-            self._settings.set(["grblVersion"], self.grblVersion)
-            self._settings.set(["fluidYaml"], self.fluidYaml)
-            self._settings.save(trigger_event=True)
+        # hack for unacknowledged grbl commmands
+        if 38.2 in gcodes:
+            self.grblState = "Run"
+            self.telemetry.publish(state="Run")
 
         # we need to track absolute position mode for "RUN" position updates
-        if "G90" in cmd.upper():
+        if 90 in gcodes:
             # absolute positioning
             self.positioning = 0
-            self._plugin_manager.send_plugin_message(self._identifier, dict(type="grbl_state", positioning=self.positioning))
+            self.telemetry.publish(positioning=self.positioning)
 
         # we need to track relative position mode for "RUN" position updates
-        if "G91" in cmd.upper():
+        if 91 in gcodes:
             # relative positioning
             self.positioning = 1
-            self._plugin_manager.send_plugin_message(self._identifier, dict(type="grbl_state", positioning=self.positioning))
+            self.telemetry.publish(positioning=self.positioning)
 
-        # save our G command for shorthand post processors
-        if cmd.upper().startswith("G"):
-            self.lastGCommand = cmd[:3] if cmd[2:3].isnumeric() else cmd[:2]
+        first = line.first()
 
-        # use our saved G command if our line starts with a coordinate
-        if cmd.upper().startswith(("X", "Y", "Z")):
-            cmd = self.lastGCommand + " " + cmd
+        if not first is None:
+            # save our G command for shorthand post processors
+            if first[0] == "G":
+                self.lastGCommand = "G" + first[2]
+
+            # use our saved G command if our line starts with a coordinate
+            if first[0] in ("X", "Y", "Z"):
+                line.prepend(self.lastGCommand + " ")
 
         # keep track of distance traveled
         found = False
         foundZ = False
 
-        # match = re.search(r"^G([0][0123]|[0123])(\D.*[Xx]|[Xx])\ *(-?[\d.]+).*", command)
-        match = re.search(r".*[Xx]\ *(-?[\d.]+).*", cmd)
-        if match:
-            self.grblX = float(match.groups(1)[0]) if self.positioning == 0 else self.grblX + float(match.groups(1)[0])
+        value = line.get("X")
+        if not value is None:
+            self.grblX = value if self.positioning == 0 else self.grblX + value
             found = True
 
-        # match = re.search(r"^G([0][0123]|[0123])(\D.*[Yy]|[Yy])\ *(-?[\d.]+).*", command)
-        match = re.search(r".*[Yy]\ *(-?[\d.]+).*", cmd)
-        if match:
-            self.grblY = float(match.groups(1)[0]) if self.positioning == 0 else self.grblY + float(match.groups(1)[0])
+        value = line.get("Y")
+        if not value is None:
+            self.grblY = value if self.positioning == 0 else self.grblY + value
             found = True
 
-        # match = re.search(r"^G([0][0123]|[0123])(\D.*[Zz]|[Zz])\ *(-?[\d.]+).*", command)
-        match = re.search(r".*[Zz]\ *(-?[\d.]+).*", cmd)
-        if match:
-            self.grblZ = float(match.groups(1)[0]) if self.positioning == 0 else self.grblZ + float(match.groups(1)[0])
+        value = line.get("Z")
+        if not value is None:
+            self.grblZ = value if self.positioning == 0 else self.grblZ + value
             found = True
             foundZ = True
 
-        #ADD A and B here
-        match = re.search(r".*[Aa]\ *(-?[\d.]+).*", cmd)
-        if match:
-            self.grblA = float(match.groups(1)[0]) if self.positioning == 0 else self.grblA + float(match.groups(1)[0])
+        value = line.get("A")
+        if not value is None:
+            self.grblA = value if self.positioning == 0 else self.grblA + value
             found = True
 
-        match = re.search(r".*[Bb]\ *(-?[\d.]+).*", cmd)
-        if match:
-            self.grblB = float(match.groups(1)[0]) if self.positioning == 0 else self.grblB + float(match.groups(1)[0])
+        value = line.get("B")
+        if not value is None:
+            self.grblB = value if self.positioning == 0 else self.grblB + value
             found = True
 
-        # match = re.search(r"^[GM]([0][01234]|[01234])(\D.*[Ff]|[Ff])\ *(-?[\d.]+).*", command)
-        match = re.search(r".*[Ff]\ *(-?[\d.]+).*", cmd)
-        if match:
-            grblSpeed = float(match.groups(1)[0])
+        value = line.get("F")
+        if not value is None:
+            grblSpeed = value
 
             if (self.feedRate != 0 or self.plungeRate != 0) and grblSpeed != 0:
                 # check if feed rate is overridden
-                if self.feedRate != 0:
-                    if not foundZ:
-                        grblSpeed = grblSpeed * self.feedRate
-                        cmd = cmd.upper().replace("F" + match.groups(1)[0], "F{:.3f}".format(grblSpeed))
-                        cmd = cmd.upper().replace("F " + match.groups(1)[0], "F {:.3f}".format(grblSpeed))
-                        # self._logger.debug("feed rate modified from [{}] to [{}]".format(match.groups(1)[0], grblSpeed))
+                if self.feedRate != 0 and not foundZ:
+                    grblSpeed = grblSpeed * self.feedRate
+                    line.set("F", grblSpeed)
 
                 # check if plunge rate is overridden
-                if self.plungeRate != 0:
-                    if foundZ:
-                        grblSpeed = grblSpeed * self.plungeRate
-                        cmd = cmd.upper().replace("F" + match.groups(1)[0], "F{:.3f}".format(grblSpeed))
-                        cmd = cmd.upper().replace("F " + match.groups(1)[0], "F {:.3f}".format(grblSpeed))
-                        # self._logger.debug("plunge rate modified from [{}] to [{}]".format(match.groups(1)[0], grblSpeed))
-
-            # make sure we post all speed on / off events
-            if (grblSpeed == 0 and self.grblSpeed != 0) or (self.grblSpeed == 0 and grblSpeed != 0):
-                self.timeRef = 0
+                if self.plungeRate != 0 and foundZ:
+                    grblSpeed = grblSpeed * self.plungeRate
+                    line.set("F", grblSpeed)
 
             self.grblSpeed = grblSpeed
             found = True
 
-        # match = re.search(r"^[GM]([0][01234]|[01234])(\D.*[Ss]|[Ss])\ *(-?[\d.]+).*", command)
-        match = re.search(r".*[Ss]\ *(-?[\d.]+).*", cmd)
-        if match:
-            grblPowerLevel = float(match.groups(1)[0])
+        value = line.get("S")
+        if not value is None:
+            grblPowerLevel = value
 
             # check if power rate is overridden
             if self.powerRate != 0 and grblPowerLevel != 0:
                 grblPowerLevel = grblPowerLevel * self.powerRate
-                cmd = cmd.upper().replace("S" + match.groups(1)[0], "S{:.3f}".format(grblPowerLevel))
-                cmd = cmd.upper().replace("S " + match.groups(1)[0], "S {:.3f}".format(grblPowerLevel))
-                # self._logger.debug("power rate modified from [{}] to [{}]".format(match.groups(1)[0], grblPowerLevel))
+                line.set("S", grblPowerLevel)
 
-            # make sure we post all power on / off events
             self.grblPowerLevel = grblPowerLevel
             found = True
 
+        # only re-emits the words we changed (if any)
+        cmd = line.reassemble()
+
+        # the publisher coalesces these so there is no need to throttle here
         if found:
-            currentTime = int(round(time.time() * 1000))
-            if currentTime > self.timeRef + 250:
-                # self._logger.info("x=[{}] y=[{}] z=[{}] f=[{}] s=[{}]".format(self.grblX, self.grblY, self.grblZ, self.grblSpeed, self.grblPowerLevel))
-                self._plugin_manager.send_plugin_message(self._identifier, dict(type="grbl_state",
-                                                                                mode=self.grblMode,
-                                                                                state=self.grblState,
-                                                                                x=self.grblX,
-                                                                                y=self.grblY,
-                                                                                z=self.grblZ,
-                                                                                a=self.grblA,
-                                                                                b=self.grblB,
-                                                                                speed=self.grblSpeed,
-                                                                                power=self.grblPowerLevel,
-                                                                                positioning=self.positioning,
-                                                                                coolant=self.coolant))
-                self.timeRef = currentTime
+            self.telemetry.publish(mode=self.grblMode,
+                                   state=self.grblState,
+                                   x=self.grblX,
+                                   y=self.grblY,
+                                   z=self.grblZ,
+                                   a=self.grblA,
+                                   b=self.grblB,
+                                   speed=self.grblSpeed,
+                                   power=self.grblPowerLevel,
+                                   positioning=self.positioning,
+                                   coolant=self.coolant)
 
         # we only want to track requests we care about
-        if cmd.upper() in self.trackedCmds:
+        if line.is_changed():
+            command = cmd.upper()
+
+        if command in self.trackedCmds:
             self.lastRequest.append(cmd)
 
+        # blocks until cmd fits in grbl's rx buffer (when streaming)
+        self.streamer.reserve(cmd)
+
         return (cmd, )
 
 
+    # #-- gcode sent hook
+    def hook_gcode_sent(self, comm_instance, phase, cmd, cmd_type, gcode, *args, **kwargs):
+        # acknowledge streamed lines as soon as they are on the wire
+        if self.streamer.sent():
+            self._printer.fake_ack()
+
+
     # #-- gcode received hook 
     def hook_gcode_received(self, comm_instance, line, *args, **kwargs):
         self._logger.debug("__init__: hook_gcode_received line=[{}]".format(line.replace("\r", "<cr>").replace("\n", "<lf>")))
@@ -1111,16 +1009,33 @@ class BetterGrblSupportPlugin(octoprint.plugin.SettingsPlugin,
         if 'MPos' in line or 'WPos' in line:
             return _bgs.process_grbl_status_msg(self, line)
 
+        # answers to a check mode verification never concern octoprint
+        if self.checkMode.active and self.checkMode.receive(line):
+            return
+
         # look for an alarm
         if line.lower().startswith('alarm:'):
+            # grbl flushes its rx buffer on alarm
+            self.streamer.reset()
             return _bgs.process_grbl_alarm(self, line)
 
         # look for an error
-        if not self.ignoreErrors and line.lower().startswith('error:'):
-            return _bgs.process_grbl_error(self, line)
-            
+        if line.lower().startswith('error:'):
+            # an error answers the oldest line still in flight
+            entry = self.streamer.acknowledge()
+            streamed = not entry is None and entry[2]
+
+            if not self.ignoreErrors:
+                response = _bgs.process_grbl_error(self, line, None if entry is None else entry[1])
+                # octoprint already has its acknowledgement for streamed lines
+                return None if streamed else response
+
+            if streamed:
+                return
+
         if line.startswith('Grbl'):
             # it all starts here
+            self.streamer.reset()
             return "ok " + line
 
         # forward any messages to the action notification plugin
@@ -1190,6 +1105,7 @@ class BetterGrblSupportPlugin(octoprint.plugin.SettingsPlugin,
         # else:
 
         # all that is left is an acknowledgement
+        entry = self.streamer.acknowledge()
         lastResponse = self.lastResponse.lstrip("\r").lstrip("\n").rstrip("\r").rstrip("\n")
 
         if len(self.lastRequest) > 0 and len(lastResponse) > 0:
@@ -1224,12 +1140,13 @@ class BetterGrblSupportPlugin(octoprint.plugin.SettingsPlugin,
                 for offset in lastResponse.split("\n"):
                     offsetpair = offset.replace("[", "").replace("]", "").split(":")
                     offsetkey = offsetpair[0]
-                    if offsetkey in ("G54", "G55", "G56", "G57", "G58", "G59"):
+                    # every axis grbl reports (a / b too on 4 and 5 axis builds).  grbl
+                    # adds G92 on top of whichever work coordinate system is active
+                    if offsetkey in ("G54", "G55", "G56", "G57", "G58", "G59", "G92"):
                         offsetvalues = offsetpair[1].split(",")
-                        self.offsets[offsetkey] = {}
-                        self.offsets[offsetkey]['x'] = float(offsetvalues[0])
-                        self.offsets[offsetkey]['y'] = float(offsetvalues[1])
-                        self.offsets[offsetkey]['z'] = float(offsetvalues[2])
+                        self.offsets[offsetkey] = dict(zip(("x", "y", "z", "a", "b"), [float(value) for value in offsetvalues]))
+                    elif offsetkey == "TLO":
+                        self.offsets[offsetkey] = dict(z=float(offsetpair[1].split(",")[0]))
 
                 self._logger.debug("offsets: [{}]".format(self.offsets))
 
@@ -1238,6 +1155,8 @@ class BetterGrblSupportPlugin(octoprint.plugin.SettingsPlugin,
                 self.grblVersion = lastResponse.replace("\n", " ").replace("\r", "")
                 self._settings.set(["grblVersion"], self.grblVersion)
                 self._settings.save(trigger_event=True)
+                # realtime commands depend on the firmware version
+                self.commandRouter.rebuild()
                 # trigger a fluidnc config download if fluid is detected
                 if self.fluidConfig is None and _bgs.is_grbl_fluidnc(self):
                     self._printer.commands("$CD")
@@ -1248,7 +1167,11 @@ class BetterGrblSupportPlugin(octoprint.plugin.SettingsPlugin,
                 self._settings.set(["fluidSettings"], self.fluidSettings)
                 self._settings.save(trigger_event=True)
                 if self._settings.get_boolean(["fluidAutoReport"]):
-                    self._printer.commands("$Report/Interval=250")
+                    self.statusPoller.enable_auto_report()
+
+        # octoprint already has its acknowledgement for streamed lines
+        if not entry is None and entry[2]:
+            return
 
         return "ok "
 
@@ -1273,6 +1196,16 @@ class BetterGrblSupportPlugin(octoprint.plugin.SettingsPlugin,
             toggleWeak=[],
             cancelProbe=[],
             getNotifications=[],
+            getExecutorStats=[],
+            resumeJob=[],
+            preflight=[],
+            validate=[],
+            verifyOnController=[],
+            cancelVerify=[],
+            getVerifyResult=[],
+            getInterruptedJob=[],
+            resumeInterruptedJob=[],
+            discardInterruptedJob=[],
             clearNotifications=[],
             backupGrblSettings=[],
             restoreGrblSettings=[],
@@ -1346,6 +1279,13 @@ class BetterGrblSupportPlugin(octoprint.plugin.SettingsPlugin,
 
         if command == "feedRate":
             feedRate = float(data.get("feed_rate"))
+
+            # realtime feed override takes effect immediately (buffered lines included)
+            if overrides.apply_feed(self, feedRate):
+                self.feedRate = float(0)
+                self._logger.info("feed rate overriden by %.0f%% (realtime)", feedRate)
+                return
+
             if not feedRate in (0, 100):
                 self.feedRate = feedRate * .01
                 # sending our current feedrate ensures grbl uses the new feedrate
@@ -1359,6 +1299,7 @@ class BetterGrblSupportPlugin(octoprint.plugin.SettingsPlugin,
             self._logger.info("feed rate overriden by %.0f%%", feedRate)
             return
 
+        # there is no realtime equivalent for plunge rate so it stays host side
         if command == "plungeRate":
             plungeRate = float(data.get("plunge_rate"))
             if not plungeRate in (0, 100):
@@ -1371,6 +1312,13 @@ class BetterGrblSupportPlugin(octoprint.plugin.SettingsPlugin,
 
         if command == "powerRate":
             powerRate = float(data.get("power_rate"))
+
+            # realtime spindle override takes effect immediately (buffered lines included)
+            if overrides.apply_spindle(self, powerRate):
+                self.powerRate = float(0)
+                self._logger.info("power rate overriden by %.0f%% (realtime)", powerRate)
+                return
+
             if not powerRate in (0, 100):
                 self.powerRate = powerRate * .01
                 # sending our current powerRate ensures grbl uses the new powerRate
@@ -1393,6 +1341,56 @@ class BetterGrblSupportPlugin(octoprint.plugin.SettingsPlugin,
                     ]
             )
 
+        if command == "getExecutorStats":
+            return flask.jsonify(self.executor.stats())
+
+        if command == "preflight":
+            job = self._printer.get_current_job().get("file", {})
+            if job.get("path") is None or job.get("origin") != "local":
+                return flask.abort(400, "No local file selected")
+
+            violations = preflight.preflight_file(self, job.get("path"))
+            if violations is None:
+                return flask.abort(409, "{} has not been analyzed yet".format(job.get("path")))
+
+            return flask.jsonify(dict(path=job.get("path"), coordinate=self.grblCoordinateSystem, violations=violations))
+
+        if command == "validate":
+            job = self._printer.get_current_job().get("file", {})
+            if job.get("path") is None or job.get("origin") != "local":
+                return flask.abort(400, "No local file selected")
+
+            errors = _bgs.check_gcode_errors(self, job.get("path"))
+            if errors is None:
+                return flask.abort(409, "{} has not been analyzed yet".format(job.get("path")))
+
+            return flask.jsonify(dict(path=job.get("path"), errors=errors))
+
+        if command == "verifyOnController":
+            job = self._printer.get_current_job().get("file", {})
+            if job.get("path") is None or job.get("origin") != "local":
+                return flask.abort(400, "No local file selected")
+
+            error = _bgs.verify_on_controller(self, job.get("path"))
+            if not error is None:
+                return flask.abort(409, error)
+
+            return flask.jsonify(dict(path=job.get("path")))
+
+        if command == "cancelVerify":
+            self.checkMode.cancel()
+            return
+
+        if command == "getVerifyResult":
+            return flask.jsonify(dict(active=self.checkMode.active, path=self.checkMode.path, lines=self.checkMode.lines, result=self.checkMode.result))
+
+        if command == "getInterruptedJob":
+            return flask.jsonify(self.journal.interrupted or {})
+
+        if command == "discardInterruptedJob":
+            self.journal.discard()
+            return
+
         if command == "clearNotifications":
             self.notifications = []
             self._plugin_manager.send_plugin_message(self._identifier, dict(type="notification", message=""))
@@ -1403,6 +1401,30 @@ class BetterGrblSupportPlugin(octoprint.plugin.SettingsPlugin,
             self._logger.debug("ignoring move related command - printer is not available")
             return
 
+        if command == "resumeInterruptedJob":
+            interrupted = self.journal.interrupted
+            if interrupted is None:
+                return flask.abort(400, "No interrupted job")
+
+            # restarting against a different work zero would cut in the wrong place
+            mismatch = self.journal.mismatch()
+            if not mismatch is None:
+                return flask.abort(409, "Unable to resume -- {}".format(mismatch))
+
+            try:
+                self._printer.select_file(interrupted["path"], False)
+                return flask.jsonify(resume.resume_job(self, interrupted["line"]))
+            except ValueError as e:
+                return flask.abort(400, str(e))
+
+        if command == "resumeJob":
+            try:
+                return flask.jsonify(resume.resume_job(self,
+                                                       None if data.get("line") is None else int(data.get("line")),
+                                                       None if data.get("zLevel") is None else int(data.get("zLevel"))))
+            except ValueError as e:
+                return flask.abort(400, str(e))
+
         if command == "frame":
             length = float(data.get("length"))
             width = float(data.get("width"))
@@ -1638,6 +1660,12 @@ def __plugin_load__():
     global __plugin_hooks__
     __plugin_hooks__ = \
         {'octoprint.plugin.softwareupdate.check_config': __plugin_implementation__.get_update_information,
+         'octoprint.comm.protocol.gcode.queuing': __plugin_implementation__.hook_gcode_queuing,
          'octoprint.comm.protocol.gcode.sending': __plugin_implementation__.hook_gcode_sending,
+         'octoprint.comm.protocol.gcode.sent': __plugin_implementation__.hook_gcode_sent,
          'octoprint.comm.protocol.gcode.received': __plugin_implementation__.hook_gcode_received,
-         "octoprint.filemanager.extension_tree": __plugin_implementation__.get_extension_tree}
+         "octoprint.filemanager.extension_tree": __plugin_implementation__.get_extension_tree,
+         "octoprint.filemanager.preprocessor": __plugin_implementation__.hook_file_preprocessor,
+         "octoprint.filemanager.analysis.factory": __plugin_implementation__.get_analysis_queue_factories,
+         "octoprint.printer.estimation.factory": __plugin_implementation__.get_print_time_estimator_factory,
+         "octoprint.comm.protocol.scripts": __plugin_implementation__.hook_gcode_scripts}
@@ -27,23 +27,33 @@
 # https://reprap.org/wiki/G-codeimport os
 #
 from operator import truediv
+import mmap
 import os
 import time
-import math
 
 import re
 import requests
-import threading
 
 from timeit import default_timer as timer
 from octoprint.events import Events
 from octoprint.access.permissions import Permissions
 
+from . import cache
+from . import extents
+from . import jobindex
+from .estimator import MachineProfile
+from . import optimizer
+from . import overrides
+from . import preflight
+from . import simplifier
+from . import validator
+from .metadata import PRIORITY_SELECTED
 from .zprobe import ZProbe
 from .xyprobe import XyProbe
 
 zProbe = None
 xyProbe = None
+cooldownTask = None
 
 def load_grbl_descriptions(_plugin):
     path = os.path.dirname(os.path.realpath(__file__)) + os.path.sep + "static" + os.path.sep + "txt" + os.path.sep
@@ -242,6 +252,20 @@ def on_event(_plugin, event, payload):
                         Events.PLUGIN_PLUGINMANAGER_UNINSTALL_PLUGIN, Events.PLUGIN_PLUGINMANAGER_DISABLE_PLUGIN, Events.UPLOAD,
                         Events.CONNECTING, Events.CONNECTED, Events.DISCONNECTING, Events.DISCONNECTED, Events.STARTUP, Events.SHUTDOWN)
 
+    # a new browser needs the full picture
+    if event == Events.CLIENT_OPENED:
+        _plugin.statusPoller.client_opened()
+        _plugin.telemetry.resync()
+
+        # offer to pick up a job the last shutdown (or power cut) interrupted
+        if not _plugin.journal.interrupted is None:
+            _plugin._plugin_manager.send_plugin_message(_plugin._identifier, dict(_plugin.journal.interrupted, type="interrupted_job"))
+        return
+
+    if event == Events.CLIENT_CLOSED:
+        _plugin.statusPoller.client_closed()
+        return
+
     if event not in subscribed_events and payload is not None and payload.get("state_id") not in ("PAUSING", "STARTING"):
         _plugin._logger.debug('event [{}] payload [{}] received but not subscribed - discarding'.format(event, payload))
         return
@@ -263,6 +287,8 @@ def on_event(_plugin, event, payload):
         _plugin.connectionState = event
         # let's make sure we don't have any commands queued up
         _plugin.grblCmdQueue.clear()
+        # nor any stale work coordinate offsets
+        _plugin.statusParser.reset()
 
     # - CONNECTED
     if event == Events.CONNECTED:
@@ -276,6 +302,8 @@ def on_event(_plugin, event, payload):
         _plugin._settings.set_boolean(["is_operational"], _plugin.is_operational)
 
         _plugin.fluidConfig = None
+        _plugin.streamer.reset()
+        _plugin.statusPoller.wake()
         _plugin._printer.commands(["$I", "$G", "$#"])
         # _plugin._printer.fake_ack()
 
@@ -283,8 +311,13 @@ def on_event(_plugin, event, payload):
     if event in (Events.DISCONNECTING, Events.DISCONNECTED):
         _plugin.connectionState = event
         _plugin.handshakeSent = False
+        _plugin.checkMode.cancel()
+        _plugin.streamer.stop()
+        _plugin.streamer.reset()
+        _plugin.realtime.detach()
+        _plugin.statusPoller.disable_auto_report()
         _plugin.grblState = "N/A"
-        _plugin._plugin_manager.send_plugin_message(_plugin._identifier, dict(type="grbl_state", state="N/A"))
+        _plugin.telemetry.publish(state="N/A")
 
         _plugin.is_operational = False
         _plugin._settings.set_boolean(["is_operational"], _plugin.is_operational)
@@ -298,6 +331,12 @@ def on_event(_plugin, event, payload):
 
     # 'PrintStarted'
     if event == Events.PRINT_STARTED:
+        if _plugin.checkMode.active:
+            # grbl is busy checking a file
+            add_notifications(_plugin, ["Job cancelled -- a verification is running"])
+            _plugin._printer.cancel_print()
+            return
+
         if "HOLD" in _plugin.grblState.upper():
             _plugin._printer.commands(["~"], force=True)
         elif not _plugin.grblState.upper() in ("IDLE", "CHECK"):
@@ -310,12 +349,31 @@ def on_event(_plugin, event, payload):
         _plugin.plungeRate = 0
         _plugin.powerRate = 0
 
+        overrides.apply_feed(_plugin, 100)
+        overrides.apply_spindle(_plugin, 100)
+
         _plugin.grblState = "Run"
-        _plugin._plugin_manager.send_plugin_message(_plugin._identifier, dict(type="grbl_state", state="Run"))
+        _plugin.telemetry.publish(state="Run")
 
         _plugin.is_printing = True
         _plugin._settings.set_boolean(["is_printing"], _plugin.is_printing)
 
+        if _plugin.streamingMode:
+            _plugin.streamer.start()
+
+        # a resumed job starts part way through the file
+        if payload.get("origin") == "local":
+            _plugin.progressTracker.start(open_job_index(_plugin, payload.get("path")), _plugin.resumeLine, get_arc_tolerance(_plugin))
+
+            # the journal keeps its own view of the index
+            index = open_job_index(_plugin, payload.get("path"))
+            if not index is None:
+                _plugin.journal.start(payload.get("path"), index)
+        else:
+            _plugin.progressTracker.start(None)
+
+        _plugin.resumeLine = 0
+
         if _plugin.autoCooldown:
             activate_auto_cooldown(_plugin)
 
@@ -323,8 +381,13 @@ def on_event(_plugin, event, payload):
 
     # Print ended (finished / failed / cancelled)
     if event in (Events.PRINT_CANCELLED, Events.PRINT_DONE, Events.PRINT_FAILED):
+        _plugin.streamer.stop()
+        _plugin.progressTracker.stop()
+        _plugin.journal.finish(event)
+        _plugin.resumePreamble = None
+        cancel_auto_cooldown(_plugin)
         _plugin.grblState = "Idle"
-        _plugin._plugin_manager.send_plugin_message(_plugin._identifier, dict(type="grbl_state", state="Idle"))
+        _plugin.telemetry.publish(state="Idle")
 
         _plugin.is_printing = False
         _plugin._settings.set_boolean(["is_printing"], _plugin.is_printing)
@@ -334,6 +397,7 @@ def on_event(_plugin, event, payload):
     # Print Cancelling
     if event == Events.PRINT_CANCELLING:
         _plugin._logger.debug("cancelling job")
+        _plugin.streamer.stop()
 
         if "HOLD" in _plugin.grblState.upper():
             _plugin._printer.commands(["~", "M5"], force=True)
@@ -343,6 +407,8 @@ def on_event(_plugin, event, payload):
     # Print Pausing
     if payload is not None and payload.get("state_id") == "PAUSING":
         _plugin._logger.debug("pausing job")
+        # feed hold and friends must not queue up behind a full rx buffer
+        _plugin.streamer.stop()
 
         _plugin.pausedPower = _plugin.grblPowerLevel
         _plugin.pausedPositioning = _plugin.positioning
@@ -372,8 +438,11 @@ def on_event(_plugin, event, payload):
         # make sure we are using whatever positioning mode was active before we paused
         _plugin._printer.commands(["G91" if _plugin.pausedPositioning == 1 else "G90"], force=True)
 
+        if _plugin.streamingMode:
+            _plugin.streamer.start()
+
         _plugin.grblState = "Run"
-        _plugin._plugin_manager.send_plugin_message(_plugin._identifier, dict(type="grbl_state", state="Run"))
+        _plugin.telemetry.publish(state="Run")
 
     # starting up
     if event == Events.STARTUP:
@@ -382,6 +451,10 @@ def on_event(_plugin, event, payload):
     # shutting down
     if event == Events.SHUTDOWN:
         _plugin._logger.info("shutting down")
+        _plugin.telemetry.stop()
+        _plugin.statusPoller.stop()
+        _plugin.journal.close()
+        _plugin.executor.shutdown()
         _plugin._settings.save()
 
     # File uploaded
@@ -393,6 +466,7 @@ def on_event(_plugin, event, payload):
 
             _plugin._file_manager.remove_file(payload["target"], renamed_file)
             _plugin._file_manager.move_file(payload["target"], payload["path"], renamed_file)
+            _plugin.uploadAnalyzer.rename(payload["path"], renamed_file)
 
             generate_metadata_for_file(_plugin, renamed_file, notify=False, force=True)
 
@@ -466,7 +540,7 @@ def send_frame_init_gcode(_plugin):
         _plugin._printer.commands("M3 S{}".format(_plugin.weakLaserValue))
 
     _plugin.grblState = "Jog"
-    _plugin._plugin_manager.send_plugin_message(_plugin._identifier, dict(type="grbl_state", state="Jog"))
+    _plugin.telemetry.publish(state="Jog")
 
 def send_frame_end_gcode(_plugin):
     _plugin._logger.debug("_bgs: send_frame_end_gcode")
@@ -594,49 +668,69 @@ def toggle_weak(_plugin):
 
 
 def process_grbl_status_msg(_plugin, msg):
-    match = re.search(r'<(-?[^,]+)[,|][WM]Pos:(-?[\d\.]+),(-?[\d\.]+),(-?[\d\.]+),?(-?[\d\.]+)?,?(-?[\d\.]+)?', msg)
-    response = 'X:{1} Y:{2} Z:{3} E:0 {original}'.format(*match.groups(), original=msg)
-    
-    _plugin.grblMode = "MPos" if "MPos" in msg else "WPos" if "WPos" in msg else "N/A"
-    _plugin.grblState = str(match.groups(1)[0])
-    _plugin.grblX = float(match.groups(1)[1])
-    _plugin.grblY = float(match.groups(1)[2])
-    _plugin.grblZ = float(match.groups(1)[3])
-
-    if match.groups(1)[5]:
-        _plugin.grblA = float(match.groups(1)[4])
-        _plugin.grblB = float(match.groups(1)[5])
-        
-    if match.groups(1)[4] and not match.groups(1)[5] and _plugin.hasB:
-        _plugin.grblB = float(match.groups(1)[4]) 
-    else:
-        _plugin.grblA = float(match.groups(1)[4])
-        
-    match = re.search(r'.*\|Pn:([XYZABPDHRS]+)', msg)
-    if not match is None:
-        _plugin.grblActivePins = match.groups(1)[0]
-    else:
-        _plugin.grblActivePins = "None"
-
-    match = re.search(r'.*\|FS:(-?[\d\.]+),(-?[\d\.]+)', msg)
-    if not match is None:
-        _plugin.grblSpeed = round(float(match.groups(1)[0]))
-        _plugin.grblPowerLevel = float(match.groups(1)[1])
-
-    _plugin._plugin_manager.send_plugin_message(_plugin._identifier, dict(type="grbl_state",
-                                                                    mode=_plugin.grblMode,
-                                                                    state=_plugin.grblState,
-                                                                    x=_plugin.grblX,
-                                                                    y=_plugin.grblY,
-                                                                    z=_plugin.grblZ,
-                                                                    a=_plugin.grblA,
-                                                                    b=_plugin.grblB,
-                                                                    pins=_plugin.grblActivePins,
-                                                                    speed=_plugin.grblSpeed,
-                                                                    power=_plugin.grblPowerLevel,
-                                                                    coord=_plugin.grblCoordinateSystem,
-                                                                    coolant=_plugin.coolant,
-                                                                    positioning=_plugin.positioning))
+    status = _plugin.statusParser.parse(msg)
+    if status is None:
+        return msg
+
+    _plugin.grblStatus = status
+
+    position = status.position()
+    response = "X:{} Y:{} Z:{} E:0 {}".format(position[0], position[1], position[2], msg)
+
+    _plugin.grblMode = status.mode
+    _plugin.grblState = status.state
+    _plugin.grblX = position[0]
+    _plugin.grblY = position[1]
+    _plugin.grblZ = position[2]
+
+    if len(position) > 4:
+        _plugin.grblA = position[3]
+        _plugin.grblB = position[4]
+    elif len(position) > 3:
+        if _plugin.hasB:
+            _plugin.grblB = position[3]
+        else:
+            _plugin.grblA = position[3]
+
+    _plugin.grblActivePins = status.pins if status.pins else "None"
+
+    if not status.feed is None:
+        _plugin.grblSpeed = round(status.feed)
+    if not status.speed is None:
+        _plugin.grblPowerLevel = status.speed
+
+    # override values are only reported every so often (or when they change) --
+    # the ones we remember from before say nothing about an override we just sent
+    if status.overridesReported:
+        _plugin.grblOverrides = list(status.overrides)
+        _plugin.grblOverridesConfirmed = [True, True, True]
+
+    # only publish when something the ui cares about has changed
+    if _plugin.statusParser.changed(status):
+        _plugin.telemetry.publish(mode=_plugin.grblMode,
+                                  state=_plugin.grblState,
+                                  x=_plugin.grblX,
+                                  y=_plugin.grblY,
+                                  z=_plugin.grblZ,
+                                  a=_plugin.grblA,
+                                  b=_plugin.grblB,
+                                  pins=_plugin.grblActivePins,
+                                  speed=_plugin.grblSpeed,
+                                  power=_plugin.grblPowerLevel,
+                                  coord=_plugin.grblCoordinateSystem,
+                                  coolant=_plugin.coolant,
+                                  positioning=_plugin.positioning)
+
+    # where grbl really is in the job (Bf / Ln tick constantly -- but this is cheap)
+    if _plugin.progressTracker.active:
+        progress = _plugin.progressTracker.update(status, _plugin.streamer.depth())
+
+        if not progress is None:
+            _plugin.telemetry.publish(line=progress[0] + 1,
+                                      remaining=round(progress[1]),
+                                      progress=round(progress[2], 1))
+
+            _plugin.journal.record(progress[0])
 
     # odd edge case where a machine could be asleep or holding while connecting
     # TODO: this may no longer be valid given refactoring
@@ -644,22 +738,15 @@ def process_grbl_status_msg(_plugin, msg):
         _plugin._printer.commands("M999", force=True)
 
     # pop any queued commands if state is IDLE or HOLD:0, DOOR:0, CHECK, or ALARM
-    if len(_plugin.grblCmdQueue) > 0 and _plugin.grblState.upper() in ("IDLE", "HOLD:0", "DOOR:0", "CHECK", "ALARM"):
-        _plugin._logger.debug('sending queued command [%s] - depth [%d]', _plugin.grblCmdQueue[0], len(_plugin.grblCmdQueue))
-        _plugin._printer.commands(_plugin.grblCmdQueue[0])
-        _plugin.grblCmdQueue.pop(0)
+    # (this is also how a transition to Idle gets the next command out right away).
+    # commands held back during a verification go out once it is over
+    if not _plugin.checkMode.active:
+        _plugin.grblCmdQueue.drain(_plugin.grblState)
 
     # add a notification if we just homed
     if _plugin.grblState.upper() == "HOME":
         add_notifications(_plugin, ["Machine has been homed"])
 
-    # the only thing useful remaining is buffer stats
-    # and we currently don't do anything with it
-    # for stat in msg.replace("<", "").replace(">", "").split("|"):
-    #     # buffer stats and Pin stats
-    #     if stat.startswith("Bf:") or stat.startswith("Pn:"):
-    #         _plugin.add_to_notify_queue(stat)
-
     return response
 
 
@@ -684,10 +771,9 @@ def process_grbl_alarm(_plugin, msg):
     # inform _bgs in case it has something going on (probing)
     grbl_alarm_or_error_occurred(_plugin)
 
-    # clear out any pending queued Commands
-    if len(_plugin.grblCmdQueue) > 0:
-        _plugin._logger.debug("clearing %d commands from the command queue", len(_plugin.grblCmdQueue))
-        _plugin.grblCmdQueue.clear()
+    # clear out any pending queued Commands (and release anybody waiting on them)
+    _plugin._logger.debug("clearing %d commands from the command queue", len(_plugin.grblCmdQueue))
+    _plugin.grblCmdQueue.clear()
 
     # put a message on our notification queue and force an inquiry
     add_notifications(_plugin, [desc])
@@ -705,7 +791,7 @@ def process_grbl_alarm(_plugin, msg):
     return "ok " + desc
 
 
-def process_grbl_error(_plugin, msg):
+def process_grbl_error(_plugin, msg, cmd=None):
     error = int(0)
     desc = msg
 
@@ -716,6 +802,10 @@ def process_grbl_error(_plugin, msg):
         desc = _plugin.grblErrors.get(error)
         if desc is None: desc = "Grbl Error #{} - Error description not available".format(error)
 
+    # the line grbl rejected (known when streaming)
+    if not cmd is None:
+        desc = "{} [{}]".format(desc, cmd)
+
     # hack to suppress errors on connect
     if time.time() - _plugin.whenConnected < 20: return "ok "
 
@@ -787,27 +877,26 @@ def process_parser_status_msg(_plugin, msg):
         elif state.startswith("T"):
             _plugin._logger.debug("parser state indicates tool #[%s] active", state.replace("T", ""))
 
-    _plugin._plugin_manager.send_plugin_message(_plugin._identifier, dict(type="grbl_state",
-                                                                        speed=_plugin.grblSpeed,
-                                                                        power=_plugin.grblPowerLevel,
-                                                                        coord=_plugin.grblCoordinateSystem,
-                                                                        coolant=_plugin.coolant,
-                                                                        positioning=_plugin.positioning))
+    _plugin.telemetry.publish(speed=_plugin.grblSpeed,
+                              power=_plugin.grblPowerLevel,
+                              coord=_plugin.grblCoordinateSystem,
+                              coolant=_plugin.coolant,
+                              positioning=_plugin.positioning)
 
 
 def do_xyz_probe(_plugin, sessionId):
+    do_simple_zprobe(_plugin, sessionId)
+
     # we need something in the background to track this
-    threading.Thread(target=defer_do_xyz_probe, args=(_plugin, sessionId)).start()
+    _plugin.executor.schedule(1, defer_do_xyz_probe, _plugin, sessionId)
 
 def defer_do_xyz_probe(_plugin, sessionId):
     global zProbe
-    global xyProbe
-
-    do_simple_zprobe(_plugin, sessionId)
 
     # wait for the z probe to run out of scope
-    while zProbe != None:
-        time.sleep(1)
+    if zProbe != None:
+        _plugin.executor.schedule(1, defer_do_xyz_probe, _plugin, sessionId)
+        return
 
     do_xy_probe(_plugin, "XY", sessionId)
 
@@ -909,7 +998,7 @@ def xy_probe_hook(_plugin, result, position, axis):
     add_notifications(_plugin, [notification])
 
     # defer commands and setup of the next step
-    threading.Thread(target=defer_do_xy_probe, args=(_plugin, position, axis, xyProbe._sessionId)).start()
+    _plugin.executor.submit(defer_do_xy_probe, _plugin, position, axis, xyProbe._sessionId)
 
 def defer_do_xy_probe(_plugin, position, axis, sessionId):
     global xyProbe
@@ -917,7 +1006,7 @@ def defer_do_xy_probe(_plugin, position, axis, sessionId):
 
     _plugin.grblCmdQueue.append("%%% eat me %%%")
     _plugin._printer.commands("?")
-    wait_for_empty_cmd_queue(_plugin)
+    if not wait_for_empty_cmd_queue(_plugin): return
     if xyProbe == None: return
 
     xf, yf, zf = get_axes_max_rates(_plugin)
@@ -986,7 +1075,7 @@ def simple_zprobe_hook(_plugin, result, position):
 
     if result == 1:
         # defer commands because we are out of sync
-        threading.Thread(target=defer_simple_z_probe, args=(_plugin, z0)).start()
+        _plugin.executor.submit(defer_simple_z_probe, _plugin, z0)
 
         type="simple_notify"
         title="Single Point Z-Probe"
@@ -1010,7 +1099,7 @@ def defer_simple_z_probe(_plugin, z0):
 
     _plugin.grblCmdQueue.append("%%% eat me %%%")
     _plugin._printer.commands("?")
-    wait_for_empty_cmd_queue(_plugin)
+    if not wait_for_empty_cmd_queue(_plugin): return
 
     program = int(float(_plugin.grblCoordinateSystem.replace("G", "")))
     program = -53 + program
@@ -1237,7 +1326,7 @@ def multipoint_zprobe_hook(_plugin, result, position):
         _plugin._printer.commands("{}G91 G21 Z{} F{}".format("$J=" if is_grbl_one_dot_one(_plugin) else "G0 ", _plugin.zProbeEndPos, zf))
 
     # defer setup of the next step
-    threading.Thread(target=defer_do_multipoint_zprobe, args=(_plugin, zProbe._sessionId)).start()
+    _plugin.executor.submit(defer_do_multipoint_zprobe, _plugin, zProbe._sessionId)
 
 def defer_do_multipoint_zprobe(_plugin, sessionId):
     global zProbe
@@ -1245,7 +1334,7 @@ def defer_do_multipoint_zprobe(_plugin, sessionId):
 
     _plugin.grblCmdQueue.append("%%% eat me %%%")
     _plugin._printer.commands("?")
-    wait_for_empty_cmd_queue(_plugin)
+    if not wait_for_empty_cmd_queue(_plugin): return
 
     if zProbe != None:
         do_multipoint_zprobe(_plugin, sessionId)
@@ -1274,45 +1363,49 @@ def grbl_alarm_or_error_occurred(_plugin):
 
 
 def activate_auto_cooldown(_plugin):
+    global cooldownTask
     _plugin._logger.debug("_bgs: activate_auto_cooldown")
-    threading.Thread(target=auto_cooldown_monitor, args=(_plugin,)).start()
 
+    cancel_auto_cooldown(_plugin)
+    cooldownTask = _plugin.executor.schedule(_plugin.autoCooldownFrequency * 60, auto_cooldown_pause, _plugin)
 
-def auto_cooldown_monitor(_plugin):
-    _plugin._logger.debug("_bgs: auto_cooldown_monitor")
 
-    frequency = _plugin.autoCooldownFrequency * 60
-    duration = _plugin.autoCooldownDuration * 60
+def cancel_auto_cooldown(_plugin):
+    global cooldownTask
 
-    while _plugin._printer.is_printing():
-        _plugin._logger.debug("auto cooldown loop started")
+    if not cooldownTask is None:
+        _plugin._logger.debug("_bgs: cancel_auto_cooldown")
+        cooldownTask.cancel()
+        cooldownTask = None
 
-        startTime = time.time()
 
-        while _plugin._printer.is_printing() and time.time() < startTime + frequency:
-            time.sleep(1)
+def auto_cooldown_pause(_plugin):
+    global cooldownTask
+    _plugin._logger.debug("_bgs: auto_cooldown_pause")
 
-        if _plugin._printer.is_printing():
-            _plugin._logger.debug("auto cooldown pausing job")
-            _plugin._printer.pause_print()
-        else:
-            _plugin._logger.debug("job appears to have unexpectedly ended while waiting for cooldown frequency")
-            break
+    if not _plugin._printer.is_printing():
+        _plugin._logger.debug("job appears to have unexpectedly ended while waiting for cooldown frequency")
+        cooldownTask = None
+        return
 
-        startTime = time.time()
+    _plugin._logger.debug("auto cooldown pausing job")
+    _plugin._printer.pause_print()
 
-        while (_plugin._printer.is_pausing() or _plugin._printer.is_paused()) and time.time() < startTime + duration:
-            time.sleep(1)
+    cooldownTask = _plugin.executor.schedule(_plugin.autoCooldownDuration * 60, auto_cooldown_resume, _plugin)
 
-        if _plugin._printer.is_paused():
-            _plugin._logger.debug("auto cooldown resuming job")
-            _plugin._printer.resume_print()
-        else:
-            _plugin._logger.debug("job appears to have unexpectedly ended while waiting for cooldown duration")
-            continue
 
-        _plugin._logger.debug("auto cooldown loop complete")
-    _plugin._logger.debug("auto cooldown monitor shutting down")
+def auto_cooldown_resume(_plugin):
+    global cooldownTask
+    _plugin._logger.debug("_bgs: auto_cooldown_resume")
+
+    if _plugin._printer.is_paused():
+        _plugin._logger.debug("auto cooldown resuming job")
+        _plugin._printer.resume_print()
+    else:
+        _plugin._logger.debug("job appears to have unexpectedly ended while waiting for cooldown duration")
+
+    # the next pause checks whether there is still a job to cool down
+    cooldownTask = _plugin.executor.schedule(_plugin.autoCooldownFrequency * 60, auto_cooldown_pause, _plugin)
 
 
 def queue_cmds_and_send(_plugin, cmds, wait=False):
@@ -1322,17 +1415,20 @@ def queue_cmds_and_send(_plugin, cmds, wait=False):
         _plugin._logger.debug("queuing command [%s] wait=%r", cmd, wait)
         _plugin.grblCmdQueue.append(cmd)
 
+    # get a status report in here now rather than at the next idle poll
+    _plugin.statusPoller.wake()
+
     if wait:
-        wait_for_empty_cmd_queue(_plugin)
+        return wait_for_empty_cmd_queue(_plugin)
 
 
-def wait_for_empty_cmd_queue(_plugin):
-    _plugin._logger.debug("_bgs: wait_for_empty_cmd_queue")
+def wait_for_empty_cmd_queue(_plugin, timeout=None):
+    _plugin._logger.debug("_bgs: wait_for_empty_cmd_queue timeout=[{}]".format(timeout))
 
-    while len(_plugin.grblCmdQueue) > 0:
-        time.sleep(.001)
+    drained = _plugin.grblCmdQueue.wait_empty(timeout)
 
-    _plugin._logger.debug("done waiting for command queue to drain")
+    _plugin._logger.debug("done waiting for command queue to drain drained=[{}]".format(drained))
+    return drained
 
 
 def add_notifications(_plugin, notifications):
@@ -1349,10 +1445,30 @@ def add_notifications(_plugin, notifications):
 
 
 def generate_metadata_for_file(_plugin, filename, notify=False, force=False):
+    file = _plugin._file_manager.path_on_disk("local", filename)
+
+    # we already looked at it on its way in
+    analysis = _plugin.uploadAnalyzer.get(filename, os.path.getsize(file))
+    if not analysis is None:
+        _plugin._logger.debug("_bgs: generate_metadata_for_file filename=[{}] analyzed during upload".format(filename))
+
+        store_metadata_for_file(_plugin, filename, file, analysis["length"], analysis["width"], analysis["origin"],
+                                index=analysis["index"], estimate=analysis["estimate"], bounds=analysis["bounds"], errors=analysis["errors"],
+                                optimized=analysis["optimized"])
+
+        # a plain upload over one we optimized
+        if analysis["optimized"] is None:
+            _plugin._file_manager.remove_additional_metadata("local", filename, "bgs_optimized")
+        else:
+            notify_optimized_file(_plugin, filename, analysis["optimized"])
+
+        if notify:
+            notify_selected_file(_plugin, filename, analysis)
+        return
+
     metadata = _plugin._file_manager.get_metadata("local", filename)
-    created = os.path.getctime(_plugin._file_manager.path_on_disk("local", filename))
+    created = os.path.getctime(file)
 
-    processing = True if metadata.get("bgs_processing") == "true" else False
     length = metadata.get("bgs_length")
     width = metadata.get("bgs_width")
     origin = metadata.get("bgs_origin")
@@ -1361,167 +1477,313 @@ def generate_metadata_for_file(_plugin, filename, notify=False, force=False):
     if timestamp is None or created > timestamp:
         force = True
 
-    _plugin._logger.debug("_bgs: generate_metadata_for_file filename=[{}] notify=[{}] force=[{}] processing=[{}] length=[{}] width=[{}] origin=[{}]".format(filename, notify, force, processing, length, width, origin))
+    _plugin._logger.debug("_bgs: generate_metadata_for_file filename=[{}] notify=[{}] force=[{}] length=[{}] width=[{}] origin=[{}]".format(filename, notify, force, length, width, origin))
 
     if length is None or width is None or origin is None or force:
         _plugin._file_manager.remove_additional_metadata("local", filename, "bgs_width")
         _plugin._file_manager.remove_additional_metadata("local", filename, "bgs_length")
         _plugin._file_manager.remove_additional_metadata("local", filename, "bgs_origin")
 
-        if processing and notify:
-            threading.Thread(target=wait_for_metadata_processing, args=(_plugin, filename, notify)).start()
+        # the selected file goes to the front of the line (and tells the ui when it is done)
+        if notify:
+            _plugin.metadataScheduler.request(filename, lambda path, result: notify_selected_file(_plugin, path, result), PRIORITY_SELECTED)
         else:
-            _plugin._file_manager.set_additional_metadata("local", filename, "bgs_processing", "true", overwrite=True)
-            threading.Thread(target=defer_generate_metadata_for_file, args=(_plugin, filename, notify)).start()
+            _plugin.metadataScheduler.request(filename)
     else:
+        # analyzed before we kept a sidecar index / checked for errors (or before the machine changed)
+        if not jobindex.is_current(metadata.get("bgs_index"), get_machine_profile(_plugin).fingerprint()) or metadata.get("bgs_errors") is None:
+            _plugin.metadataScheduler.request(filename)
+
         if notify:
-            _plugin._plugin_manager.send_plugin_message(_plugin._identifier, dict(type="grbl_frame_size",
-                                                                                 length=length,
-                                                                                  width=width,
-                                                                                  origin=origin))
+            notify_selected_file(_plugin, filename, dict(length=length, width=width, origin=origin))
+
+def notify_optimized_file(_plugin, filename, optimized):
+    simplified = optimized.get("simplified")
+
+    if simplified is None or simplified["removed"] == 0:
+        return
+
+    _plugin._plugin_manager.send_plugin_message(_plugin._identifier, dict(type="simple_notify",
+                                                                         title="Simplified {}".format(filename),
+                                                                         text="{} of {} lines removed within {}mm<br>about {}s saved".format(
+                                                                             simplified["removed"],
+                                                                             optimized["lines"],
+                                                                             simplified["tolerance"],
+                                                                             simplified["saved"]),
+                                                                         hide=True,
+                                                                         delay=10000,
+                                                                         notify_type="info"))
 
-def defer_generate_metadata_for_file(_plugin, filename, notify):
-    _plugin._logger.debug("_bgs: defer_generate_metadata_for_file filename=[{}] notify=[{}]".format(filename, notify))
+def notify_selected_file(_plugin, filename, result):
+    notify_frame_size(_plugin, result)
+
+    # flag a job that will run past the machine's travel (or that grbl will
+    # reject a line of) before it gets the chance to
+    if not result is None:
+        preflight.preflight_file(_plugin, filename, notify=True)
+        check_gcode_errors(_plugin, filename, notify=True)
+
+def check_gcode_errors(_plugin, filename, notify=False):
+    # metadata only -- the errors grbl would answer the file's lines with (None if not checked yet)
+    metadata = _plugin._file_manager.get_metadata("local", filename) or {}
+    errors = metadata.get("bgs_errors")
+
+    if errors is None:
+        return None
+
+    errors = original_lines(_plugin, filename, describe_gcode_errors(_plugin, errors))
+
+    _plugin._logger.debug("_bgs: check_gcode_errors filename=[{}] errors=[{}]".format(filename, len(errors)))
+
+    if notify and len(errors) > 0:
+        notify_gcode_errors(_plugin, "{} Has G-Code Errors".format(filename), errors)
+
+    return errors
+
+def describe_gcode_errors(_plugin, errors):
+    # [line, error] pairs as something a person can read
+    return [dict(line=line, error=error, description=_plugin.grblErrors.get(error, "Grbl Error #{}".format(error))) for line, error in errors]
+
+def original_lines(_plugin, filename, items):
+    # an optimized upload no longer lines up with the file that was uploaded --
+    # anything with a "line" gets the "original" line it came from as well
+    metadata = _plugin._file_manager.get_metadata("local", filename) or {}
+    optimized = metadata.get("bgs_optimized")
+
+    if optimized is None or len(items) == 0:
+        return items
 
     try:
-        file = _plugin._file_manager.path_on_disk("local", filename)
-        created = os.path.getctime(file)
+        origins = optimizer.original_lines(os.path.join(jobindex.index_folder(_plugin), optimized["map"]), [item["line"] for item in items])
+
+        for item, origin in zip(items, origins):
+            item["original"] = origin
+    except Exception as e:
+        _plugin._logger.warning("_bgs: original_lines filename=[{}]: {}".format(filename, e))
+
+    return items
+
+def notify_gcode_errors(_plugin, title, errors, text=""):
+    lines = ["line {}{}: error:{} {}".format(error["line"],
+                                             "" if error.get("original") is None else " (original {})".format(error["original"]),
+                                             error["error"],
+                                             error["description"]) for error in errors[:5]]
+
+    if len(errors) > 5:
+        lines.append("... and {}{} more".format(len(errors) - 5, "+" if len(errors) >= validator.MAX_ERRORS else ""))
+
+    _plugin._plugin_manager.send_plugin_message(_plugin._identifier, dict(type="simple_notify",
+                                                                         title=title,
+                                                                         text=text + "<br>".join(lines),
+                                                                         hide=False,
+                                                                         delay=0,
+                                                                         notify_type="error"))
+
+def verify_on_controller(_plugin, filename):
+    # grbl's own opinion of a file -- streamed through check mode ($C)
+    if not _plugin._printer.is_operational() or _plugin._printer.is_printing() or _plugin.grblState.upper() != "IDLE":
+        return "Grbl must be idle to verify a file"
+
+    if not _plugin.realtime.is_available():
+        return "No direct connection to Grbl"
 
-        f = open(file, 'r')
+    if not _plugin.checkMode.start(_plugin._file_manager.path_on_disk("local", filename), filename):
+        return "A verification is already running"
+
+    _plugin._plugin_manager.send_plugin_message(_plugin._identifier, dict(type="simple_notify",
+                                                                         title="Verifying {}".format(filename),
+                                                                         text="Grbl is checking every line in check mode",
+                                                                         hide=True,
+                                                                         delay=10000,
+                                                                         notify_type="info"))
+    return None
 
-        minX = float("inf")
-        minY = float("inf")
-        maxX = float("-inf")
-        maxY = float("-inf")
+def notify_check_mode_result(_plugin, result):
+    _plugin._plugin_manager.send_plugin_message(_plugin._identifier, dict(result, type="check_mode_result"))
 
-        x = float(0)
-        y = float(0)
+    summary = "{} lines in {}s<br>".format(result["lines"], result["elapsed"])
 
-        overX = False
-        overY = False
-        underX = False
-        underY = False
+    if result["reason"] != "done":
+        alarm = result["alarm"]
+        where = "" if alarm is None or alarm["line"] is None else " at line {}".format(alarm["line"] if alarm.get("original") is None else alarm["original"])
 
-        lastGCommand = ""
-        positioning = _plugin.positioning
-        origin = ""
+        _plugin._plugin_manager.send_plugin_message(_plugin._identifier, dict(type="simple_notify",
+                                                                             title="Verification of {} Stopped{}".format(result["path"], where),
+                                                                             text=summary + result["reason"],
+                                                                             hide=False,
+                                                                             delay=0,
+                                                                             notify_type="error"))
+    elif len(result["errors"]) > 0:
+        notify_gcode_errors(_plugin, "Grbl Rejected {} Lines of {}".format(len(result["errors"]), result["path"]), result["errors"], summary)
+    else:
+        _plugin._plugin_manager.send_plugin_message(_plugin._identifier, dict(type="simple_notify",
+                                                                             title="Grbl Accepted {}".format(result["path"]),
+                                                                             text=summary + "no errors",
+                                                                             hide=True,
+                                                                             delay=10000,
+                                                                             notify_type="success"))
+
+def notify_frame_size(_plugin, result):
+    if result is None:
+        return
+
+    _plugin._plugin_manager.send_plugin_message(_plugin._identifier, dict(type="grbl_frame_size",
+                                                                         length=result["length"],
+                                                                          width=result["width"],
+                                                                          origin=result["origin"]))
+
+def defer_generate_metadata_for_file(_plugin, filename):
+    _plugin._logger.debug("_bgs: defer_generate_metadata_for_file filename=[{}]".format(filename))
+
+    try:
+        file = _plugin._file_manager.path_on_disk("local", filename)
+        created = os.path.getctime(file)
 
         start = timer()
 
-        for line in f:
-            # skip comments / etc
-            if line.upper().lstrip().startswith((";", "(", "%")): continue
-
-            # save our G command for shorthand post processors
-            if line.upper().lstrip().startswith("G"):
-                lastGCommand = line.lstrip()[:3] if line.lstrip()[2:3].isnumeric() else line.lstrip()[:2]
-
-            # use our saved G command if our line starts with a coordinate
-            if line.upper().lstrip().startswith(("X", "Y", "Z")):
-                command = lastGCommand.upper() + " " + line.upper().strip()
-            else:
-                command = line.upper().strip()
-
-            # only G commands matter (except G53)
-            if not command.upper().lstrip().startswith("G") or "G53" in command.upper():
-                continue
-
-            if "G90" in command.upper():
-                # absolute positioning
-                positioning = 0
-
-            if "G91" in command.upper():
-                # relative positioning
-                positioning = 1
-
-            # match = re.search(r"^G([0][0123]|[0123])(\D.*[Xx]|[Xx])\ *(-?[\d.]+).*", command)
-            match = re.search(r".*[X]\ *(-?[\d.]+).*", command)
-            # _plugin._logger.debug("command=[{}]".format(command))
-            if not match is None:
-                x = float(match.groups(1)[0]) if positioning == 0 else x + float(match.groups(1)[0])
-                if x < minX:
-                    if not underX and x < -1:
-                        _plugin._logger.debug("underX x=[{}]".format(x))
-                        underX = True
-                    minX = x
-                if x > maxX:
-                    if not overX and x > 1:
-                        _plugin._logger.debug("overX x=[{}]".format(x))
-                        overX = True
-                    maxX = x
-
-            # match = re.search(r"^G([0][0123]|[0123])(\D.*[Yy]|[Yy])\ *(-?[\d.]+).*", command)
-            match = re.search(r".*[Y]\ *(-?[\d.]+).*", command)
-            if not match is None:
-                y = float(match.groups(1)[0]) if positioning == 0 else y + float(match.groups(1)[0])
-                if y < minY:
-                    if not underY and y <= -1:
-                        _plugin._logger.debug("underY y=[{}]".format(y))
-                        underY = True
-                    minY = y
-                if y > maxY:
-                    if not overY and y > 1:
-                        _plugin._logger.debug("overY y=[{}]".format(y))
-                        overY = True
-                    maxY = y
-
-        length = math.ceil(maxY - minY)
-        width = math.ceil(maxX - minX)
-
-        # bottom
-        if overY and not underY and overX and not underX: origin = "grblBottomLeft"
-        if overY and not underY and overX and underX: origin = "grblBottomCenter"
-        if overY and not underY and not overX and underX: origin = "grblBottomRight"
-
-        # center
-        if overY and underY and overX and not underX: origin = "grblCenterLeft"
-        if overY and underY and overX and underX: origin = "grblCenter"
-        if overY and underY and not overX and underX: origin = "grblCenterRight"
-
-        # top
-        if not overY and underY and overX and not underX: origin = "grblTopLeft"
-        if not overY and underY and overX and underX: origin = "grblTopCenter"
-        if not overY and underY and not overX and underX: origin = "grblTopRight"
-
-        _plugin._file_manager.set_additional_metadata("local", filename, "bgs_length", length, overwrite=True)
-        _plugin._file_manager.set_additional_metadata("local", filename, "bgs_width", width, overwrite=True)
-        _plugin._file_manager.set_additional_metadata("local", filename, "bgs_origin", origin, overwrite=True)
-        _plugin._file_manager.set_additional_metadata("local", filename, "bgs_timestamp", created, overwrite=True)
-
-        _plugin._file_manager.remove_additional_metadata("local", filename, "bgs_processing")
-
-        _plugin._logger.debug('finished reading file=[{}] length=[{}] width=[{}] origin=[{}] positioning=[{}] time=[{}]'.format(filename, length, width, origin, positioning, timer() - start))
+        # same content (renamed, copied, uploaded again) -- same answer
+        digest = cache.content_hash(file)
+        analysis, index, estimate, axisBounds, errors = analyze_file(_plugin, file, digest)
 
-        if notify:
-            _plugin._plugin_manager.send_plugin_message(_plugin._identifier, dict(type="grbl_frame_size",
-                                                                             length=length,
-                                                                             width=width,
-                                                                             origin=origin))
+        length = analysis["length"]
+        width = analysis["width"]
+        origin = analysis["origin"]
+
+        store_metadata_for_file(_plugin, filename, file, length, width, origin, created, index, estimate, preflight.job_bounds(analysis, axisBounds), errors)
+
+        _plugin._logger.debug('finished reading file=[{}] length=[{}] width=[{}] origin=[{}] lines=[{}] estimate=[{}] errors=[{}] time=[{}]'.format(filename, length, width, origin, analysis["lines"], estimate, len(errors), timer() - start))
+
+        return dict(length=length, width=width, origin=origin)
     except BaseException as e:
         _plugin._logger.error("defer_generate_metadata_for_file: [{}]".format(str(e)))
 
-def wait_for_metadata_processing(_plugin, filename, notify):
-    _plugin._logger.debug("_bgs: wait_for_metadata_processing filename=[{}] notify=[{}]".format(filename, notify))
+    return None
+
+def analyze_file(_plugin, file, digest):
+    # the (possibly cached) extents analysis, the sidecar index (which goes by
+    # content too), the job time estimate, how far the job moves z / a / b and
+    # the [line, error] pairs grbl would answer the file with.  whatever is
+    # not cached or on disk already comes out of a single read of the file
+    extentsKey = _plugin.analysisCache.hash_key(digest, "extents", extents.VERSION, _plugin.positioning)
+    errorsKey = validation_key(_plugin, digest)
+
+    analysis = _plugin.analysisCache.get(extentsKey)
+    errors = _plugin.analysisCache.get(errorsKey)
+
+    profile = get_machine_profile(_plugin)
+    folder = jobindex.index_folder(_plugin)
+    index = jobindex.index_name(digest, _plugin.positioning, profile.fingerprint())
+    path = os.path.join(folder, index)
+
+    # the same content asked for twice at once gets built once
+    with jobindex.building(index):
+        builder = None if os.path.exists(path) else jobindex.IndexBuilder(_plugin.positioning, profile=profile)
+        checker = None if not errors is None else new_validator(_plugin)
+
+        if builder is None and checker is None:
+            # only the extents are missing -- a big file gets scanned in parallel
+            if analysis is None:
+                analysis = extents.scan(file, _plugin.positioning).summary()
+                _plugin.analysisCache.put(extentsKey, analysis)
+        else:
+            scanner = extents.Extents(_plugin.positioning) if analysis is None else None
+
+            try:
+                if os.path.getsize(file) > 0:
+                    with open(file, "rb") as f:
+                        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                            for chunk in extents.chunks(mm):
+                                if not scanner is None:
+                                    extents.scan_chunk(scanner, chunk)
+                                if not builder is None:
+                                    builder.feed_chunk(chunk)
+                                if not checker is None:
+                                    checker.feed_chunk(chunk)
+            except BaseException:
+                if not builder is None:
+                    builder.close()
+                raise
+
+            if not scanner is None:
+                analysis = scanner.summary()
+                _plugin.analysisCache.put(extentsKey, analysis)
+
+            if not builder is None:
+                builder.write(path)
+                jobindex.prune(folder, jobindex.MAX_INDEXES)
+
+            if not checker is None:
+                errors = [list(error) for error in checker.errors]
+                _plugin.analysisCache.put(errorsKey, errors)
+
+    reader = jobindex.JobIndex(path)
+    estimate = reader.total_time()
+    bounds = reader.bounds()
+    reader.close()
+
+    return analysis, index, estimate, bounds, errors
+
+def reaches_grbl(_plugin, command):
+    # whether an (upper cased) job line goes to grbl as written -- see hook_gcode_sending
+    return not "M105" in command and _plugin.commandRouter.sends(command)
+
+def new_validator(_plugin):
+    # grbl's parser as we feed it -- the lines we drop or rewrite never get there
+    axes = "XYZ" + ("A" if _plugin.hasA else "") + ("B" if _plugin.hasB else "")
+
+    return validator.Validator(_plugin.positioning, axes, lambda line: not reaches_grbl(_plugin, line))
+
+def new_optimizer(_plugin):
+    # rounds to what this machine's steppers can resolve (and collapses runs
+    # of tiny moves if we have a tolerance to do it within)
+    axes = "XYZ" + ("A" if _plugin.hasA else "") + ("B" if _plugin.hasB else "")
+    rewriter = None
+
+    if _plugin.simplifyTolerance > 0:
+        rewriter = simplifier.Simplifier(_plugin.simplifyTolerance, get_machine_profile(_plugin))
+
+    return optimizer.Optimizer(get_axes_steps_per_mm(_plugin), axes, rewriter)
+
+def validation_key(_plugin, digest):
+    return _plugin.analysisCache.hash_key(digest, "validate", validator.VERSION, _plugin.positioning, _plugin.hasA, _plugin.hasB)
+
+def store_metadata_for_file(_plugin, filename, file, length, width, origin, created=None, index=None, estimate=None, bounds=None, errors=None, optimized=None):
+    if created is None:
+        created = os.path.getctime(file)
 
-    metadata = _plugin._file_manager.get_metadata("local", filename)
-    processing = True if metadata.get("bgs_processing") == "true" else False
-    seconds = 0
-
-    while seconds < 300 and processing:
-        time.sleep(1)
-        metadata = _plugin._file_manager.get_metadata("local", filename)
-        processing = True if metadata.get("bgs_processing") == "true" else False
-        seconds += 1
-
-    if not processing and notify:
-        _plugin._plugin_manager.send_plugin_message(_plugin._identifier, dict(type="grbl_frame_size",
-                                                                            length=metadata.get("bgs_length"),
-                                                                             width=metadata.get("bgs_width"),
-                                                                             origin=metadata.get("bgs_origin")))
-    else:
-        _plugin._file_manager.remove_additional_metadata("local", filename, "bgs_processing")
-        _plugin._logger.warning("gave up waiting for metadata processing")
+    if not index is None:
+        _plugin._file_manager.set_additional_metadata("local", filename, "bgs_index", index, overwrite=True)
+
+    if not estimate is None:
+        _plugin._file_manager.set_additional_metadata("local", filename, "bgs_estimate", round(estimate), overwrite=True)
+
+    if not bounds is None:
+        _plugin._file_manager.set_additional_metadata("local", filename, "bgs_bounds", bounds, overwrite=True)
+
+    if not errors is None:
+        _plugin._file_manager.set_additional_metadata("local", filename, "bgs_errors", errors, overwrite=True)
+
+    if not optimized is None:
+        _plugin._file_manager.set_additional_metadata("local", filename, "bgs_optimized", optimized, overwrite=True)
 
+    _plugin._file_manager.set_additional_metadata("local", filename, "bgs_length", length, overwrite=True)
+    _plugin._file_manager.set_additional_metadata("local", filename, "bgs_width", width, overwrite=True)
+    _plugin._file_manager.set_additional_metadata("local", filename, "bgs_origin", origin, overwrite=True)
+    _plugin._file_manager.set_additional_metadata("local", filename, "bgs_timestamp", created, overwrite=True)
+
+def open_job_index(_plugin, filename):
+    # the sidecar index for a file (None if we do not have one -- yet)
+    try:
+        index = _plugin._file_manager.get_metadata("local", filename).get("bgs_index")
+
+        if not index is None:
+            path = os.path.join(jobindex.index_folder(_plugin), index)
+            if os.path.exists(path):
+                return jobindex.JobIndex(path)
+    except Exception as e:
+        _plugin._logger.warning("_bgs: open_job_index filename=[{}]: {}".format(filename, e))
+
+    return None
 
 def is_laser_mode(_plugin):
     try:
@@ -1579,7 +1841,12 @@ def defer_resuming_status_reports(_plugin, waitTime, showFinalize):
                                                                     hide=True,
                                                                 delay=15000,
                                                             notify_type="notice"))
-    time.sleep(waitTime)
+
+    _plugin.executor.schedule(waitTime, resume_status_reports, _plugin)
+
+
+def resume_status_reports(_plugin):
+    _plugin._logger.debug("_bgs: resume_status_reports")
     _plugin.noStatusRequests = False
 
 
@@ -1660,6 +1927,88 @@ def get_axes_max_rates(_plugin):
     return xf, yf, zf
 
 
+def get_axes_accelerations(_plugin):
+    _plugin._logger.debug("_bgs: get_axes_accelerations")
+
+    # seed with defaults
+    xa = 10.0
+    ya = 10.0
+    za = 10.0
+
+    try:
+        if is_grbl_fluidnc(_plugin):
+            xa = float(_plugin.fluidYaml.get("axes", {}).get("x", {}).get("acceleration_mm_per_sec2"))
+            ya = float(_plugin.fluidYaml.get("axes", {}).get("y", {}).get("acceleration_mm_per_sec2"))
+            za = float(_plugin.fluidYaml.get("axes", {}).get("z", {}).get("acceleration_mm_per_sec2"))
+        else:
+            xa = float(_plugin.grblSettings.get(120)[0])
+            ya = float(_plugin.grblSettings.get(121)[0])
+            za = float(_plugin.grblSettings.get(122)[0])
+    except Exception as e:
+        _plugin._logger.warn("_bgs: get_axes_accelerations: {}".format(e))
+
+    _plugin._logger.debug("_bgs: get_axes_accelerations x={} y={} z={}".format(xa, ya, za))
+    return xa, ya, za
+
+
+def get_axes_steps_per_mm(_plugin):
+    _plugin._logger.debug("_bgs: get_axes_steps_per_mm")
+
+    # seed with defaults
+    xs = optimizer.DEFAULT_STEPS_PER_MM
+    ys = optimizer.DEFAULT_STEPS_PER_MM
+    zs = optimizer.DEFAULT_STEPS_PER_MM
+
+    try:
+        if is_grbl_fluidnc(_plugin):
+            xs = float(_plugin.fluidYaml.get("axes", {}).get("x", {}).get("steps_per_mm"))
+            ys = float(_plugin.fluidYaml.get("axes", {}).get("y", {}).get("steps_per_mm"))
+            zs = float(_plugin.fluidYaml.get("axes", {}).get("z", {}).get("steps_per_mm"))
+        else:
+            xs = float(_plugin.grblSettings.get(100)[0])
+            ys = float(_plugin.grblSettings.get(101)[0])
+            zs = float(_plugin.grblSettings.get(102)[0])
+    except Exception as e:
+        _plugin._logger.warn("_bgs: get_axes_steps_per_mm: {}".format(e))
+
+    _plugin._logger.debug("_bgs: get_axes_steps_per_mm x={} y={} z={}".format(xs, ys, zs))
+    return xs, ys, zs
+
+
+def get_junction_deviation(_plugin):
+    junctionDeviation = .01
+
+    try:
+        if is_grbl_fluidnc(_plugin):
+            junctionDeviation = float(_plugin.fluidYaml.get("junction_deviation_mm", junctionDeviation))
+        else:
+            junctionDeviation = float(_plugin.grblSettings.get(11)[0])
+    except Exception as e:
+        _plugin._logger.warn("_bgs: get_junction_deviation: {}".format(e))
+
+    _plugin._logger.debug("_bgs: get_junction_deviation result=[{}]".format(junctionDeviation))
+    return junctionDeviation
+
+
+def get_arc_tolerance(_plugin):
+    arcTolerance = .002
+
+    try:
+        if is_grbl_fluidnc(_plugin):
+            arcTolerance = float(_plugin.fluidYaml.get("arc_tolerance_mm", arcTolerance))
+        else:
+            arcTolerance = float(_plugin.grblSettings.get(12)[0])
+    except Exception as e:
+        _plugin._logger.warn("_bgs: get_arc_tolerance: {}".format(e))
+
+    _plugin._logger.debug("_bgs: get_arc_tolerance result=[{}]".format(arcTolerance))
+    return arcTolerance
+
+
+def get_machine_profile(_plugin):
+    return MachineProfile(get_axes_max_rates(_plugin), get_axes_accelerations(_plugin), get_junction_deviation(_plugin))
+
+
 def get_axes_limits(_plugin):
     _plugin._logger.debug("_bgs: get_axes_limits")
 
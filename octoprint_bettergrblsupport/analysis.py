@@ -0,0 +1,93 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Written by:  Shell M. Shrader (https://github.com/synman/Octoprint-Bettergrblsupport)
+# Copyright [2021] [Shell M. Shrader]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# References
+#
+# https://docs.octoprint.org/en/master/plugins/hooks.html#octoprint-filemanager-analysis-factory
+# https://docs.octoprint.org/en/master/modules/filemanager.html#octoprint.filemanager.analysis.GcodeAnalysisQueue
+#
+import os
+import threading
+
+from octoprint.filemanager.analysis import AnalysisAborted, GcodeAnalysisQueue
+
+from . import _bgs
+from . import jobindex
+
+
+class GrblAnalysisQueue(GcodeAnalysisQueue):
+    # stands in for octoprint's own gcode analysis -- which knows nothing of
+    # grbl's planner (or lasers) -- so the estimated print time and printing
+    # area octoprint shows come from our job index and extents scan.  the
+    # work is the file's metadata job (see MetadataScheduler) -- we wait for
+    # it (if it has not already run) and read what it stored.  files added
+    # for any other profile get octoprint's analysis
+
+    _plugin = None
+
+    def __init__(self, finished_callback, _plugin):
+        GcodeAnalysisQueue.__init__(self, finished_callback)
+        self._plugin = _plugin
+
+
+    def _do_analysis(self, high_priority=False):
+        profile = self._current.printer_profile
+
+        if profile is None or profile.get("id") != "_bgs":
+            return GcodeAnalysisQueue._do_analysis(self, high_priority)
+
+        path = self._current.path
+        self._plugin._logger.debug("GrblAnalysisQueue: _do_analysis path=[{}] high_priority=[{}]".format(path, high_priority))
+
+        self._aborted = False
+
+        if self._plugin.metadataScheduler.is_pending(path) or not self._is_current(self._metadata(path)):
+            done = threading.Event()
+            self._plugin.metadataScheduler.request(path, lambda path, result: done.set())
+
+            while not done.wait(1.0):
+                if self._aborted:
+                    raise AnalysisAborted(reenqueue=self._reenqueue)
+
+        metadata = self._metadata(path)
+        bounds = metadata.get("bgs_bounds")
+
+        if bounds is None:
+            raise RuntimeError("{} has not been analyzed".format(path))
+
+        minX, maxX = bounds["x"]
+        minY, maxY = bounds["y"]
+        minZ, maxZ = bounds.get("z", (0.0, 0.0))
+
+        return dict(estimatedPrintTime=metadata.get("bgs_estimate"),
+                    printingArea=dict(minX=minX, maxX=maxX, minY=minY, maxY=maxY, minZ=minZ, maxZ=maxZ),
+                    dimensions=dict(width=maxX - minX, depth=maxY - minY, height=maxZ - minZ),
+                    filament={})
+
+
+    def _metadata(self, path):
+        return self._plugin._file_manager.get_metadata("local", path) or {}
+
+
+    def _is_current(self, metadata):
+        # stored by a metadata job since the file last changed (and with this machine's profile)
+        timestamp = metadata.get("bgs_timestamp")
+
+        return (not timestamp is None and os.path.getctime(self._current.absolute_path) <= timestamp and
+                not metadata.get("bgs_bounds") is None and not metadata.get("bgs_estimate") is None and
+                jobindex.is_current(metadata.get("bgs_index"), _bgs.get_machine_profile(self._plugin).fingerprint()))
@@ -0,0 +1,143 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Written by:  Shell M. Shrader (https://github.com/synman/Octoprint-Bettergrblsupport)
+# Copyright [2021] [Shell M. Shrader]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# References
+#
+# https://docs.python.org/3/library/hashlib.html#blake2
+# https://docs.octoprint.org/en/master/modules/plugin.html#octoprint.plugin.types.OctoPrintPlugin.get_plugin_data_folder
+#
+import hashlib
+import json
+import mmap
+import os
+import threading
+
+from collections import OrderedDict
+
+BLOCK_SIZE = 1 << 20
+
+
+def new_hash():
+    # blake2b runs far faster than any analysis we would do with the result
+    return hashlib.blake2b(digest_size=16)
+
+
+def content_hash(path):
+    digest = new_hash()
+
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size > 0:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for offset in range(0, len(mm), BLOCK_SIZE):
+                    digest.update(mm[offset:offset + BLOCK_SIZE])
+
+    return digest.hexdigest()
+
+
+class AnalysisCache:
+    # analysis results keyed by what was analyzed (file content) and how
+    # (analyzer name + version + whatever else went into it) -- so renames,
+    # copies and re-uploads never get scanned twice.  least recently used
+    # entries fall off the end and the whole thing lives in our data folder.
+
+    _plugin = None
+    _lock = None
+    _entries = None
+    _path = None
+
+    filename = "analysis_cache.json"
+    maxEntries = 500
+
+    def __init__(self, _plugin, filename="analysis_cache.json", maxEntries=500):
+        self._plugin = _plugin
+        self._lock = threading.Lock()
+        self._entries = None
+        self._path = None
+
+        self.filename = filename
+        self.maxEntries = maxEntries
+
+
+    def key(self, path, analyzer, *params):
+        return self.hash_key(content_hash(path), analyzer, *params)
+
+
+    def hash_key(self, digest, analyzer, *params):
+        return ":".join([analyzer] + [str(param) for param in params] + [digest])
+
+
+    def get(self, key):
+        with self._lock:
+            entries = self._load()
+            value = entries.get(key)
+
+            if not value is None:
+                entries.move_to_end(key)
+
+            return value
+
+
+    def put(self, key, value):
+        with self._lock:
+            entries = self._load()
+            entries[key] = value
+            entries.move_to_end(key)
+
+            while len(entries) > self.maxEntries:
+                entries.popitem(last=False)
+
+            self._save()
+
+
+    def clear(self):
+        with self._lock:
+            self._load().clear()
+            self._save()
+
+
+    def __len__(self):
+        with self._lock:
+            return len(self._load())
+
+
+    def _load(self):
+        # first use -- our data folder is not available until we are injected
+        if self._entries is None:
+            self._path = os.path.join(self._plugin.get_plugin_data_folder(), self.filename)
+            self._entries = OrderedDict()
+
+            try:
+                if os.path.exists(self._path):
+                    with open(self._path, "r") as f:
+                        self._entries.update(json.load(f))
+            except Exception as e:
+                self._plugin._logger.warning("AnalysisCache: unable to load [{}]: {}".format(self._path, e))
+
+        return self._entries
+
+
+    def _save(self):
+        try:
+            temp = self._path + ".tmp"
+
+            with open(temp, "w") as f:
+                json.dump(list(self._entries.items()), f)
+
+            os.replace(temp, self._path)
+        except Exception as e:
+            self._plugin._logger.warning("AnalysisCache: unable to save [{}]: {}".format(self._path, e))
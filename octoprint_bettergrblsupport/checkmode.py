@@ -0,0 +1,353 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Written by:  Shell M. Shrader (https://github.com/synman/Octoprint-Bettergrblsupport)
+# Copyright [2021] [Shell M. Shrader]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# References
+#
+# https://github.com/gnea/grbl/wiki/Grbl-v1.1-Commands#c---check-gcode-mode
+# https://github.com/gnea/grbl/wiki/Grbl-v1.1-Interface#streaming-protocol-character-counting-recommended-with-reservation
+# https://github.com/gnea/grbl/blob/master/doc/script/stream.py
+#
+import mmap
+import os
+import threading
+import time
+
+from collections import deque
+from timeit import default_timer as timer
+
+from . import _bgs
+from . import extents
+from . import streaming
+from . import validator
+
+# how long grbl gets to answer before we give up on it
+RESPONSE_TIMEOUT = 10
+
+# how long turning check mode on / off gets
+TOGGLE_TIMEOUT = 5
+
+# lines are written in batches of (at most) this many bytes
+BATCH_SIZE = 64
+
+# queued through octoprint -- its send loop stays with us (park) until we are done
+PARK_COMMAND = "BGS_CHECK_MODE"
+
+
+class CheckModeVerifier:
+    # runs a file through grbl's own parser ($C check mode) without going
+    # through octoprint's send queue.  lines go straight onto the wire --
+    # compacted and as many as grbl's rx buffer holds (character counting)
+    # -- and every ok / error: is matched up with the file line it answers.
+    # grbl leaves check mode with a soft reset once the last line is in.
+    #
+    # nothing is written until octoprint's send loop has reached PARK_COMMAND
+    # and is held in park() -- none of its lines can go out alongside ours and
+    # everything it sent before has been answered.
+
+    _plugin = None
+    _condition = None
+    _inflight = None
+    _thread = None
+    _cancelled = False
+    _parked = False
+
+    active = False
+    path = None
+    bufferSize = streaming.DEFAULT_RX_BUFFER_SIZE
+    buffered = 0
+    lines = 0
+    errors = None
+    alarm = None
+    result = None
+
+    def __init__(self, _plugin):
+        self._plugin = _plugin
+        self._condition = threading.Condition()
+        self._inflight = deque()
+        self._thread = None
+        self._cancelled = False
+        self._parked = False
+
+        self.active = False
+        self.path = None
+        self.bufferSize = streaming.DEFAULT_RX_BUFFER_SIZE
+        self.buffered = 0
+        self.lines = 0
+        self.errors = []
+        self.alarm = None
+        self.result = None
+
+
+    def start(self, path, filename):
+        # path is the file on disk, filename what it is called in octoprint
+        self._plugin._logger.debug("CheckModeVerifier: start path=[{}]".format(path))
+
+        with self._condition:
+            if self.active:
+                return False
+
+            self._inflight.clear()
+            self._cancelled = False
+            self._parked = False
+
+            self.active = True
+            self.path = filename
+            self.bufferSize = streaming.rx_buffer_size(self._plugin.grblVersion)
+            self.buffered = 0
+            self.lines = 0
+            self.errors = []
+            self.alarm = None
+            self.result = None
+
+        self._thread = threading.Thread(target=self._run, args=(path, ), daemon=True)
+        self._thread.start()
+
+        self._plugin._printer.commands(PARK_COMMAND)
+        return True
+
+
+    def park(self):
+        # called from octoprint's send loop (hook_gcode_sending) -- holds it until we are done
+        with self._condition:
+            if not self.active or self._parked:
+                return
+
+            self._plugin._logger.debug("CheckModeVerifier: parked octoprint's send loop")
+
+            self._parked = True
+            self._condition.notify_all()
+
+            while self.active:
+                self._condition.wait(1)
+
+
+    def cancel(self):
+        self._plugin._logger.debug("CheckModeVerifier: cancel active=[{}]".format(self.active))
+
+        with self._condition:
+            self._cancelled = True
+            self._condition.notify_all()
+
+
+    def receive(self, line):
+        # called for every line grbl sends while we are active -- true if it was ours
+        response = line.strip().lower()
+
+        if response.startswith("ok") or response.startswith("error:"):
+            with self._condition:
+                if len(self._inflight) == 0:
+                    return False
+
+                length, number = self._inflight.popleft()
+                self.buffered -= length
+
+                if response.startswith("error:"):
+                    try:
+                        error = int(response[6:].strip())
+                    except ValueError:
+                        error = 0
+
+                    self.errors.append((number, error))
+
+                self._condition.notify_all()
+
+            return True
+
+        if response.startswith("alarm:"):
+            # grbl has flushed its rx buffer -- nothing more is coming back
+            with self._condition:
+                self.alarm = (self._inflight[0][1] if len(self._inflight) > 0 else None, line.strip())
+                self._inflight.clear()
+                self.buffered = 0
+                self._cancelled = True
+                self._condition.notify_all()
+
+        return False
+
+
+    def _run(self, path):
+        start = timer()
+        reason = "done"
+
+        try:
+            if not self._wait_for_sender(RESPONSE_TIMEOUT):
+                reason = "cancelled"
+            elif not self._send(0, b"$C") or not self._drain(TOGGLE_TIMEOUT):
+                reason = "unable to enter check mode"
+            elif len(self.errors) > 0:
+                reason = "unable to enter check mode ({})".format(self._plugin.grblErrors.get(self.errors[0][1], "error:{}".format(self.errors[0][1])))
+                self.errors = []
+            else:
+                reason = self._stream(path)
+        except Exception as e:
+            self._plugin._logger.error("CheckModeVerifier: [{}]".format(e))
+            reason = str(e)
+
+        # a soft reset takes us out of check mode (and flushes whatever is left) --
+        # $C does the same but only if the rx buffer is empty and we are still in check mode
+        if not self._parked:
+            pass
+        elif reason == "done" and self.alarm is None:
+            # its ok is ours as well -- we stay active until it is in or it would reach octoprint
+            try:
+                if not self._send(0, b"$C") or not self._drain(TOGGLE_TIMEOUT, cancellable=False):
+                    self._plugin._logger.warning("CheckModeVerifier: unable to leave check mode")
+            except IOError as e:
+                self._plugin._logger.warning("CheckModeVerifier: unable to leave check mode: {}".format(e))
+        else:
+            self._plugin.realtime.write("\x18")
+
+        with self._condition:
+            self._inflight.clear()
+            self.buffered = 0
+            self.active = False
+            self._condition.notify_all()
+
+        alarm = None if self.alarm is None else dict(line=self.alarm[0], alarm=self.alarm[1])
+        if not alarm is None and not alarm["line"] is None:
+            _bgs.original_lines(self._plugin, self.path, [alarm])
+
+        self.result = dict(path=self.path,
+                           lines=self.lines,
+                           errors=_bgs.original_lines(self._plugin, self.path, _bgs.describe_gcode_errors(self._plugin, self.errors)),
+                           alarm=alarm,
+                           reason=reason,
+                           elapsed=round(timer() - start, 1))
+
+        self._plugin._logger.debug("CheckModeVerifier: finished path=[{}] lines=[{}] errors=[{}] alarm=[{}] reason=[{}] elapsed=[{}]".format(
+            self.path, self.lines, len(self.errors), self.alarm, reason, self.result["elapsed"]))
+
+        _bgs.notify_check_mode_result(self._plugin, self.result)
+
+
+    def _stream(self, path):
+        sends = lambda line: _bgs.reaches_grbl(self._plugin, line)
+        batch = bytearray()
+
+        if os.path.getsize(path) == 0:
+            return "done"
+
+        with open(path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for chunk in extents.chunks(mm):
+                    # what grbl would be left with anyway -- less to send
+                    compact = chunk.upper()
+                    if b"(" in compact or b";" in compact:
+                        compact = validator.COMMENT.sub(b"", compact)
+                    lines = compact.translate(None, validator.WHITESPACE).split(b"\n")
+                    lines.pop()
+
+                    for line in lines:
+                        self.lines += 1
+
+                        if len(line) == 0 or not sends(line.decode("latin-1")):
+                            continue
+
+                        line += b"\n"
+                        length = len(line)
+
+                        with self._condition:
+                            full = len(batch) + length > BATCH_SIZE or self.buffered + length > self.bufferSize
+
+                        # out goes what we have whenever grbl's buffer (or our batch) is full --
+                        # never holding _condition, receive() needs it to hear back from grbl
+                        if full:
+                            self._flush(batch)
+                            batch = bytearray()
+
+                            with self._condition:
+                                if not self._wait_for_room(length):
+                                    return "cancelled" if self.alarm is None else self.alarm[1]
+
+                        with self._condition:
+                            self._inflight.append((length, self.lines))
+                            self.buffered += length
+
+                        batch += line
+
+        self._flush(batch)
+
+        if not self._drain(RESPONSE_TIMEOUT):
+            return "cancelled" if self.alarm is None else self.alarm[1]
+
+        return "done"
+
+
+    def _send(self, number, line):
+        line = line + b"\n"
+
+        with self._condition:
+            self._inflight.append((len(line), number))
+            self.buffered += len(line)
+
+        return self._plugin.realtime.send(line)
+
+
+    def _flush(self, batch):
+        if len(batch) > 0 and not self._plugin.realtime.send(bytes(batch)):
+            raise IOError("unable to write to the serial port")
+
+
+    def _wait_for_room(self, length):
+        # called holding _condition -- false if we are done for
+        deadline = time.time() + RESPONSE_TIMEOUT
+
+        while len(self._inflight) > 0 and self.buffered + length > self.bufferSize:
+            if self._cancelled:
+                return False
+
+            if time.time() > deadline:
+                raise IOError("no response from grbl in {} seconds".format(RESPONSE_TIMEOUT))
+
+            self._condition.wait(1)
+
+        return not self._cancelled
+
+
+    def _wait_for_sender(self, timeout):
+        # wait for octoprint's send loop to reach park()
+        deadline = time.time() + timeout
+
+        with self._condition:
+            while not self._parked:
+                if self._cancelled:
+                    return False
+
+                if time.time() > deadline:
+                    raise IOError("octoprint did not hand over the serial port in {} seconds".format(timeout))
+
+                self._condition.wait(1)
+
+        return not self._cancelled
+
+
+    def _drain(self, timeout, cancellable=True):
+        # wait for grbl to answer everything in flight
+        deadline = time.time() + timeout
+
+        with self._condition:
+            while len(self._inflight) > 0:
+                if self._cancelled and cancellable:
+                    return False
+
+                if time.time() > deadline:
+                    raise IOError("no response from grbl in {} seconds".format(timeout))
+
+                self._condition.wait(1)
+
+        return not (self._cancelled and cancellable)
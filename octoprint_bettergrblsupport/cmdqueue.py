@@ -0,0 +1,116 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Written by:  Shell M. Shrader (https://github.com/synman/Octoprint-Bettergrblsupport)
+# Copyright [2021] [Shell M. Shrader]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import threading
+
+from collections import deque
+
+# states in which grbl is ready for the next queued command
+DRAIN_STATES = ("IDLE", "HOLD:0", "DOOR:0", "CHECK", "ALARM")
+
+
+class CommandQueue:
+    # commands that have to wait for grbl to settle down before they are sent
+    # -- one goes out per status report that finds grbl in a drain state.
+    # waiters sleep on a condition until the queue empties (or is cancelled)
+
+    _plugin = None
+    _items = None
+    _condition = None
+    _generation = 0
+
+    def __init__(self, _plugin):
+        self._plugin = _plugin
+        self._items = deque()
+        self._condition = threading.Condition()
+        self._generation = 0
+
+
+    def __len__(self):
+        return len(self._items)
+
+
+    def __getitem__(self, index):
+        return self._items[index]
+
+
+    def append(self, cmd):
+        with self._condition:
+            self._items.append(cmd)
+
+
+    def extend(self, cmds):
+        with self._condition:
+            self._items.extend(cmds)
+
+
+    def pop(self):
+        with self._condition:
+            if len(self._items) == 0:
+                return None
+
+            cmd = self._items.popleft()
+
+            if len(self._items) == 0:
+                self._condition.notify_all()
+
+        return cmd
+
+
+    def clear(self):
+        # anybody waiting on us gets told the queue was cancelled
+        with self._condition:
+            self._items.clear()
+            self._generation += 1
+            self._condition.notify_all()
+
+
+    def wait_empty(self, timeout=None):
+        # true if the queue drained -- false if it was cleared or we timed out
+        with self._condition:
+            generation = self._generation
+
+            drained = self._condition.wait_for(lambda: len(self._items) == 0 or self._generation != generation, timeout)
+
+            return drained and self._generation == generation
+
+
+    def drain(self, state):
+        # send the next command if grbl is ready for it
+        if len(self._items) == 0 or not state.upper() in DRAIN_STATES:
+            return False
+
+        with self._condition:
+            if len(self._items) == 0:
+                return False
+
+            cmd = self._items[0]
+            generation = self._generation
+
+        self._plugin._logger.debug('sending queued command [%s] - depth [%d]', cmd, len(self._items))
+        self._plugin._printer.commands(cmd)
+
+        # only wake our waiters once the command is on its way
+        with self._condition:
+            if self._generation == generation and len(self._items) > 0:
+                self._items.popleft()
+
+                if len(self._items) == 0:
+                    self._condition.notify_all()
+
+        return True
@@ -0,0 +1,223 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Written by:  Shell M. Shrader (https://github.com/synman/Octoprint-Bettergrblsupport)
+# Copyright [2021] [Shell M. Shrader]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# References
+#
+# https://github.com/gnea/grbl/blob/master/grbl/planner.c
+# https://onehossshay.wordpress.com/2011/09/24/improving_grbl_cornering_algorithm/
+# https://github.com/gnea/grbl/wiki/Grbl-v1.1-Configuration#11--junction-deviation-mm
+#
+import array
+import hashlib
+import math
+
+# grbl's planner buffer -- how far ahead it can see when it plans a block
+PLANNER_BLOCKS = 16
+
+# a move is planned against at least PLANNER_BLOCKS that follow it.  we plan
+# a batch of them at once so that each pass over the buffer is amortized
+BATCH = 2 * PLANNER_BLOCKS
+
+MINIMUM_LENGTH = 1e-6
+
+
+class MachineProfile:
+    # the bits of $$ (or the FluidNC config) that decide how long a job takes
+
+    rates = (1000.0, 1000.0, 300.0)
+    accelerations = (10.0, 10.0, 10.0)
+    junctionDeviation = .01
+
+    def __init__(self, rates=(1000.0, 1000.0, 300.0), accelerations=(10.0, 10.0, 10.0), junctionDeviation=.01):
+        self.rates = tuple(float(rate) for rate in rates)
+        self.accelerations = tuple(float(acceleration) for acceleration in accelerations)
+        self.junctionDeviation = float(junctionDeviation)
+
+
+    def fingerprint(self):
+        # estimates made with a different profile are stale
+        profile = "{}:{}:{}".format(self.rates, self.accelerations, self.junctionDeviation)
+        return hashlib.blake2b(profile.encode(), digest_size=4).hexdigest()
+
+
+    def limits(self, unit):
+        # max speed (mm/min) and acceleration (mm/sec^2) along a direction --
+        # whichever axis runs out first
+        rate = acceleration = float("inf")
+        rates = self.rates
+        accelerations = self.accelerations
+
+        # called for every move -- no min() / enumerate() in here
+        for axis in range(3):
+            component = unit[axis]
+            if component < 0:
+                component = -component
+
+            if component > MINIMUM_LENGTH:
+                limit = rates[axis] / component
+                if limit < rate:
+                    rate = limit
+
+                limit = accelerations[axis] / component
+                if limit < acceleration:
+                    acceleration = limit
+
+        return rate, acceleration
+
+
+def junction_speed_sqr(profile, previous, unit, acceleration):
+    # grbl's junction deviation -- how fast we can take the corner between
+    # two moves without exceeding acceleration around an imaginary arc
+    cosine = -(previous[0] * unit[0] + previous[1] * unit[1] + previous[2] * unit[2])
+
+    # full reversal
+    if cosine > .999999:
+        return 0.0
+
+    # straight through
+    if cosine < -.999999:
+        return float("inf")
+
+    sine = math.sqrt(.5 * (1.0 - cosine))
+    return acceleration * profile.junctionDeviation * sine / (1.0 - sine)
+
+
+def trapezoid_time(length, entry, exit, nominal, acceleration):
+    # entry / exit / nominal are speeds squared (mm/sec)
+    accelerate = max(nominal - entry, 0) / (2 * acceleration)
+    decelerate = max(nominal - exit, 0) / (2 * acceleration)
+
+    if accelerate + decelerate <= length:
+        cruise = math.sqrt(nominal)
+        return ((cruise - math.sqrt(entry)) + (cruise - math.sqrt(exit))) / acceleration + (length - accelerate - decelerate) / cruise
+
+    # never reaches nominal -- a triangle
+    peak = math.sqrt(max((2 * acceleration * length + entry + exit) / 2, 0))
+    return ((peak - math.sqrt(entry)) + (peak - math.sqrt(exit))) / acceleration
+
+
+class Estimator:
+    # runs moves through the same trapezoidal planner grbl does and keeps a
+    # running total of how long the job has taken after each line
+
+    def __init__(self, profile):
+        self.profile = profile
+        self.total = 0.0
+        self.times = array.array("f")
+
+        # pending blocks: [line, length, nominal^2, acceleration, max entry^2, entry^2]
+        self._blocks = []
+        self._previous = None
+        self._previousNominal = 0.0
+
+
+    def move(self, line, length, start, end=None, feed=None, radius=None):
+        # start / end are unit vectors (end differs from start for arcs).
+        # feed is mm/min -- None for a rapid
+        if length < MINIMUM_LENGTH:
+            return
+
+        rate, acceleration = self.profile.limits(start)
+        nominal = rate if feed is None or feed <= 0 else min(feed, rate)
+        nominal = nominal / 60.0
+
+        # going around an arc is cornering too
+        if not radius is None and radius > 0:
+            nominal = min(nominal, math.sqrt(acceleration * radius))
+
+        nominal = nominal * nominal
+
+        if self._previous is None:
+            maxEntry = 0.0
+        else:
+            maxEntry = min(junction_speed_sqr(self.profile, self._previous, start, acceleration), nominal, self._previousNominal)
+
+        self._blocks.append([line, length, nominal, acceleration, maxEntry, 0.0])
+        self._previous = start if end is None else end
+        self._previousNominal = nominal
+
+        if len(self._blocks) >= BATCH + PLANNER_BLOCKS:
+            self._plan()
+            self._commit(len(self._blocks) - PLANNER_BLOCKS)
+
+
+    def sync(self):
+        # grbl waits for the buffer to empty (M commands, dwell, end of job)
+        self._plan()
+        self._commit(len(self._blocks))
+        self._previous = None
+
+
+    def dwell(self, line, seconds):
+        self.sync()
+        self._advance(line, max(seconds, 0))
+
+
+    def finish(self, lines):
+        self.sync()
+
+        while len(self.times) < lines:
+            self.times.append(self.total)
+
+        return self.total
+
+
+    def _plan(self):
+        blocks = self._blocks
+        if len(blocks) == 0:
+            return
+
+        # backward -- everything has to be able to stop at the end of the buffer
+        following = 0.0
+        for block in reversed(blocks[1:]):
+            block[5] = min(block[4], following + 2 * block[3] * block[1])
+            following = block[5]
+
+        # forward -- from the (already committed) speed we enter the buffer at
+        for i in range(len(blocks) - 1):
+            block = blocks[i]
+            reachable = block[5] + 2 * block[3] * block[1]
+
+            if blocks[i + 1][5] > reachable:
+                blocks[i + 1][5] = reachable
+
+
+    def _commit(self, count):
+        blocks = self._blocks
+
+        for i in range(count):
+            line, length, nominal, acceleration, maxEntry, entry = blocks[i]
+            exit = blocks[i + 1][5] if i + 1 < len(blocks) else 0.0
+
+            self._advance(line, trapezoid_time(length, entry, exit, nominal, acceleration))
+
+        del blocks[:count]
+
+
+    def _advance(self, line, seconds):
+        times = self.times
+
+        while len(times) < line:
+            times.append(self.total)
+
+        self.total += seconds
+
+        if len(times) == line:
+            times.append(self.total)
+        else:
+            times[line] = self.total
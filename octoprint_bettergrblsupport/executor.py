@@ -0,0 +1,186 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Written by:  Shell M. Shrader (https://github.com/synman/Octoprint-Bettergrblsupport)
+# Copyright [2021] [Shell M. Shrader]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# References
+#
+# https://docs.python.org/3/library/concurrent.futures.html#threadpoolexecutor
+#
+import heapq
+import itertools
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ScheduledTask:
+    __slots__ = ("when", "fn", "args", "kwargs", "cancelled")
+
+    def __init__(self, when, fn, args, kwargs):
+        self.when = when
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.cancelled = False
+
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class Executor:
+    # one small pool of named workers for everything _bgs used to spawn a
+    # thread for, plus a single scheduler thread for delayed work (instead of
+    # a worker sitting in time.sleep)
+
+    _plugin = None
+    _pool = None
+    _lock = None
+    _condition = None
+    _scheduled = None
+    _sequence = None
+    _thread = None
+
+    workers = 4
+    running = False
+
+    def __init__(self, _plugin, workers=4):
+        self._plugin = _plugin
+        self._pool = None
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self._scheduled = []
+        self._sequence = itertools.count()
+        self._thread = None
+
+        self.workers = workers
+        self.running = False
+
+        self._pending = 0
+        self._active = 0
+        self._completed = 0
+        self._failed = 0
+        self._latency = 0.0
+        self._maxLatency = 0.0
+
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return
+
+            self._plugin._logger.debug("Executor: start workers=[{}]".format(self.workers))
+
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bgs.worker")
+            self.running = True
+
+            self._thread = threading.Thread(target=self._run, name="bgs.scheduler")
+            self._thread.daemon = True
+            self._thread.start()
+
+
+    def shutdown(self):
+        with self._lock:
+            if not self.running:
+                return
+
+            self._plugin._logger.debug("Executor: shutdown stats=[{}]".format(self._stats()))
+
+            self.running = False
+            self._scheduled = []
+            self._condition.notify_all()
+
+        self._pool.shutdown(wait=False)
+
+
+    def submit(self, fn, *args, **kwargs):
+        if not self.running:
+            self.start()
+
+        with self._lock:
+            self._pending += 1
+
+        return self._pool.submit(self._call, time.time(), fn, args, kwargs)
+
+
+    def schedule(self, delay, fn, *args, **kwargs):
+        # run fn on a worker in delay seconds -- returns something to cancel()
+        if not self.running:
+            self.start()
+
+        task = ScheduledTask(time.time() + delay, fn, args, kwargs)
+
+        with self._condition:
+            heapq.heappush(self._scheduled, (task.when, next(self._sequence), task))
+            self._condition.notify()
+
+        return task
+
+
+    def stats(self):
+        with self._lock:
+            return self._stats()
+
+
+    def _stats(self):
+        return dict(workers=self.workers,
+                    pending=self._pending,
+                    active=self._active,
+                    scheduled=len(self._scheduled),
+                    completed=self._completed,
+                    failed=self._failed,
+                    averageLatency=round(self._latency / self._completed, 4) if self._completed > 0 else 0.0,
+                    maxLatency=round(self._maxLatency, 4))
+
+
+    def _call(self, queued, fn, args, kwargs):
+        # latency is the time spent waiting for a free worker
+        latency = time.time() - queued
+
+        with self._lock:
+            self._pending -= 1
+            self._active += 1
+            self._latency += latency
+            self._maxLatency = max(self._maxLatency, latency)
+
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            with self._lock:
+                self._failed += 1
+            self._plugin._logger.exception("Executor: {} failed: {}".format(getattr(fn, "__name__", fn), e))
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._completed += 1
+
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self.running and (len(self._scheduled) == 0 or self._scheduled[0][0] > time.time()):
+                    timeout = None if len(self._scheduled) == 0 else self._scheduled[0][0] - time.time()
+                    self._condition.wait(timeout)
+
+                if not self.running:
+                    return
+
+                task = heapq.heappop(self._scheduled)[2]
+
+            if not task.cancelled:
+                self.submit(task.fn, *task.args, **task.kwargs)
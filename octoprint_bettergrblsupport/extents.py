@@ -0,0 +1,582 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Written by:  Shell M. Shrader (https://github.com/synman/Octoprint-Bettergrblsupport)
+# Copyright [2021] [Shell M. Shrader]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# References
+#
+# https://linuxcnc.org/docs/html/gcode/g-code.html#gcode:g2-g3
+# https://github.com/gnea/grbl/wiki/Grbl-v1.1-Commands#g-code-commands
+# https://docs.python.org/3/library/mmap.html
+#
+import math
+import mmap
+import multiprocessing
+import os
+import re
+
+from concurrent.futures import ProcessPoolExecutor
+
+# every word we care about, every line end and every comment (so that the
+# words inside it are skipped) -- findall hands a whole chunk of the file
+# back in a single call and everything else (S, F, M, ...) is never even
+# turned into a python object
+TOKEN = re.compile(rb"([GXYIJR])[ \t]*([-+]?(?:\d+\.?\d*|\.\d+))|(\n)|\([^)\n]*\)?|;[^\n]*")
+
+# the absolute-only fast path -- comments are matched (and thrown away) so
+# that a number inside one is never mistaken for an axis word
+GCODES = re.compile(rb"G[ \t]*([\d.]+)")
+AXIS_X = re.compile(rb"\([^)\n]*\)?|;[^\n]*|X[ \t]*([-+]?(?:\d+\.?\d*|\.\d+))")
+AXIS_Y = re.compile(rb"\([^)\n]*\)?|;[^\n]*|Y[ \t]*([-+]?(?:\d+\.?\d*|\.\d+))")
+
+# g codes that leave us in absolute, metric, straight line moves
+MOTION = (b"0", b"00", b"1", b"01")
+ABSOLUTE = set(MOTION + (b"4", b"04", b"17", b"21", b"54", b"55", b"56", b"57", b"58", b"59", b"90", b"94"))
+
+# small enough to keep memory flat regardless of file size
+CHUNK_SIZE = 1 << 18
+
+# below this a process pool costs more than it saves
+PARALLEL_SIZE = 1 << 26
+RANGES_PER_WORKER = 4
+
+# bump whenever a change here changes what a scan returns (it is part of
+# the analysis cache key)
+VERSION = 2
+
+MM_PER_INCH = 25.4
+
+# axis words on these lines are not a move in the current coordinate system
+NON_MOTION = (10, 28, 30, 53, 92)
+
+HALF_PI = math.pi / 2
+TWO_PI = math.pi * 2
+
+
+class Extents:
+    # the x/y extents of everything a file moves to -- plus the modal state
+    # we need to carry from one chunk of the file into the next
+
+    __slots__ = ("minX", "maxX", "minY", "maxY", "relMinX", "relMaxX", "relMinY", "relMaxY", "x", "y", "scale", "relative",
+                 "arcRelative", "motion", "plane", "lines", "anchoredX", "anchoredY", "dependent")
+
+    def __init__(self, positioning=0):
+        self.minX = float("inf")
+        self.maxX = float("-inf")
+        self.minY = float("inf")
+        self.maxY = float("-inf")
+
+        # where an axis went before anything pinned it down -- as an offset
+        # from wherever it was when the scan started
+        self.relMinX = float("inf")
+        self.relMaxX = float("-inf")
+        self.relMinY = float("inf")
+        self.relMaxY = float("-inf")
+
+        self.x = 0.0
+        self.y = 0.0
+        self.scale = 1.0
+        self.relative = positioning == 1
+        self.arcRelative = True
+        self.motion = 0
+        self.plane = 17
+
+        self.lines = 0
+
+        # set once an absolute move pins an axis down -- until then x / y are
+        # offsets from the start too.  an arc to an absolute end point (or
+        # around an absolute center) before that is the one thing we can not
+        # shift into place
+        self.anchoredX = False
+        self.anchoredY = False
+        self.dependent = False
+
+
+    def modal(self):
+        # the part of our state that changes what a scan of the next chunk
+        # finds (G0 and G1 are the same thing as far as extents go)
+        return (self.relative, self.scale, 1 if self.motion in (0, 1) else self.motion, self.plane, self.arcRelative)
+
+
+    def set_modal(self, modal):
+        self.relative, self.scale, self.motion, self.plane, self.arcRelative = modal
+
+
+    def merge(self, part):
+        # part was scanned starting from our modal state -- so it simply
+        # continues from where we left off.  what it did before it knew where
+        # it was gets shifted there (and into our own offsets if we do not know either)
+        self.minX = min(self.minX, part.minX)
+        self.maxX = max(self.maxX, part.maxX)
+        self.minY = min(self.minY, part.minY)
+        self.maxY = max(self.maxY, part.maxY)
+
+        if self.anchoredX:
+            self.minX = min(self.minX, self.x + part.relMinX)
+            self.maxX = max(self.maxX, self.x + part.relMaxX)
+        else:
+            self.relMinX = min(self.relMinX, self.x + part.relMinX)
+            self.relMaxX = max(self.relMaxX, self.x + part.relMaxX)
+
+        if self.anchoredY:
+            self.minY = min(self.minY, self.y + part.relMinY)
+            self.maxY = max(self.maxY, self.y + part.relMaxY)
+        else:
+            self.relMinY = min(self.relMinY, self.y + part.relMinY)
+            self.relMaxY = max(self.relMaxY, self.y + part.relMaxY)
+
+        self.x = part.x if part.anchoredX else self.x + part.x
+        self.y = part.y if part.anchoredY else self.y + part.y
+
+        self.anchoredX = self.anchoredX or part.anchoredX
+        self.anchoredY = self.anchoredY or part.anchoredY
+        self.dependent = self.dependent or part.dependent
+
+        self.relative = part.relative
+        self.scale = part.scale
+        self.motion = part.motion
+        self.plane = part.plane
+        self.arcRelative = part.arcRelative
+
+        self.lines += part.lines
+
+
+    def add(self, x, y):
+        if x < self.minX: self.minX = x
+        if x > self.maxX: self.maxX = x
+        if y < self.minY: self.minY = y
+        if y > self.maxY: self.maxY = y
+
+
+    def bounds(self):
+        # a whole file starts at 0,0 -- so its offsets are positions too
+        return (min(self.minX, self.relMinX), max(self.maxX, self.relMaxX),
+                min(self.minY, self.relMinY), max(self.maxY, self.relMaxY))
+
+
+    def length(self):
+        # an axis nothing moved has no size (rather than -inf)
+        minX, maxX, minY, maxY = self.bounds()
+        return math.ceil(maxY - minY) if maxY >= minY else 0
+
+
+    def width(self):
+        minX, maxX, minY, maxY = self.bounds()
+        return math.ceil(maxX - minX) if maxX >= minX else 0
+
+
+    def origin(self):
+        # which corner (or center) of the job sits at 0,0
+        minX, maxX, minY, maxY = self.bounds()
+
+        overX = maxX > 1
+        underX = minX < -1
+        overY = maxY > 1
+        underY = minY <= -1
+
+        # bottom
+        if overY and not underY and overX and not underX: return "grblBottomLeft"
+        if overY and not underY and overX and underX: return "grblBottomCenter"
+        if overY and not underY and not overX and underX: return "grblBottomRight"
+
+        # center
+        if overY and underY and overX and not underX: return "grblCenterLeft"
+        if overY and underY and overX and underX: return "grblCenter"
+        if overY and underY and not overX and underX: return "grblCenterRight"
+
+        # top
+        if not overY and underY and overX and not underX: return "grblTopLeft"
+        if not overY and underY and overX and underX: return "grblTopCenter"
+        if not overY and underY and not overX and underX: return "grblTopRight"
+
+        return ""
+
+
+    def summary(self):
+        # what we keep (and cache) from a scan
+        bounds = [0.0 if math.isinf(value) else value for value in self.bounds()]
+
+        return dict(length=self.length(), width=self.width(), origin=self.origin(), lines=self.lines, bounds=bounds)
+
+
+def arc_center(x0, y0, x1, y1, r, clockwise):
+    # radius format -- the sign of r picks the short (+) or long (-) way around
+    dx = x1 - x0
+    dy = y1 - y0
+    d = math.hypot(dx, dy)
+
+    if d == 0:
+        return None
+
+    h = math.sqrt(max(r * r - d * d / 4, 0)) / d
+
+    # positive r puts the center to the right of travel for G2, left for G3
+    if clockwise == (r > 0):
+        h = -h
+
+    return x0 + dx / 2 - dy * h, y0 + dy / 2 + dx * h
+
+
+def add_arc(extents, x0, y0, x1, y1, cx, cy, clockwise):
+    # an arc's extents are its end points plus any of the four cardinal
+    # points of its circle that it sweeps through
+    radius = math.hypot(x0 - cx, y0 - cy)
+    a0 = math.atan2(y0 - cy, x0 - cx)
+    a1 = math.atan2(y1 - cy, x1 - cx)
+
+    sweep = (a0 - a1 if clockwise else a1 - a0) % TWO_PI
+
+    # same start and end is a full circle
+    if sweep == 0:
+        sweep = TWO_PI
+
+    for quadrant in range(4):
+        angle = quadrant * HALF_PI
+        if ((a0 - angle if clockwise else angle - a0) % TWO_PI) <= sweep:
+            extents.add(cx + radius * math.cos(angle), cy + radius * math.sin(angle))
+
+    extents.add(x1, y1)
+
+
+def scan(path, positioning=0, workers=None):
+    # scan a gcode file for the x/y extents of everything it moves to.
+    # positioning is the distance mode in effect when the file starts
+    # (0 = G90, 1 = G91) -- everything else starts at grbl's defaults
+    extents = Extents(positioning)
+    size = os.path.getsize(path)
+
+    if size == 0:
+        return extents
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if workers > 1 and size >= PARALLEL_SIZE:
+                scan_parallel(path, mm, extents, workers)
+            else:
+                for chunk in chunks(mm):
+                    scan_chunk(extents, chunk)
+
+    return extents
+
+
+def scan_parallel(path, mm, extents, workers):
+    # the file header sets the modes the rest of the file runs in -- scan it
+    # here and then have the pool scan every other range assuming those modes
+    # and from a position it can not know (see Extents.merge).  stitching them
+    # back together in order we check each assumption; a range that started in
+    # some other mode (or ran an absolute arc before it knew where it was) is
+    # scanned again here with the real state.
+    size = len(mm)
+    head = next(chunks(mm))
+
+    scan_chunk(extents, head)
+
+    ranges = split(mm, len(head), size, workers * RANGES_PER_WORKER)
+    modal = extents.modal()
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [pool.submit(scan_range, path, start, stop, modal) for start, stop in ranges]
+
+        for (start, stop), future in zip(ranges, futures):
+            part = future.result()
+
+            if part.dependent or extents.modal() != modal:
+                for chunk in chunks(mm, start, stop):
+                    scan_chunk(extents, chunk)
+            else:
+                extents.merge(part)
+
+    return extents
+
+
+def scan_range(path, start, stop, modal):
+    # runs in a pool worker
+    extents = Extents()
+    extents.set_modal(modal)
+
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for chunk in chunks(mm, start, stop):
+                scan_chunk(extents, chunk)
+
+    return extents
+
+
+def split(mm, start, stop, count):
+    # count ranges of (about) the same size that start and end on a line boundary
+    ranges = []
+    step = max((stop - start) // count, 1)
+
+    while start < stop:
+        end = mm.find(b"\n", min(start + step, stop - 1)) + 1 if start + step < stop else stop
+
+        if end <= start:
+            end = stop
+
+        ranges.append((start, end))
+        start = end
+
+    return ranges
+
+
+def chunks(mm, start=0, stop=None):
+    # chunks of the file that end on a line boundary
+    size = len(mm) if stop is None else stop
+    pos = start
+
+    while pos < size:
+        end = mm.rfind(b"\n", pos, pos + CHUNK_SIZE) + 1 if pos + CHUNK_SIZE < size else size
+
+        if end <= pos:
+            end = min(pos + CHUNK_SIZE, size)
+
+        chunk = mm[pos:end]
+        pos = end
+
+        # make sure the last line gets finished off
+        yield chunk if pos < size or chunk.endswith(b"\n") else chunk + b"\n"
+
+
+def scan_chunk(extents, chunk):
+    chunk = chunk.upper()
+    extents.lines += chunk.count(b"\n")
+
+    if not scan_absolute(extents, chunk):
+        scan_modal(extents, chunk)
+
+    return extents
+
+
+def scan_absolute(extents, chunk):
+    # the common case -- nothing but absolute straight line moves (a raster
+    # or a typical cam post).  every X and every Y is a position so we don't
+    # care which line they are on and min/max/float all run in C.
+    if extents.relative or extents.scale != 1.0 or not extents.motion in (0, 1):
+        return False
+
+    codes = GCODES.findall(chunk)
+    if len(codes) > 0 and not set(codes).issubset(ABSOLUTE):
+        return False
+
+    xs = [value for value in AXIS_X.findall(chunk) if value]
+    ys = [value for value in AXIS_Y.findall(chunk) if value]
+
+    if len(xs) > 0:
+        xs = list(map(float, xs))
+        extents.minX = min(extents.minX, min(xs))
+        extents.maxX = max(extents.maxX, max(xs))
+        extents.x = xs[-1]
+        extents.anchoredX = True
+
+    if len(ys) > 0:
+        ys = list(map(float, ys))
+        extents.minY = min(extents.minY, min(ys))
+        extents.maxY = max(extents.maxY, max(ys))
+        extents.y = ys[-1]
+        extents.anchoredY = True
+
+    last = [code for code in codes if code in MOTION]
+    if len(last) > 0:
+        extents.motion = int(float(last[-1]))
+
+    return True
+
+
+def scan_modal(extents, chunk):
+    # everything else -- track the modal state a word at a time
+    x = extents.x
+    y = extents.y
+    scale = extents.scale
+    relative = extents.relative
+    arcRelative = extents.arcRelative
+    motion = extents.motion
+    plane = extents.plane
+
+    minX = extents.minX
+    maxX = extents.maxX
+    minY = extents.minY
+    maxY = extents.maxY
+
+    relMinX = extents.relMinX
+    relMaxX = extents.relMaxX
+    relMinY = extents.relMinY
+    relMaxY = extents.relMaxY
+
+    anchoredX = extents.anchoredX
+    anchoredY = extents.anchoredY
+    dependent = extents.dependent
+
+    nx = ny = i = j = r = None
+    move = False
+    skip = False
+
+    # the same handful of g codes show up over and over
+    codes = {}
+
+    for letter, value, eol in TOKEN.findall(chunk):
+        if letter == b"X":
+            nx = float(value)
+            move = True
+        elif letter == b"Y":
+            ny = float(value)
+            move = True
+        elif eol:
+            if not move:
+                skip = False
+                continue
+
+            move = False
+
+            if skip or motion is None:
+                nx = ny = i = j = r = None
+                skip = False
+                continue
+
+            x0 = x
+            y0 = y
+            startAnchored = anchoredX and anchoredY
+
+            # an offset from where we started until an absolute move pins the axis down
+            if not nx is None:
+                if not relative:
+                    x = nx * scale
+                    anchoredX = True
+                else:
+                    x = x + nx * scale
+            if not ny is None:
+                if not relative:
+                    y = ny * scale
+                    anchoredY = True
+                else:
+                    y = y + ny * scale
+
+            # an axis only counts once something has moved it (we have no
+            # idea where the machine is before that)
+            if motion < 2 or plane != 17:
+                if not nx is None:
+                    if anchoredX:
+                        if x < minX: minX = x
+                        if x > maxX: maxX = x
+                    else:
+                        if x < relMinX: relMinX = x
+                        if x > relMaxX: relMaxX = x
+                if not ny is None:
+                    if anchoredY:
+                        if y < minY: minY = y
+                        if y > maxY: maxY = y
+                    else:
+                        if y < relMinY: relMinY = y
+                        if y > relMaxY: relMaxY = y
+            else:
+                # an arc starts from wherever we were -- which only matters
+                # when its end point or center is not relative to that
+                if not startAnchored and not (relative and (arcRelative or not r is None)):
+                    dependent = True
+
+                arc = Extents()
+                add_move_arc(arc, x0, y0, x, y, i, j, r, scale, arcRelative, motion == 2)
+
+                if anchoredX:
+                    if arc.minX < minX: minX = arc.minX
+                    if arc.maxX > maxX: maxX = arc.maxX
+                else:
+                    if arc.minX < relMinX: relMinX = arc.minX
+                    if arc.maxX > relMaxX: relMaxX = arc.maxX
+                if anchoredY:
+                    if arc.minY < minY: minY = arc.minY
+                    if arc.maxY > maxY: maxY = arc.maxY
+                else:
+                    if arc.minY < relMinY: relMinY = arc.minY
+                    if arc.maxY > relMaxY: relMaxY = arc.maxY
+
+            nx = ny = i = j = r = None
+        elif letter == b"G":
+            code = codes.get(value)
+            if code is None:
+                code = codes[value] = float(value)
+
+            if code in (0, 1, 2, 3):
+                motion = int(code)
+            elif code == 90:
+                relative = False
+            elif code == 91:
+                relative = True
+            elif code == 20:
+                scale = MM_PER_INCH
+            elif code == 21:
+                scale = 1.0
+            elif code in (17, 18, 19):
+                plane = int(code)
+            elif code == 90.1:
+                arcRelative = False
+            elif code == 91.1:
+                arcRelative = True
+            elif code == 80:
+                motion = None
+            elif 38 <= code < 39:
+                motion = 1
+            elif int(code) in NON_MOTION:
+                skip = True
+        elif letter == b"I":
+            i = float(value)
+            move = True
+        elif letter == b"J":
+            j = float(value)
+            move = True
+        elif letter == b"R":
+            r = float(value)
+
+    extents.x = x
+    extents.y = y
+    extents.scale = scale
+    extents.relative = relative
+    extents.arcRelative = arcRelative
+    extents.motion = motion
+    extents.plane = plane
+
+    extents.minX = minX
+    extents.maxX = maxX
+    extents.minY = minY
+    extents.maxY = maxY
+
+    extents.relMinX = relMinX
+    extents.relMaxX = relMaxX
+    extents.relMinY = relMinY
+    extents.relMaxY = relMaxY
+
+    extents.anchoredX = anchoredX
+    extents.anchoredY = anchoredY
+    extents.dependent = dependent
+
+
+def add_move_arc(extents, x0, y0, x1, y1, i, j, r, scale, arcRelative, clockwise):
+    if not r is None:
+        center = arc_center(x0, y0, x1, y1, r * scale, clockwise)
+    elif i is None and j is None:
+        center = None
+    elif arcRelative:
+        center = (x0 + (i or 0) * scale, y0 + (j or 0) * scale)
+    else:
+        center = (x0 if i is None else i * scale, y0 if j is None else j * scale)
+
+    if center is None:
+        extents.add(x1, y1)
+    else:
+        add_arc(extents, x0, y0, x1, y1, center[0], center[1], clockwise)
+
@@ -0,0 +1,737 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Written by:  Shell M. Shrader (https://github.com/synman/Octoprint-Bettergrblsupport)
+# Copyright [2021] [Shell M. Shrader]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# References
+#
+# https://docs.python.org/3/library/struct.html
+# https://docs.python.org/3/library/tempfile.html#tempfile.mkstemp
+#
+import array
+import contextlib
+import math
+import mmap
+import os
+import re
+import shutil
+import struct
+import tempfile
+import threading
+
+from . import extents
+from .estimator import Estimator, MachineProfile
+
+# bump whenever the layout (or what goes into it) changes
+VERSION = 5
+MAGIC = b"BGSI"
+
+# every line: byte offset (the low 32 bits), cumulative toolpath length and estimated time
+# every INTERVAL lines: the full byte offset and the position before that line runs
+# every change: z level, spindle/laser mode, S, feed and the rest of the modal state
+# and once: the range z, a and b travel over (x / y come from extents)
+INTERVAL = 1000
+
+HEADER = struct.Struct("<4sHIQQQQQQQ")
+BOUNDS = struct.Struct("<dddddd")
+BOUNDS_AXES = ("z", "a", "b")
+OFFSET = struct.Struct("<I")
+DISTANCE = struct.Struct("<f")
+TIME = struct.Struct("<f")
+CHECKPOINT = struct.Struct("<QQddd")
+Z_LEVEL = struct.Struct("<Id")
+SPINDLE = struct.Struct("<IB")
+SPEED = struct.Struct("<If")
+FEED = struct.Struct("<If")
+MODES = struct.Struct("<IBBBBBBB")
+
+# a change record starts with the line that made it
+CHANGE_LINE = struct.Struct("<I")
+
+WORD = re.compile(rb"([A-Z])[ \t]*([-+]?(?:\d+\.?\d*|\.\d+))")
+COMMENT = re.compile(rb"\([^)]*\)?|;.*")
+
+NO_MOTION = 255
+
+# coolant bits (M7 / M8 can both be on)
+MIST = 1
+FLOOD = 2
+
+# sidecars kept around (they are named by content so they outlive the files)
+MAX_INDEXES = 100
+
+# index name -> [lock, holders] (see building)
+_building = {}
+_buildingLock = threading.Lock()
+
+
+# m codes grbl waits for the planner buffer to empty on
+SYNC_MCODES = (0, 1, 2, 3, 4, 5, 7, 8, 9, 30)
+
+
+def index_name(digest, positioning=0, profile=""):
+    # sidecars are named for the content they index (see cache.content_hash)
+    # and for the machine profile their time estimate was made with
+    return "{}-{}-{}-{}.bgsi".format(digest, VERSION, positioning, profile)
+
+
+def is_current(name, profile):
+    # made by this version of us with this machine profile
+    if name is None:
+        return False
+
+    parts = name[:-len(".bgsi")].split("-")
+    return len(parts) == 4 and parts[1] == str(VERSION) and parts[3] == profile
+
+
+def index_folder(_plugin):
+    folder = os.path.join(_plugin.get_plugin_data_folder(), "index")
+
+    if not os.path.isdir(folder):
+        os.makedirs(folder)
+
+    return folder
+
+
+def padded(length):
+    return (length + 7) & ~7
+
+
+@contextlib.contextmanager
+def building(name):
+    # one builder per index at a time -- whoever comes second waits and then
+    # finds it already on disk
+    with _buildingLock:
+        entry = _building.get(name)
+        if entry is None:
+            entry = _building[name] = [threading.Lock(), 0]
+        entry[1] += 1
+
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _buildingLock:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _building[name]
+
+
+def axis_bounds(values):
+    # (min, max) pairs for z, a, b -- only the axes the job actually moves
+    bounds = {}
+
+    for n, axis in enumerate(BOUNDS_AXES):
+        low, high = values[n * 2], values[n * 2 + 1]
+        if low <= high:
+            bounds[axis] = (low, high)
+
+    return bounds
+
+
+class Section:
+    # the records of one section, packed as they come and spilled to a temp
+    # file a chunk at a time -- a big job never has them all in memory
+
+    __slots__ = ("record", "count", "_buffer", "_spill")
+
+    def __init__(self, record):
+        self.record = record
+        self.count = 0
+        self._buffer = bytearray()
+        self._spill = None
+
+
+    def append(self, *values):
+        self._buffer += self.record.pack(*values)
+        self.count += 1
+
+        if len(self._buffer) >= extents.CHUNK_SIZE:
+            self._write()
+
+
+    def _write(self):
+        if self._spill is None:
+            self._spill = tempfile.TemporaryFile()
+
+        self._spill.write(self._buffer)
+        self._buffer = bytearray()
+
+
+    def copy_to(self, f):
+        if not self._spill is None:
+            self._spill.seek(0)
+            shutil.copyfileobj(self._spill, f)
+
+        length = self.count * self.record.size
+
+        f.write(self._buffer)
+        f.write(b"\0" * (padded(length) - length))
+
+
+    def close(self):
+        if not self._spill is None:
+            self._spill.close()
+            self._spill = None
+
+        self._buffer = bytearray()
+
+
+class Column(Section):
+    # a value for every line -- appended straight to values and packed (and
+    # spilled) a chunk of lines at a time
+
+    __slots__ = ("values",)
+
+    def __init__(self, record, typecode):
+        Section.__init__(self, record)
+        self.values = array.array(typecode)
+
+
+    def pack(self):
+        self._buffer += self.values.tobytes()
+        self.count += len(self.values)
+        del self.values[:]
+
+        if len(self._buffer) >= extents.CHUNK_SIZE:
+            self._write()
+
+
+    def copy_to(self, f):
+        self.pack()
+        Section.copy_to(self, f)
+
+
+class IndexBuilder:
+    # fed the file a chunk of whole lines at a time -- from disk, or from an
+    # upload as it streams by (see _bgs.analyze_file / ExtentsStream, which
+    # feed the extents scan and the validator the same chunks)
+
+    def __init__(self, positioning=0, interval=INTERVAL, profile=None):
+        self.interval = interval
+        self.estimator = Estimator(MachineProfile() if profile is None else profile)
+        self.lines = 0
+        self.position = 0
+
+        self.offsets = Column(OFFSET, "I")
+        self.distances = Column(DISTANCE, "f")
+        self.checkpoints = Section(CHECKPOINT)
+        self.zLevels = Section(Z_LEVEL)
+        self.spindle = Section(SPINDLE)
+        self.speeds = Section(SPEED)
+        self.feeds = Section(FEED)
+        self.modes = Section(MODES)
+
+        self.x = self.y = self.z = 0.0
+        self.a = self.b = 0.0
+        self.bounds = [float("inf"), float("-inf")] * len(BOUNDS_AXES)
+        self.distance = 0.0
+        self.motion = 0
+        self.relative = positioning == 1
+        self.inches = False
+        self.plane = 17
+        self.arcRelative = True
+        self.coordinate = 54
+        self.spindleMode = 5
+        self.speed = 0.0
+        self.feed = 0.0
+        self.coolant = 0
+
+        self._modes = None
+        self._spindleMode = 5
+        self._speed = 0.0
+        self._feed = None
+
+
+    def restore(self, state, x, y, z):
+        # pick up part way through a file (see JobIndex.replay)
+        self.x, self.y, self.z = x, y, z
+        self.motion = state["motion"]
+        self.relative = state["relative"]
+        self.inches = state["inches"]
+        self.plane = state["plane"]
+        self.arcRelative = state["arcRelative"]
+        self.coordinate = state["coordinate"]
+        self.spindleMode = state["spindle"]
+        self.speed = state["speed"]
+        self.feed = state["feed"]
+        self.coolant = state["coolant"]
+
+
+    def feed_chunk(self, chunk):
+        offsets = self.offsets.values
+        distances = self.distances.values
+        interval = self.interval
+
+        for line in chunk.upper().split(b"\n")[:-1]:
+            number = self.lines
+
+            if number % interval == 0:
+                self.checkpoints.append(number, self.position, self.x, self.y, self.z)
+
+            offsets.append(self.position & 0xFFFFFFFF)
+            self.position += len(line) + 1
+            self.lines += 1
+
+            if b"(" in line or b";" in line:
+                line = COMMENT.sub(b"", line)
+
+            words = WORD.findall(line)
+            if len(words) > 0:
+                self._execute(number, words)
+
+            distances.append(self.distance)
+
+        self.offsets.pack()
+        self.distances.pack()
+
+
+    def _execute(self, number, words):
+        nx = ny = nz = na = nb = i = j = r = p = None
+        skip = False
+        sync = False
+        dwell = False
+        # only g and m words change modes (the first line records where we start)
+        modal = self._modes is None
+        z = self.z
+
+        for letter, value in words:
+            value = float(value)
+
+            if letter == b"X":
+                nx = value
+            elif letter == b"Y":
+                ny = value
+            elif letter == b"Z":
+                nz = value
+            elif letter == b"A":
+                na = value
+            elif letter == b"B":
+                nb = value
+            elif letter == b"G":
+                modal = True
+
+                if value in (0, 1, 2, 3):
+                    self.motion = int(value)
+                elif value == 90:
+                    self.relative = False
+                elif value == 91:
+                    self.relative = True
+                elif value == 20:
+                    self.inches = True
+                elif value == 21:
+                    self.inches = False
+                elif value in (17, 18, 19):
+                    self.plane = int(value)
+                elif value == 90.1:
+                    self.arcRelative = False
+                elif value == 91.1:
+                    self.arcRelative = True
+                elif value == 80:
+                    self.motion = None
+                elif 38 <= value < 39:
+                    self.motion = 1
+                elif 54 <= value <= 59 and value == int(value):
+                    self.coordinate = int(value)
+                elif value == 4:
+                    dwell = True
+                elif int(value) in extents.NON_MOTION:
+                    skip = True
+            elif letter == b"M":
+                modal = True
+
+                if value in (3, 4, 5):
+                    self.spindleMode = int(value)
+                elif value == 7:
+                    self.coolant |= MIST
+                elif value == 8:
+                    self.coolant |= FLOOD
+                elif value == 9:
+                    self.coolant = 0
+                if value in SYNC_MCODES:
+                    sync = True
+            elif letter == b"P":
+                p = value
+            elif letter == b"S":
+                self.speed = value
+            elif letter == b"F":
+                self.feed = value * (extents.MM_PER_INCH if self.inches else 1.0)
+            elif letter == b"I":
+                i = value
+            elif letter == b"J":
+                j = value
+            elif letter == b"R":
+                r = value
+
+        if sync:
+            self.estimator.sync()
+
+        if dwell:
+            self.estimator.dwell(number, p or 0)
+        elif not (skip or self.motion is None or (nx is None and ny is None and nz is None and na is None and nb is None and i is None and j is None)):
+            self._move(number, nx, ny, nz, i, j, r)
+
+            # rotary axes are degrees -- g20 does not touch them
+            if not na is None:
+                self.a = self.a + na if self.relative else na
+            if not nb is None:
+                self.b = self.b + nb if self.relative else nb
+
+            for n, moved, value in ((0, nz, self.z), (1, na, self.a), (2, nb, self.b)):
+                if not moved is None:
+                    if value < self.bounds[n * 2]: self.bounds[n * 2] = value
+                    if value > self.bounds[n * 2 + 1]: self.bounds[n * 2 + 1] = value
+
+        if modal:
+            modes = (NO_MOTION if self.motion is None else self.motion, int(self.relative), int(self.inches), self.plane, int(self.arcRelative), self.coordinate, self.coolant)
+            if modes != self._modes:
+                self._modes = modes
+                self.modes.append(number, *modes)
+
+            # M3 / M4 / M5 apart from S -- a laser job changes S on nearly every line
+            if self.spindleMode != self._spindleMode:
+                self._spindleMode = self.spindleMode
+                self.spindle.append(number, self.spindleMode)
+
+        if self.speed != self._speed:
+            self._speed = self.speed
+            self.speeds.append(number, self.speed)
+
+        if self.z != z:
+            self.zLevels.append(number, self.z)
+
+        if self.feed != self._feed:
+            self._feed = self.feed
+            self.feeds.append(number, self.feed)
+
+
+    def _move(self, number, nx, ny, nz, i, j, r):
+        scale = extents.MM_PER_INCH if self.inches else 1.0
+        x0, y0, z0 = self.x, self.y, self.z
+
+        if not nx is None:
+            self.x = self.x + nx * scale if self.relative else nx * scale
+        if not ny is None:
+            self.y = self.y + ny * scale if self.relative else ny * scale
+        if not nz is None:
+            self.z = self.z + nz * scale if self.relative else nz * scale
+
+        dz = self.z - z0
+
+        if self.motion >= 2 and self.plane == 17:
+            clockwise = self.motion == 2
+
+            if not r is None:
+                center = extents.arc_center(x0, y0, self.x, self.y, r * scale, clockwise)
+            elif i is None and j is None:
+                center = None
+            elif self.arcRelative:
+                center = (x0 + (i or 0) * scale, y0 + (j or 0) * scale)
+            else:
+                center = (x0 if i is None else i * scale, y0 if j is None else j * scale)
+
+            if not center is None:
+                length = math.hypot(arc_length(x0, y0, self.x, self.y, center[0], center[1], clockwise), dz)
+                radius = math.hypot(x0 - center[0], y0 - center[1])
+                self.distance += length
+
+                if radius > 0 and length > 0:
+                    # the tangents at either end (a helix climbs at a constant rate)
+                    climb = dz / length
+                    flat = math.sqrt(max(1 - climb * climb, 0)) / radius
+                    direction = -1 if clockwise else 1
+
+                    start = (-(y0 - center[1]) * flat * direction, (x0 - center[0]) * flat * direction, climb)
+                    end = (-(self.y - center[1]) * flat * direction, (self.x - center[0]) * flat * direction, climb)
+
+                    self.estimator.move(number, length, start, end, self.feed, radius)
+                return
+
+        dx = self.x - x0
+        dy = self.y - y0
+        length = math.sqrt(dx * dx + dy * dy + dz * dz)
+
+        self.distance += length
+
+        if length > 0:
+            self.estimator.move(number, length, (dx / length, dy / length, dz / length), None, None if self.motion == 0 else self.feed)
+
+
+    def write(self, path):
+        # write to a temp file of our own and move it into place -- readers
+        # never see half an index
+        self.estimator.finish(self.lines)
+
+        handle, temp = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(path))
+
+        try:
+            with os.fdopen(handle, "wb") as f:
+                f.write(HEADER.pack(MAGIC, VERSION, self.interval, self.lines, self.checkpoints.count, self.zLevels.count,
+                                    self.spindle.count, self.speeds.count, self.feeds.count, self.modes.count))
+                f.write(b"\0" * (padded(HEADER.size) - HEADER.size))
+                f.write(BOUNDS.pack(*self.bounds))
+
+                self.offsets.copy_to(f)
+                self.distances.copy_to(f)
+
+                # the estimator keeps a time for every line as it goes
+                times = self.estimator.times.tobytes()
+                f.write(times)
+                f.write(b"\0" * (padded(len(times)) - len(times)))
+
+                for section in (self.checkpoints, self.zLevels, self.spindle, self.speeds, self.feeds, self.modes):
+                    section.copy_to(f)
+
+            os.replace(temp, path)
+        except BaseException:
+            os.remove(temp)
+            raise
+        finally:
+            self.close()
+
+
+    def close(self):
+        for section in (self.offsets, self.distances, self.checkpoints, self.zLevels, self.spindle, self.speeds, self.feeds, self.modes):
+            section.close()
+
+
+def arc_length(x0, y0, x1, y1, cx, cy, clockwise):
+    radius = math.hypot(x0 - cx, y0 - cy)
+    a0 = math.atan2(y0 - cy, x0 - cx)
+    a1 = math.atan2(y1 - cy, x1 - cx)
+
+    sweep = (a0 - a1 if clockwise else a1 - a0) % extents.TWO_PI
+    if sweep == 0:
+        sweep = extents.TWO_PI
+
+    return radius * sweep
+
+
+def build(source, path, positioning=0, profile=None, interval=INTERVAL):
+    # on its own -- see _bgs.analyze_file for building it along with the rest
+    builder = IndexBuilder(positioning, interval, profile)
+
+    if os.path.getsize(source) > 0:
+        with open(source, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for chunk in extents.chunks(mm):
+                    builder.feed_chunk(chunk)
+
+    builder.write(path)
+    return builder
+
+
+def prune(folder, keep, extension=".bgsi"):
+    # least recently written sidecars go first
+    try:
+        indexes = [os.path.join(folder, name) for name in os.listdir(folder) if name.endswith(extension)]
+    except OSError:
+        return
+
+    indexes.sort(key=os.path.getmtime, reverse=True)
+
+    for path in indexes[keep:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class JobIndex:
+    # read side -- everything comes straight out of the mapped file
+
+    def __init__(self, path):
+        self.path = path
+
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, version, self.interval, self.lines,
+         checkpoints, zLevels, spindle, speeds, feeds, modes) = HEADER.unpack_from(self._mm, 0)
+
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError("{} is not a version {} job index".format(path, VERSION))
+
+        sections = []
+        self._bounds = padded(HEADER.size)
+        position = self._bounds + BOUNDS.size
+
+        for length in (self.lines * OFFSET.size, self.lines * DISTANCE.size, self.lines * TIME.size, checkpoints * CHECKPOINT.size, zLevels * Z_LEVEL.size,
+                       spindle * SPINDLE.size, speeds * SPEED.size, feeds * FEED.size, modes * MODES.size):
+            sections.append(position)
+            position += padded(length)
+
+        self._offsets, self._distances, self._times, self._checkpoints, self._zLevels, self._spindle, self._speeds, self._feeds, self._modes = sections
+        self._counts = dict(checkpoints=checkpoints, zLevels=zLevels, spindle=spindle, speeds=speeds, feeds=feeds, modes=modes)
+
+
+    def close(self):
+        if not self._mm is None:
+            self._mm.close()
+            self._mm = None
+
+
+    def offset(self, line):
+        # the low 32 bits are kept for every line -- the nearest checkpoint
+        # has the rest (no line is anywhere near 4gb past one)
+        base = self._checkpoint(line)[1]
+        low = OFFSET.unpack_from(self._mm, self._offsets + line * OFFSET.size)[0]
+
+        return base + ((low - base) & 0xFFFFFFFF)
+
+
+    def line_at(self, offset):
+        # the line that contains byte offset
+        lo = 0
+        hi = self.lines
+
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if self.offset(mid) <= offset:
+                lo = mid
+            else:
+                hi = mid
+
+        return lo
+
+
+    def distance(self, line):
+        # toolpath length once line has run
+        if line < 0 or self.lines == 0:
+            return 0.0
+
+        return DISTANCE.unpack_from(self._mm, self._distances + min(line, self.lines - 1) * DISTANCE.size)[0]
+
+
+    def total_distance(self):
+        return self.distance(self.lines - 1)
+
+
+    def time(self, line):
+        # estimated seconds into the job once line has run
+        if line < 0 or self.lines == 0:
+            return 0.0
+
+        return TIME.unpack_from(self._mm, self._times + min(line, self.lines - 1) * TIME.size)[0]
+
+
+    def total_time(self):
+        return self.time(self.lines - 1)
+
+
+    def checkpoint(self, line):
+        # nearest checkpoint at or before line -- (line, x, y, z)
+        checkpoint = self._checkpoint(line)
+        return (checkpoint[0],) + checkpoint[2:]
+
+
+    def state(self, line):
+        # the modal state in effect before line runs (position is as of the
+        # nearest checkpoint -- replay from there if you need it exactly)
+        modes = self._before(self._modes, MODES, "modes", line)
+        spindle = self._before(self._spindle, SPINDLE, "spindle", line)
+        speed = self._before(self._speeds, SPEED, "speeds", line)
+        feed = self._before(self._feeds, FEED, "feeds", line)
+        zLevel = self._before(self._zLevels, Z_LEVEL, "zLevels", line)
+        checkpoint = self.checkpoint(line)
+
+        state = dict(motion=0, relative=False, inches=False, plane=17, arcRelative=True, coordinate=54, coolant=0,
+                     spindle=5, speed=0.0, feed=0.0, z=checkpoint[3],
+                     checkpoint=checkpoint[0], x=checkpoint[1], y=checkpoint[2])
+
+        if not modes is None:
+            state.update(motion=None if modes[1] == NO_MOTION else modes[1], relative=bool(modes[2]), inches=bool(modes[3]),
+                         plane=modes[4], arcRelative=bool(modes[5]), coordinate=modes[6], coolant=modes[7])
+        if not spindle is None:
+            state.update(spindle=spindle[1])
+        if not speed is None:
+            state.update(speed=speed[1])
+        if not feed is None:
+            state.update(feed=feed[1])
+        if not zLevel is None:
+            state.update(z=zLevel[1])
+
+        return state
+
+
+    def replay(self, source, line):
+        # the exact position before line runs -- only the lines between the
+        # nearest checkpoint and line get parsed
+        line = max(min(line, self.lines - 1), 0)
+        checkpoint = self.checkpoint(line)
+
+        builder = IndexBuilder(0, self.interval)
+        builder.restore(self.state(checkpoint[0]), checkpoint[1], checkpoint[2], checkpoint[3])
+
+        start = self.offset(checkpoint[0])
+        with open(source, "rb") as f:
+            f.seek(start)
+            prefix = f.read(self.offset(line) - start)
+
+        builder.feed_chunk(prefix)
+
+        state = self.state(line)
+        state.update(x=builder.x, y=builder.y, z=builder.z)
+        return state
+
+
+    def bounds(self):
+        return axis_bounds(BOUNDS.unpack_from(self._mm, self._bounds))
+
+
+    def z_levels(self):
+        return [Z_LEVEL.unpack_from(self._mm, self._zLevels + i * Z_LEVEL.size) for i in range(self._counts["zLevels"])]
+
+
+    def spindle_transitions(self):
+        # only the on/off (and direction) changes -- not every S word.  each
+        # comes with the S in effect once its line has run
+        transitions = []
+
+        for i in range(self._counts["spindle"]):
+            number, mode = SPINDLE.unpack_from(self._mm, self._spindle + i * SPINDLE.size)
+            speed = self._before(self._speeds, SPEED, "speeds", number + 1)
+            transitions.append((number, mode, 0.0 if speed is None else speed[1]))
+
+        return transitions
+
+
+    def _checkpoint(self, line):
+        # (line, offset, x, y, z)
+        index = min(line // self.interval, self._counts["checkpoints"] - 1)
+        if index < 0:
+            return (0, 0, 0.0, 0.0, 0.0)
+
+        return CHECKPOINT.unpack_from(self._mm, self._checkpoints + index * CHECKPOINT.size)
+
+
+    def _before(self, base, record, name, line):
+        # binary search -- the last change made by a line before this one
+        lo = 0
+        hi = self._counts[name]
+
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if CHANGE_LINE.unpack_from(self._mm, base + mid * record.size)[0] < line:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        if lo == 0:
+            return None
+
+        return record.unpack_from(self._mm, base + (lo - 1) * record.size)
@@ -0,0 +1,250 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Written by:  Shell M. Shrader (https://github.com/synman/Octoprint-Bettergrblsupport)
+# Copyright [2021] [Shell M. Shrader]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# References
+#
+# https://docs.python.org/3/library/os.html#os.fsync
+#
+import json
+import os
+import threading
+import time
+
+from . import preflight
+
+
+class JobJournal:
+    # an append-only record of how far the running job got -- so a job cut
+    # short by a reboot (or a power cut) can be picked up where it left off.
+    # the status report path only swaps in the latest executed line; a
+    # scheduled flush turns that into one fsync'd record every interval
+    # seconds.  a job that ends (however it ends) gets an end record.
+
+    _plugin = None
+    _lock = None
+    _path = None
+    _file = None
+    _index = None
+    _task = None
+    _job = None
+    _line = None
+    _written = None
+
+    filename = "journal.log"
+    interval = 5
+    active = False
+    interrupted = None
+    recovered = False
+
+    def __init__(self, _plugin, filename="journal.log", interval=5):
+        self._plugin = _plugin
+        self._lock = threading.Lock()
+        self._path = None
+        self._file = None
+        self._index = None
+        self._task = None
+        self._job = None
+        self._line = None
+        self._written = None
+
+        self.filename = filename
+        self.interval = interval
+        self.active = False
+        self.interrupted = None
+        self.recovered = False
+
+
+    def start(self, path, index):
+        # index is the job's JobIndex (we keep our own -- it is only an mmap)
+        self._plugin._logger.debug("JobJournal: start path=[{}] index=[{}]".format(path, None if index is None else index.path))
+
+        with self._lock:
+            self._close()
+
+            # whatever was in there is no longer of interest
+            self.interrupted = None
+            self._file = open(self._journal_path(), "w")
+            self._index = index
+            self._job = path
+            self._line = None
+            self._written = None
+            self.active = True
+
+            self._append(dict(type="start", path=path, time=time.time()))
+            self._task = self._plugin.executor.schedule(self.interval, self._flush)
+
+
+    def record(self, line):
+        # called for every status report -- must stay cheap
+        if self.active:
+            self._line = line
+
+
+    def finish(self, reason):
+        self._plugin._logger.debug("JobJournal: finish reason=[{}] line=[{}]".format(reason, self._line))
+
+        with self._lock:
+            if not self.active:
+                return
+
+            self._checkpoint()
+            self._append(dict(type="end", reason=reason, time=time.time()))
+            self._close()
+
+
+    def close(self):
+        # shutting down -- a running job stays interrupted
+        with self._lock:
+            if self.active:
+                self._checkpoint()
+                self._close()
+
+
+    def recover(self):
+        # the last confirmed checkpoint of a job that never ended (or None).
+        # only the first call looks -- after that (or while a job is running)
+        # the journal is our own job's, not one the host lost
+        with self._lock:
+            if self.active or self.recovered:
+                return None
+
+            self.recovered = True
+
+        checkpoint = None
+
+        try:
+            with open(self._journal_path(), "r") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # a record cut short by the power going out
+                        continue
+
+                    if record.get("type") == "start":
+                        checkpoint = None
+                    elif record.get("type") == "checkpoint":
+                        checkpoint = record
+                    elif record.get("type") == "end":
+                        checkpoint = None
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            self._plugin._logger.warning("JobJournal: unable to read [{}]: {}".format(self._path, e))
+
+        self._plugin._logger.debug("JobJournal: recover checkpoint=[{}]".format(checkpoint))
+
+        self.interrupted = checkpoint
+        return checkpoint
+
+
+    def mismatch(self):
+        # why the interrupted job can not be picked up with the machine the way
+        # it is now -- a different work coordinate system or a work zero that
+        # moved (G92 does not survive a reboot).  None if it can
+        if self.interrupted is None:
+            return None
+
+        coordinate = self.interrupted.get("coordinate")
+        if coordinate != self._plugin.grblCoordinateSystem:
+            return "the job was running in {} but {} is active".format(coordinate, self._plugin.grblCoordinateSystem)
+
+        if not self._plugin.grblCoordinateSystem in self._plugin.offsets:
+            return "work offsets ($#) have not been read from grbl yet"
+
+        offsets = preflight.work_offsets(self._plugin)
+        for axis, value in sorted(self.interrupted.get("offsets", {}).items()):
+            if abs(offsets.get(axis, 0.0) - value) > preflight.TOLERANCE:
+                return "{} work zero for {} was {:.3f} and is now {:.3f}".format(axis.upper(), coordinate, value, offsets.get(axis, 0.0))
+
+        return None
+
+
+    def discard(self):
+        self._plugin._logger.debug("JobJournal: discard interrupted=[{}]".format(self.interrupted))
+
+        with self._lock:
+            self.interrupted = None
+
+            if not self.active:
+                try:
+                    os.remove(self._journal_path())
+                except FileNotFoundError:
+                    pass
+
+
+    def _flush(self):
+        with self._lock:
+            if not self.active:
+                return
+
+            self._checkpoint()
+            self._task = self._plugin.executor.schedule(self.interval, self._flush)
+
+
+    def _checkpoint(self):
+        line = self._line
+
+        if line is None or line == self._written or self._index is None:
+            return
+
+        state = self._index.state(line)
+        state.pop("checkpoint", None)
+
+        self._append(dict(type="checkpoint",
+                          path=self._job,
+                          line=line + 1,
+                          offset=self._index.offset(line),
+                          state=state,
+                          coordinate=self._plugin.grblCoordinateSystem,
+                          offsets=preflight.work_offsets(self._plugin),
+                          time=time.time()))
+        self._written = line
+
+
+    def _append(self, record):
+        try:
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except Exception as e:
+            self._plugin._logger.warning("JobJournal: unable to write [{}]: {}".format(self._path, e))
+
+
+    def _close(self):
+        self.active = False
+
+        if not self._task is None:
+            self._task.cancel()
+            self._task = None
+
+        if not self._file is None:
+            self._file.close()
+            self._file = None
+
+        if not self._index is None:
+            self._index.close()
+            self._index = None
+
+
+    def _journal_path(self):
+        # our data folder is not available until we are injected
+        if self._path is None:
+            self._path = os.path.join(self._plugin.get_plugin_data_folder(), self.filename)
+
+        return self._path
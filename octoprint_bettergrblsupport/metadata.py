@@ -0,0 +1,157 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Written by:  Shell M. Shrader (https://github.com/synman/Octoprint-Bettergrblsupport)
+# Copyright [2021] [Shell M. Shrader]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import heapq
+import itertools
+import os
+import threading
+
+# lower runs first
+PRIORITY_SELECTED = 0
+PRIORITY_NORMAL = 1
+
+
+class MetadataJob:
+    __slots__ = ("path", "priority", "callbacks", "running", "modified")
+
+    def __init__(self, path, priority):
+        self.path = path
+        self.priority = priority
+        self.callbacks = []
+        self.running = False
+        self.modified = None
+
+
+class MetadataScheduler:
+    # one job per file no matter how many events ask for it (an upload fires
+    # both UPLOAD and FILE_ADDED).  the file the user just selected jumps the
+    # line, at most concurrency jobs run at once on the plugin executor, and
+    # anybody waiting on a result gets called back instead of polling for it
+
+    _plugin = None
+    _work = None
+    _lock = None
+    _jobs = None
+    _queue = None
+    _sequence = None
+
+    concurrency = 2
+    running = 0
+
+    def __init__(self, _plugin, work, concurrency=2):
+        self._plugin = _plugin
+        self._work = work
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._queue = []
+        self._sequence = itertools.count()
+
+        self.concurrency = concurrency
+        self.running = 0
+
+
+    def request(self, path, callback=None, priority=PRIORITY_NORMAL):
+        with self._lock:
+            job = self._jobs.get(path)
+
+            if job is None:
+                self._plugin._logger.debug("MetadataScheduler: request path=[{}] priority=[{}]".format(path, priority))
+
+                job = self._jobs[path] = MetadataJob(path, priority)
+                heapq.heappush(self._queue, (priority, next(self._sequence), job))
+            elif not job.running and priority < job.priority:
+                self._plugin._logger.debug("MetadataScheduler: promote path=[{}] priority=[{}]".format(path, priority))
+
+                # the old heap entry goes stale and gets skipped
+                job.priority = priority
+                heapq.heappush(self._queue, (priority, next(self._sequence), job))
+            else:
+                self._plugin._logger.debug("MetadataScheduler: coalesce path=[{}] running=[{}]".format(path, job.running))
+
+            if not callback is None:
+                job.callbacks.append(callback)
+
+        self._dispatch()
+
+
+    def is_pending(self, path):
+        with self._lock:
+            return path in self._jobs
+
+
+    def pending(self):
+        with self._lock:
+            return len(self._jobs)
+
+
+    def _dispatch(self):
+        start = []
+
+        with self._lock:
+            while self.running < self.concurrency and len(self._queue) > 0:
+                priority, sequence, job = heapq.heappop(self._queue)
+
+                if job.running or job.priority != priority or self._jobs.get(job.path) is not job:
+                    continue
+
+                job.running = True
+                self.running += 1
+                start.append(job)
+
+        for job in start:
+            self._plugin.executor.submit(self._run, job)
+
+
+    def _run(self, job):
+        result = None
+
+        try:
+            job.modified = os.path.getctime(self._plugin._file_manager.path_on_disk("local", job.path))
+            result = self._work(self._plugin, job.path)
+        except Exception as e:
+            self._plugin._logger.warning("MetadataScheduler: [{}] failed: {}".format(job.path, e))
+
+        with self._lock:
+            self.running -= 1
+            callbacks = job.callbacks
+
+            # the file was replaced while we were reading it -- go again
+            # (and keep our callbacks waiting for the fresh result)
+            if self._file_changed(job):
+                self._plugin._logger.debug("MetadataScheduler: rescan path=[{}]".format(job.path))
+
+                job.running = False
+                heapq.heappush(self._queue, (job.priority, next(self._sequence), job))
+                callbacks = []
+            else:
+                del self._jobs[job.path]
+
+        self._dispatch()
+
+        for callback in callbacks:
+            try:
+                callback(job.path, result)
+            except Exception as e:
+                self._plugin._logger.warning("MetadataScheduler: callback for [{}] failed: {}".format(job.path, e))
+
+
+    def _file_changed(self, job):
+        try:
+            return not job.modified is None and os.path.getctime(self._plugin._file_manager.path_on_disk("local", job.path)) > job.modified
+        except Exception:
+            return False
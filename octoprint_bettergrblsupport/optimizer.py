@@ -0,0 +1,473 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Written by:  Shell M. Shrader (https://github.com/synman/Octoprint-Bettergrblsupport)
+# Copyright [2021] [Shell M. Shrader]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# References
+#
+# https://github.com/gnea/grbl/wiki/Grbl-v1.1-Configuration#100-101-and-102--xyz-stepsmm
+# https://github.com/gnea/grbl/blob/master/grbl/gcode.c (arc radius tolerances)
+#
+# rewrites a job into the fewest bytes grbl will do the same thing with --
+# no comments or whitespace, coordinates rounded to what the steppers can
+# resolve, no repeated modal words and no moves that go nowhere.  every
+# line written remembers the line of the original it came from (line map).
+#
+# anything we do not fully understand goes through compacted but otherwise
+# as it was (and we forget what we knew about where the machine is).
+#
+import math
+
+from array import array
+
+from . import extents
+from . import simplifier
+from . import validator
+
+# never coarser than this many decimals (mm / inches) -- rounding the start,
+# end and center of an arc must stay well inside grbl's arc radius tolerance
+MIN_DECIMALS = 3
+MIN_DECIMALS_INCHES = 4
+
+# grbl's default $100-$102
+DEFAULT_STEPS_PER_MM = 250.0
+
+# g codes we know what to do with -- the rest make a line pass through
+MOTION = (0, 1, 2, 3)
+PLANE = (17, 18, 19)
+UNITS = (20, 21)
+DISTANCE = (90, 91)
+FEED_MODE = (93, 94)
+OTHER_MODAL = (40, 49, 61)
+SPINDLE_COOLANT = (3, 4, 5, 7, 8, 9)
+
+# line map entries are native unsigned ints
+LINE_MAP_ITEMSIZE = array("I").itemsize
+
+# arc offsets round like the axis they belong to
+OFFSET_AXES = {b"I": b"X", b"J": b"Y", b"K": b"Z", b"R": b"X"}
+
+
+def decimals(stepsPerMm, inches=False):
+    # the fewest decimals that still resolve a single step
+    places = int(math.ceil(math.log10(max(stepsPerMm, 1.0) * (extents.MM_PER_INCH if inches else 1.0))))
+    return max(places, MIN_DECIMALS_INCHES if inches else MIN_DECIMALS)
+
+
+def normalize(value):
+    # the same number in fewer characters -- "+010.500" -> "10.5", "-0.25" -> "-.25"
+    sign = b""
+    if value[:1] in (b"-", b"+"):
+        sign = value[:1] if value[:1] == b"-" else b""
+        value = value[1:]
+
+    if b"." in value:
+        value = value.rstrip(b"0").rstrip(b".")
+
+    value = value.lstrip(b"0")
+
+    if len(value) == 0:
+        return b"0"
+
+    return sign + value
+
+
+def quantize(value, places):
+    return normalize(b"%.*f" % (places, float(value)))
+
+
+def number(value):
+    code, mantissa = validator.number(value)
+    return code if mantissa == 0 else None
+
+
+def map_name(digest):
+    # named for the content of the optimized file (see cache.content_hash)
+    return "{}.bgsm".format(digest)
+
+
+def original_lines(path, lines):
+    # the lines of the original some (1 based) lines of the optimized file came from
+    origins = []
+
+    with open(path, "rb") as f:
+        for line in lines:
+            entry = array("I")
+
+            if not line is None and line > 0:
+                f.seek((line - 1) * LINE_MAP_ITEMSIZE)
+                entry.frombytes(f.read(LINE_MAP_ITEMSIZE))
+
+            origins.append(entry[0] if len(entry) > 0 else None)
+
+    return origins
+
+
+class Optimizer:
+    # fed whole lines a chunk at a time -- returns what to write in their place
+
+    _axes = b"XYZ"
+    _decimals = None
+    _point = None
+
+    simplifier = None
+    stepsPerMm = None
+    lineMap = None
+    lines = 0
+    written = 0
+    bytesIn = 0
+    bytesOut = 0
+    # the line feed_chunk was on when it raised
+    failedLine = None
+
+    # modal state -- None is "do not know"
+    motion = None
+    plane = None
+    relative = None
+    inches = None
+    inverse = None
+    feed = None
+    speed = None
+    position = None
+
+    def __init__(self, stepsPerMm=(DEFAULT_STEPS_PER_MM, ) * 3, axes="XYZ", simplifier=None):
+        self._axes = axes.upper().encode()
+        self._point = None
+
+        # runs of plain G1 xy moves go through it (see simplifier)
+        self.simplifier = simplifier
+
+        # steps/mm we do not know about (extra axes) are taken to be as fine as the finest we do
+        self.stepsPerMm = dict((self._axes[n:n + 1], float(stepsPerMm[n] if n < len(stepsPerMm) else max(stepsPerMm))) for n in range(len(self._axes)))
+        self._decimals = {}
+
+        self.lineMap = array("I")
+        self.lines = 0
+        self.written = 0
+        self.bytesIn = 0
+        self.bytesOut = 0
+        self.failedLine = None
+
+        # grbl keeps its modes from one job to the next and the file stays on
+        # disk -- nothing is known until the file itself says so
+        self.motion = None
+        self.plane = None
+        self.relative = None
+        self.inverse = None
+        self.feed = None
+        self.speed = None
+        self.position = {}
+
+        self._set_units(None)
+
+
+    def feed_chunk(self, chunk):
+        # nothing is counted until the whole chunk is through -- if it blows up
+        # part way the chunk can still go through as it is (see passthrough)
+        output = []
+        origins = []
+        number = self.lines
+
+        # the run of moves the simplifier gets -- where it starts and (x, y, line) for each
+        anchor = None
+        run = []
+
+        lines = chunk.split(b"\n")
+        lines.pop()
+
+        try:
+            for line in lines:
+                number += 1
+
+                line = self._line(line)
+
+                if not self._point is None:
+                    if len(run) == 0:
+                        anchor = self._point[:2]
+                    run.append(self._point[2:] + (number, ))
+
+                    if len(run) >= simplifier.MAX_RUN:
+                        self._simplify(anchor, run, output, origins)
+                        run = []
+                    continue
+
+                if len(line) > 0:
+                    if len(run) > 0:
+                        self._simplify(anchor, run, output, origins)
+                        run = []
+
+                    output.append(line)
+                    origins.append(number)
+
+            if len(run) > 0:
+                self._simplify(anchor, run, output, origins)
+        except Exception:
+            self.failedLine = number
+            raise
+
+        result = b"\n".join(output) + b"\n" if len(output) > 0 else b""
+
+        self.lineMap.extend(origins)
+        self.lines = number
+        self.written += len(output)
+        self.bytesIn += len(chunk)
+        self.bytesOut += len(result)
+
+        return result
+
+
+    def passthrough(self, chunk):
+        # the rest of the file as it is (something went wrong) -- the line map still has to add up
+        count = chunk.count(b"\n")
+
+        self.lineMap.extend(range(self.lines + 1, self.lines + count + 1))
+        self.lines += count
+        self.written += count
+        self.bytesIn += len(chunk)
+        self.bytesOut += len(chunk)
+
+        return chunk
+
+
+    def write_map(self, path):
+        with open(path, "wb") as f:
+            self.lineMap.tofile(f)
+
+
+    def summary(self):
+        summary = dict(lines=self.lines, written=self.written, bytesIn=self.bytesIn, bytesOut=self.bytesOut)
+
+        if not self.simplifier is None:
+            summary["simplified"] = self.simplifier.summary()
+
+        return summary
+
+
+    def _set_units(self, inches):
+        # not knowing the units we round as finely as inches need
+        self.inches = inches
+        self._decimals = dict((axis, decimals(steps, inches is None or inches)) for axis, steps in self.stepsPerMm.items())
+
+        # whatever we knew was in the other units -- an F that repeats the
+        # old number is a different feed now and has to go out
+        self.position = {}
+        self.feed = None
+
+
+    def _forget(self):
+        self.motion = None
+        self.feed = None
+        self.speed = None
+        self.position = {}
+
+
+    def _simplify(self, anchor, run, output, origins):
+        # written out as moves from one kept point to the next -- only the words that change
+        x, y = anchor
+
+        for point in self.simplifier.simplify_run(anchor, run, float(self.feed), self.inches):
+            move = (b"X" + point[0] if point[0] != x else b"") + (b"Y" + point[1] if point[1] != y else b"")
+
+            # back where the last kept point was
+            if len(move) == 0:
+                continue
+
+            output.append(move)
+            origins.append(point[2])
+
+            x, y = point[:2]
+
+
+    def _line(self, raw):
+        self._point = None
+
+        line = raw.upper()
+        if b"(" in line or b";" in line:
+            line = validator.COMMENT.sub(b"", line)
+        line = line.translate(None, validator.WHITESPACE)
+
+        if len(line) == 0:
+            return line
+
+        words = []
+        for letter, value, other in validator.WORD.findall(line):
+            if other or len(value.strip(b"-+.")) == 0:
+                # not plain g-code ($ commands, our own BGS_ words, realtime lines, ...)
+                self._forget()
+                return raw.strip()
+            words.append((letter, value))
+
+        # N lines are dropped by bgs and anything else is up to grbl -- as they are
+        if words[0][0] == b"N" or not self._simple(words):
+            self._complex(words)
+            return line
+
+        return self._optimize(words)
+
+
+    def _simple(self, words):
+        seen = set()
+
+        for letter, value in words:
+            if letter == b"G":
+                code = number(value)
+                if code is None or not (code in MOTION or code in PLANE or code in UNITS or code in DISTANCE or code in FEED_MODE or code in OTHER_MODAL):
+                    return False
+            elif letter == b"M":
+                if not number(value) in SPINDLE_COOLANT:
+                    return False
+            elif not letter in self._axes and not letter in b"IJKRFS":
+                return False
+
+            # repeats are grbl's to complain about
+            if letter != b"G" and letter != b"M":
+                if letter in seen:
+                    return False
+                seen.add(letter)
+
+        return True
+
+
+    def _complex(self, words):
+        # keep track of the modal words we rely on -- forget the rest
+        self._forget()
+
+        for letter, value in words:
+            if letter == b"G":
+                code = number(value)
+                if code in UNITS:
+                    self._set_units(code == 20)
+                elif code in DISTANCE:
+                    self.relative = code == 91
+                elif code in FEED_MODE:
+                    self.inverse = code == 93
+                elif code in PLANE:
+                    self.plane = code
+
+
+    def _optimize(self, words):
+        output = []
+
+        # the modal words first -- they decide how the rest of the line reads
+        motion = self.motion
+        moves = False
+
+        for letter, value in words:
+            if letter != b"G":
+                continue
+
+            code = number(value)
+            if code in MOTION:
+                motion = code
+            elif code in UNITS:
+                if self.inches != (code == 20):
+                    self._set_units(code == 20)
+                    output.append(b"G%d" % code)
+            elif code in DISTANCE:
+                if self.relative != (code == 91):
+                    self.relative = code == 91
+                    output.append(b"G%d" % code)
+            elif code in FEED_MODE:
+                if self.inverse != (code == 93):
+                    self.inverse = code == 93
+                    output.append(b"G%d" % code)
+                    self.feed = None
+            elif code in PLANE:
+                if code != self.plane:
+                    self.plane = code
+                    output.append(b"G%d" % code)
+            else:
+                output.append(b"G%d" % code)
+
+        axisWords = []
+        arcWords = []
+        others = []
+
+        for letter, value in words:
+            if letter in self._axes:
+                axisWords.append((letter, value))
+            elif letter in b"IJKR":
+                arcWords.append((letter, value))
+            elif letter == b"F":
+                feed = normalize(value)
+
+                # inverse time wants a feed on every move
+                if not self.inverse is False or feed != self.feed:
+                    others.append(b"F" + feed)
+                self.feed = feed
+            elif letter == b"S":
+                speed = normalize(value)
+                if speed != self.speed:
+                    others.append(b"S" + speed)
+                self.speed = speed
+            elif letter == b"M":
+                others.append(b"M%d" % number(value))
+
+        arc = motion in (2, 3)
+
+        # a plain G1 in xy from a place we know -- the simplifier may want it
+        candidate = (not self.simplifier is None and motion == 1 and self.motion == 1 and self.relative is False and self.inverse is False and
+                     not self.inches is None and not self.feed is None and len(output) == 0 and len(others) == 0 and len(arcWords) == 0 and
+                     b"X" in self.position and b"Y" in self.position)
+        start = (self.position.get(b"X"), self.position.get(b"Y"))
+
+        if len(axisWords) > 0:
+            if motion is None or self.relative is None:
+                # axis words with a motion or distance mode we can not vouch for
+                for letter, value in axisWords:
+                    output.append(letter + normalize(value))
+                    self.position.pop(letter, None)
+                moves = True
+            elif self.relative:
+                # rounding relative moves would add up -- leave them be
+                for letter, value in axisWords:
+                    value = normalize(value)
+                    if arc or float(value) != 0:
+                        output.append(letter + value)
+                        moves = True
+                    self.position.pop(letter, None)
+            else:
+                for letter, value in axisWords:
+                    value = quantize(value, self._decimals[letter])
+
+                    # arcs keep their end point -- a full circle starts and ends in the same place
+                    if arc or self.position.get(letter) != value:
+                        output.append(letter + value)
+                        moves = True
+                    self.position[letter] = value
+
+            if arc:
+                for letter, value in arcWords:
+                    if self.relative:
+                        output.append(letter + normalize(value))
+                    else:
+                        output.append(letter + quantize(value, self._decimals.get(OFFSET_AXES[letter], MIN_DECIMALS)))
+        elif len(arcWords) > 0:
+            # offsets with nowhere to go -- grbl will say so
+            for letter, value in arcWords:
+                output.append(letter + normalize(value))
+
+        # the motion word only when it changes -- or a move needs it
+        if motion != self.motion or (moves and motion is None):
+            if not motion is None:
+                output.insert(0, b"G%d" % motion)
+        self.motion = motion
+
+        if candidate and moves and all(word[:1] in (b"X", b"Y") for word in output):
+            self._point = start + (self.position[b"X"], self.position[b"Y"])
+            return b""
+
+        return b"".join(output + others)
@@ -0,0 +1,121 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Written by:  Shell M. Shrader (https://github.com/synman/Octoprint-Bettergrblsupport)
+# Copyright [2021] [Shell M. Shrader]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# References
+#
+# https://github.com/gnea/grbl/wiki/Grbl-v1.1-Commands#feed-overrides
+# https://github.com/gnea/grbl/wiki/Grbl-v1.1-Interface#real-time-status-reports (Ov:)
+#
+from collections import deque
+
+# grbl clamps feed and spindle overrides to 10% - 200%
+MINIMUM = 10
+MAXIMUM = 200
+
+# (reset, +10, -10, +1, -1)
+FEED = ("\x90", "\x91", "\x92", "\x93", "\x94")
+SPINDLE = ("\x99", "\x9a", "\x9b", "\x9c", "\x9d")
+
+# index into the Ov: report (feed, rapids, spindle)
+FEED_INDEX = 0
+SPINDLE_INDEX = 2
+
+
+def clamp(value):
+    return min(max(int(round(value)), MINIMUM), MAXIMUM)
+
+
+def sequence(current, target, commands):
+    # shortest run of realtime bytes that takes an override from current to
+    # target.  grbl clamps every step so stepping into a limit (or resetting to
+    # 100% first) is fair game when it ends up shorter
+    current = clamp(current)
+    target = clamp(target)
+
+    reset, plus10, minus10, plus1, minus1 = commands
+    steps = ((reset, None), (plus10, 10), (minus10, -10), (plus1, 1), (minus1, -1))
+
+    previous = {current: None}
+    queue = deque([current])
+
+    while len(queue) > 0 and not target in previous:
+        value = queue.popleft()
+
+        for byte, delta in steps:
+            following = 100 if delta is None else clamp(value + delta)
+
+            if not following in previous:
+                previous[following] = (value, byte)
+                queue.append(following)
+
+    result = []
+    value = target
+
+    while not previous[value] is None:
+        value, byte = previous[value]
+        result.append(byte)
+
+    result.reverse()
+    return "".join(result)
+
+
+def is_supported(_plugin):
+    # grbl 1.1 (and grblHAL / grbl_esp32 which report as 1.x) and FluidNC.
+    # _bgs (and so octoprint) only comes in here -- clamp / sequence stand alone
+    from . import _bgs
+
+    return _bgs.is_grbl_one_dot_one(_plugin) or _bgs.is_grbl_fluidnc(_plugin)
+
+
+def apply(_plugin, index, commands, percent):
+    # true if the override went out as realtime bytes
+    if not is_supported(_plugin) or not _plugin.realtime.is_available():
+        return False
+
+    target = 100 if percent in (0, 100) else clamp(percent)
+    current = _plugin.grblOverrides[index]
+    confirmed = _plugin.grblOverridesConfirmed[index]
+
+    _plugin._logger.debug("_overrides: apply index=[{}] current=[{}] target=[{}] confirmed=[{}]".format(index, current, target, confirmed))
+
+    # only grbl's own Ov: report is good enough to skip on
+    if current == target and confirmed:
+        return True
+
+    # we do not know where grbl really is -- start over from 100%
+    if not confirmed:
+        current = 100
+        command = commands[0] + sequence(current, target, commands)
+    else:
+        command = sequence(current, target, commands)
+
+    if not _plugin.realtime.write(command):
+        return False
+
+    # until the next Ov: report tells us otherwise
+    _plugin.grblOverrides[index] = target
+    _plugin.grblOverridesConfirmed[index] = False
+    return True
+
+
+def apply_feed(_plugin, percent):
+    return apply(_plugin, FEED_INDEX, FEED, percent)
+
+
+def apply_spindle(_plugin, percent):
+    return apply(_plugin, SPINDLE_INDEX, SPINDLE, percent)
@@ -0,0 +1,172 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Written by:  Shell M. Shrader (https://github.com/synman/Octoprint-Bettergrblsupport)
+# Copyright [2021] [Shell M. Shrader]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# References
+#
+# https://github.com/gnea/grbl/wiki/Grbl-v1.1-Interface#real-time-status-reports
+# http://wiki.fluidnc.com/en/features/commands_and_settings#reportinterval
+#
+import threading
+import time
+
+from . import _bgs
+
+# states where the machine is (or may be) moving
+ACTIVE_STATES = ("RUN", "JOG", "HOME", "HOLD", "DOOR", "CHECK")
+
+
+class StatusPoller:
+    # requests status reports at a rate that follows grblState -- fast while
+    # the machine is moving, slow while it sits there, and not at all while
+    # it is asleep or nobody is around to look at the result.  FluidNC can
+    # push reports on its own in which case we just tell it how often.
+
+    _plugin = None
+    _wake = None
+    _thread = None
+
+    activeInterval = .2
+    idleInterval = 2.0
+    clients = 0
+    autoReport = False
+    running = False
+
+    def __init__(self, _plugin):
+        self._plugin = _plugin
+        self._wake = threading.Event()
+        self._thread = None
+
+        self.activeInterval = .2
+        self.idleInterval = 2.0
+        self.clients = 0
+        self.autoReport = False
+        self.running = False
+
+
+    def start(self):
+        if self.running:
+            return
+
+        self._plugin._logger.debug("StatusPoller: start active=[{}] idle=[{}]".format(self.activeInterval, self.idleInterval))
+
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name="bgs.poller")
+        self._thread.daemon = True
+        self._thread.start()
+
+
+    def stop(self):
+        self._plugin._logger.debug("StatusPoller: stop")
+
+        self.running = False
+        self._wake.set()
+
+
+    def wake(self):
+        self._wake.set()
+
+
+    def client_opened(self):
+        self.clients += 1
+        self.wake()
+
+
+    def client_closed(self):
+        self.clients = max(self.clients - 1, 0)
+
+
+    def enable_auto_report(self):
+        # FluidNC pushes status reports on its own
+        interval = int(self.activeInterval * 1000)
+        self._plugin._logger.debug("StatusPoller: enable_auto_report interval=[{}]".format(interval))
+
+        self.autoReport = True
+        self._plugin._printer.commands("$Report/Interval={}".format(interval))
+
+
+    def disable_auto_report(self):
+        self.autoReport = False
+        self.wake()
+
+
+    def is_active(self):
+        state = self._plugin.grblState
+        return not state is None and state.upper().split(":")[0] in ACTIVE_STATES
+
+
+    def interval(self):
+        # queued commands are waiting on our next report
+        if self.is_active() or len(self._plugin.grblCmdQueue) > 0:
+            return self.activeInterval
+
+        return self.idleInterval
+
+
+    def should_poll(self):
+        _plugin = self._plugin
+
+        if self.autoReport or _plugin.noStatusRequests or len(_plugin.lastRequest) > 0:
+            return False
+
+        if not _plugin._printer.is_operational():
+            return False
+
+        # a status request would only wake it up
+        if not _plugin.grblState is None and _plugin.grblState.upper() == "SLEEP":
+            return False
+
+        # nobody is watching -- unless we need reports to make progress
+        if self.clients == 0 and not _plugin._printer.is_printing() and len(_plugin.grblCmdQueue) == 0:
+            return False
+
+        return True
+
+
+    def poll(self):
+        _plugin = self._plugin
+
+        # go to sleep if autosleep and now - last > interval
+        if _plugin.autoSleep and time.time() - _plugin.autoSleepTimer > _plugin.autoSleepInterval * 60:
+            if _plugin.grblState.upper() != "SLEEP" and _plugin._printer.is_operational() and not _plugin._printer.is_printing():
+                _bgs.queue_cmds_and_send(_plugin, ["$SLP"])
+            else:
+                _plugin._logger.debug("resetting autosleep timer")
+                _plugin.autoSleepTimer = time.time()
+
+        if not self.should_poll():
+            return
+
+        byte = _plugin.commandRouter.realtime(_plugin.statusCommand)
+        if not byte is None and _plugin.realtime.write(byte):
+            return
+
+        _plugin._printer.commands(_plugin.statusCommand, force=True)
+
+
+    def _run(self):
+        while self.running:
+            self._wake.wait(self.interval())
+            self._wake.clear()
+
+            if not self.running:
+                break
+
+            try:
+                self.poll()
+            except Exception as e:
+                self._plugin._logger.warning("StatusPoller: poll failed: {}".format(e))
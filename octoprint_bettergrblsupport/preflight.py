@@ -0,0 +1,133 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Written by:  Shell M. Shrader (https://github.com/synman/Octoprint-Bettergrblsupport)
+# Copyright [2021] [Shell M. Shrader]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# References
+#
+# https://github.com/gnea/grbl/wiki/Grbl-v1.1-Configuration#130-131-132--max-travel-mm
+# https://github.com/gnea/grbl/blob/master/grbl/limits.c (system_check_travel_limits)
+# http://wiki.fluidnc.com/en/config/axes
+#
+from . import _bgs
+
+# a hair of slop for rounding in the file (and in $#)
+TOLERANCE = .001
+
+
+def job_bounds(analysis, axisBounds):
+    # x / y from the extents scan, everything else from the job index
+    minX, maxX, minY, maxY = analysis["bounds"]
+
+    bounds = dict(x=[minX, maxX], y=[minY, maxY])
+    for axis, (low, high) in axisBounds.items():
+        bounds[axis] = [low, high]
+
+    return bounds
+
+
+def machine_travel(_plugin):
+    # the machine coordinates each axis can reach -- (low, high).  grbl homes
+    # to 0 and travels negative from there.  FluidNC homes to mpos_mm.
+    xl, yl, zl = _bgs.get_axes_limits(_plugin)
+    travel = dict(x=(-abs(xl), 0.0), y=(-abs(yl), 0.0), z=(-abs(zl), 0.0))
+
+    try:
+        if _bgs.is_grbl_fluidnc(_plugin):
+            for axis, config in _plugin.fluidYaml.get("axes", {}).items():
+                if not axis in ("x", "y", "z", "a", "b") or not isinstance(config, dict) or config.get("max_travel_mm") is None:
+                    continue
+
+                distance = abs(float(config.get("max_travel_mm")))
+                homing = config.get("homing") or {}
+                mpos = float(homing.get("mpos_mm", 0))
+
+                if homing.get("positive_direction", True):
+                    travel[axis] = (mpos - distance, mpos)
+                else:
+                    travel[axis] = (mpos, mpos + distance)
+        else:
+            # grblHAL numbers its extra axes on from $132
+            for axis, setting in (("a", 133), ("b", 134)):
+                if setting in _plugin.grblSettings:
+                    travel[axis] = (-abs(float(_plugin.grblSettings.get(setting)[0])), 0.0)
+    except Exception as e:
+        _plugin._logger.warn("preflight: machine_travel: {}".format(e))
+
+    return travel
+
+
+def work_offsets(_plugin):
+    # where work zero is in machine coordinates -- the work coordinate system's
+    # origin plus whatever G92 and the tool length offset (z) add on top
+    offsets = dict(_plugin.offsets.get(_plugin.grblCoordinateSystem, {}))
+
+    for extra in (_plugin.offsets.get("G92", {}), _plugin.offsets.get("TLO", {})):
+        for axis, value in extra.items():
+            offsets[axis] = offsets.get(axis, 0.0) + value
+
+    return offsets
+
+
+def check(bounds, offsets, travel):
+    # bounds are work coordinates, offsets the work coordinate system's
+    # origin in machine coordinates -- returns every axis that will not fit
+    violations = []
+
+    for axis, (low, high) in sorted(bounds.items()):
+        if not axis in travel:
+            continue
+
+        offset = offsets.get(axis, 0.0)
+        machineLow = low + offset
+        machineHigh = high + offset
+        travelLow, travelHigh = travel[axis]
+
+        if machineLow < travelLow - TOLERANCE or machineHigh > travelHigh + TOLERANCE:
+            violations.append(dict(axis=axis.upper(),
+                                   low=machineLow,
+                                   high=machineHigh,
+                                   travelLow=travelLow,
+                                   travelHigh=travelHigh))
+
+    return violations
+
+
+def preflight_file(_plugin, filename, notify=False):
+    # metadata only -- no file access -- so it can run every time a file is selected
+    metadata = _plugin._file_manager.get_metadata("local", filename) or {}
+    bounds = metadata.get("bgs_bounds")
+
+    if bounds is None:
+        return None
+
+    offsets = work_offsets(_plugin)
+    violations = check(bounds, offsets, machine_travel(_plugin))
+
+    _plugin._logger.debug("preflight: preflight_file filename=[{}] coordinate=[{}] offsets=[{}] violations=[{}]".format(filename, _plugin.grblCoordinateSystem, offsets, violations))
+
+    if notify and len(violations) > 0:
+        text = "<br>".join(["{} travels {:.3f} to {:.3f} -- machine limits are {:.3f} to {:.3f}".format(
+            violation["axis"], violation["low"], violation["high"], violation["travelLow"], violation["travelHigh"]) for violation in violations])
+
+        _plugin._plugin_manager.send_plugin_message(_plugin._identifier, dict(type="simple_notify",
+                                                                             title="{} Exceeds Machine Travel ({})".format(filename, _plugin.grblCoordinateSystem),
+                                                                             text=text,
+                                                                             hide=False,
+                                                                             delay=0,
+                                                                             notify_type="error"))
+
+    return violations
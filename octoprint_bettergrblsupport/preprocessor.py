@@ -0,0 +1,330 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Written by:  Shell M. Shrader (https://github.com/synman/Octoprint-Bettergrblsupport)
+# Copyright [2021] [Shell M. Shrader]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# References
+#
+# https://docs.octoprint.org/en/master/plugins/hooks.html#octoprint-filemanager-preprocessor
+# https://docs.octoprint.org/en/master/modules/filemanager.html#octoprint.filemanager.util.StreamWrapper
+#
+# octoprint copies an upload into storage by reading the stream we hand it --
+# everything we want to know about the file is worked out from those same
+# bytes on their way by, so the stored file never has to be read back
+#
+import io
+import os
+import threading
+
+import octoprint.filemanager.util
+
+from . import _bgs
+from . import cache
+from . import extents
+from . import jobindex
+from . import optimizer
+from . import preflight
+
+GCODE_EXTENSIONS = (".gcode", ".gco", ".g", ".gc", ".nc")
+
+# uploads we have analyzed that have not been picked up yet
+MAX_PENDING = 16
+
+
+class OptimizingStream(io.RawIOBase):
+    # hands the upload on optimized (see optimizer) a chunk of whole lines at
+    # a time -- if the optimizer trips over something the rest goes as it is
+
+    _plugin = None
+    _input = None
+    _optimizer = None
+    _buffer = None
+    _output = None
+    _eof = False
+
+    failed = False
+
+    def __init__(self, _plugin, input, optimizer):
+        io.RawIOBase.__init__(self)
+
+        self._plugin = _plugin
+        self._input = input
+        self._optimizer = optimizer
+        self._buffer = bytearray()
+        self._output = bytearray()
+        self._eof = False
+
+        self.failed = False
+
+
+    def readable(self):
+        return True
+
+
+    def readinto(self, b):
+        while len(self._output) == 0 and not self._eof:
+            data = self._input.read(extents.CHUNK_SIZE)
+
+            if not data:
+                self._eof = True
+
+                if len(self._buffer) > 0:
+                    self._optimize(bytes(self._buffer) + b"\n")
+                    self._buffer = bytearray()
+                break
+
+            self._buffer += data
+            end = self._buffer.rfind(b"\n") + 1
+
+            if end > 0:
+                self._optimize(bytes(self._buffer[:end]))
+                del self._buffer[:end]
+
+        length = min(len(b), len(self._output))
+
+        b[:length] = self._output[:length]
+        del self._output[:length]
+
+        return length
+
+
+    def close(self):
+        self._input.close()
+        io.RawIOBase.close(self)
+
+
+    def _optimize(self, chunk):
+        if not self.failed:
+            first = self._optimizer.lines
+
+            try:
+                self._output += self._optimizer.feed_chunk(chunk)
+                return
+            except Exception as e:
+                self.failed = True
+
+                line = self._optimizer.failedLine
+                text = chunk.split(b"\n")[line - first - 1].decode("utf-8", "replace") if not line is None else ""
+
+                self._plugin._logger.warning("OptimizingStream: unable to optimize line [{}] [{}] -- the rest goes as it is: {}".format(line, text.strip(), e))
+
+        self._output += self._optimizer.passthrough(chunk)
+
+
+class ExtentsStream(io.RawIOBase):
+    # hands the upload through untouched while scanning, indexing, checking
+    # (and hashing) it on the way by -- once the last byte is read the result
+    # is waiting for us
+
+    _input = None
+    _extents = None
+    _digest = None
+    _buffer = None
+    _complete = None
+    _index = None
+    _validator = None
+
+    size = 0
+    finished = False
+    failed = False
+
+    def __init__(self, input, positioning, profile, validator, complete):
+        io.RawIOBase.__init__(self)
+
+        self._input = input
+        self._extents = extents.Extents(positioning)
+        self._digest = cache.new_hash()
+        self._buffer = bytearray()
+        self._complete = complete
+        self._index = jobindex.IndexBuilder(positioning, profile=profile)
+        self._validator = validator
+
+        self.size = 0
+        self.finished = False
+        self.failed = False
+
+
+    def readable(self):
+        return True
+
+
+    def readinto(self, b):
+        data = self._input.read(len(b))
+
+        if not data:
+            self._finish()
+            return 0
+
+        b[:len(data)] = data
+
+        self.size += len(data)
+
+        if not self.failed:
+            self._digest.update(data)
+            self._buffer += data
+
+            # scan in whole lines and in chunks big enough to be worth it
+            if len(self._buffer) >= extents.CHUNK_SIZE:
+                end = self._buffer.rfind(b"\n") + 1
+
+                if end > 0:
+                    self._scan(bytes(self._buffer[:end]))
+                    del self._buffer[:end]
+
+        return len(data)
+
+
+    def close(self):
+        # an upload that never got to its end leaves nothing behind
+        if not self.finished:
+            self._index.close()
+
+        self._input.close()
+        io.RawIOBase.close(self)
+
+
+    def _scan(self, chunk):
+        # whatever happens in here must never get in the way of the upload
+        try:
+            extents.scan_chunk(self._extents, chunk)
+            self._index.feed_chunk(chunk)
+            self._validator.feed_chunk(chunk)
+        except Exception:
+            self.failed = True
+            self._buffer = bytearray()
+            self._index.close()
+
+
+    def _finish(self):
+        if self.finished:
+            return
+
+        self.finished = True
+
+        if len(self._buffer) > 0 and not self.failed:
+            # a last line without its line feed is a line all the same
+            if self._buffer[-1:] != b"\n":
+                self._buffer += b"\n"
+
+            self._scan(bytes(self._buffer))
+            self._buffer = bytearray()
+
+        self._complete(self, self._extents, self._index, self._validator, self._digest.hexdigest())
+
+
+class UploadAnalyzer:
+    # keeps the results of upload time analysis until the metadata for the
+    # file gets generated (FILE_ADDED / UPLOAD) and feeds the analysis cache
+
+    _plugin = None
+    _lock = None
+    _pending = None
+
+    def __init__(self, _plugin):
+        self._plugin = _plugin
+        self._lock = threading.Lock()
+        self._pending = {}
+
+
+    def wrap(self, path, file_object):
+        if not path.lower().endswith(GCODE_EXTENSIONS):
+            return file_object
+
+        self._plugin._logger.debug("UploadAnalyzer: wrap path=[{}] optimize=[{}]".format(path, self._plugin.optimizeUploads))
+
+        positioning = self._plugin.positioning
+        profile = _bgs.get_machine_profile(self._plugin)
+
+        source = file_object.stream()
+        rewriter = None
+
+        # what gets stored (and analyzed) is the optimized file
+        if self._plugin.optimizeUploads:
+            rewriter = _bgs.new_optimizer(self._plugin)
+            source = OptimizingStream(self._plugin, source, rewriter)
+
+        def complete(stream, result, index, validator, digest):
+            if stream.failed:
+                self._plugin._logger.warning("UploadAnalyzer: unable to analyze [{}] -- it will be scanned from disk".format(path))
+                return
+
+            try:
+                self._completed(path, positioning, profile.fingerprint(), stream.size, result, index, validator, rewriter, digest)
+            except Exception as e:
+                self._plugin._logger.warning("UploadAnalyzer: unable to analyze [{}]: {}".format(path, e))
+
+        return octoprint.filemanager.util.StreamWrapper(file_object.filename, ExtentsStream(source, positioning, profile, _bgs.new_validator(self._plugin), complete))
+
+
+    def get(self, path, size):
+        # only if it is still the same file we saw go by
+        with self._lock:
+            result = self._pending.get(path)
+
+        if not result is None and result["size"] == size:
+            return result
+
+        return None
+
+
+    def rename(self, path, destination):
+        with self._lock:
+            if path in self._pending:
+                self._pending[destination] = self._pending.pop(path)
+
+
+    def _completed(self, path, positioning, profile, size, result, index, validator, rewriter, digest):
+        analysis = result.summary()
+
+        self._plugin._logger.debug("UploadAnalyzer: analyzed path=[{}] size=[{}] analysis=[{}]".format(path, size, analysis))
+
+        self._plugin.analysisCache.put(self._plugin.analysisCache.hash_key(digest, "extents", extents.VERSION, positioning), analysis)
+
+        folder = jobindex.index_folder(self._plugin)
+        name = jobindex.index_name(digest, positioning, profile)
+
+        # the same content may be uploaded (or analyzed) more than once at a time
+        with jobindex.building(name):
+            if os.path.exists(os.path.join(folder, name)):
+                index.estimator.finish(index.lines)
+                index.close()
+            else:
+                index.write(os.path.join(folder, name))
+                jobindex.prune(folder, jobindex.MAX_INDEXES)
+
+        errors = [list(error) for error in validator.errors]
+        self._plugin.analysisCache.put(_bgs.validation_key(self._plugin, digest), errors)
+
+        optimized = None
+
+        if not rewriter is None:
+            optimized = dict(map=optimizer.map_name(digest), **rewriter.summary())
+
+            rewriter.write_map(os.path.join(folder, optimized["map"]))
+            jobindex.prune(folder, jobindex.MAX_INDEXES, ".bgsm")
+
+            self._plugin._logger.debug("UploadAnalyzer: optimized path=[{}] optimized=[{}]".format(path, optimized))
+
+        # the extents' own bounds make way for the whole job's (see preflight.job_bounds)
+        upload = dict(analysis, size=size, index=name, estimate=index.estimator.total, errors=errors, optimized=optimized,
+                      bounds=preflight.job_bounds(analysis, jobindex.axis_bounds(index.bounds)))
+
+        with self._lock:
+            self._pending.pop(path, None)
+            self._pending[path] = upload
+
+            while len(self._pending) > MAX_PENDING:
+                self._pending.pop(next(iter(self._pending)))
@@ -0,0 +1,302 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Written by:  Shell M. Shrader (https://github.com/synman/Octoprint-Bettergrblsupport)
+# Copyright [2021] [Shell M. Shrader]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# References
+#
+# https://github.com/gnea/grbl/wiki/Grbl-v1.1-Interface#real-time-status-reports
+# https://docs.octoprint.org/en/master/plugins/hooks.html#octoprint-printer-estimation-factory
+# https://github.com/gnea/grbl/blob/master/grbl/motion_control.c (mc_arc)
+# https://github.com/gnea/grbl/wiki/Grbl-v1.1-Configuration#12--arc-tolerance-mm
+#
+import math
+import re
+import threading
+
+from collections import OrderedDict, deque
+
+from octoprint.printer.estimation import PrintTimeEstimator
+
+from . import extents
+from .streaming import OPTIONS
+
+# Grbl 1.1 reports 15 free planner blocks when idle
+DEFAULT_PLANNER_BLOCKS = 15
+
+# more than grbl can ever have queued up (rx buffer + planner)
+MAX_TRACKED = 512
+
+LINE_NUMBER = re.compile(r"^\s*N(\d+)", re.IGNORECASE)
+
+# $12 out of the box
+DEFAULT_ARC_TOLERANCE = 0.002
+
+AXES = ("X", "Y", "Z", "A", "B", "C")
+
+# the arc offset words for each plane
+ARC_OFFSETS = {17: ("I", "J"), 18: ("I", "K"), 19: ("J", "K")}
+
+# g codes that take axis words without moving to them
+NO_MOVE = (4, 10, 28.1, 30.1, 92)
+
+
+def planner_blocks(version):
+    # $I reports the planner size on Grbl 1.1 / grblHAL
+    match = OPTIONS.search(version if not version is None else "")
+    if match is None:
+        return DEFAULT_PLANNER_BLOCKS
+
+    return max(int(match.group(1)), 1)
+
+
+def arc_segments(length, radius, tolerance):
+    # how many planner blocks grbl cuts an arc into -- the chord of every
+    # segment stays within $12 of the true arc
+    if length <= 0 or radius <= 0 or tolerance <= 0 or tolerance >= 2 * radius:
+        return 1
+
+    return max(int(math.floor(0.5 * length / math.sqrt(tolerance * (2 * radius - tolerance)))), 1)
+
+
+class ProgressTracker:
+    # works out which line of the job grbl is executing -- not which one
+    # octoprint last sent, which can be a few hundred moves ahead thanks to
+    # the rx buffer and the planner -- and looks up how long the rest of the
+    # job will take in the job index's cumulative time table.  grbl's Ln:
+    # is used when the job carries line numbers, otherwise we count back from
+    # the last line sent by what is still in flight and then by the planner
+    # blocks in use -- every line is sent with the blocks it takes up (none
+    # for a line that does not move, one per segment for an arc).
+
+    _plugin = None
+    _lock = None
+    _index = None
+    _sent = None
+    _numbers = None
+
+    plannerBlocks = DEFAULT_PLANNER_BLOCKS
+    arcTolerance = DEFAULT_ARC_TOLERANCE
+    motion = 0
+    plane = 17
+    inches = False
+    line = -1
+    remaining = None
+    active = False
+
+    def __init__(self, _plugin):
+        self._plugin = _plugin
+        self._lock = threading.Lock()
+        self._index = None
+        self._sent = deque(maxlen=MAX_TRACKED)
+        self._numbers = OrderedDict()
+
+        self.plannerBlocks = DEFAULT_PLANNER_BLOCKS
+        self.arcTolerance = DEFAULT_ARC_TOLERANCE
+        self.motion = 0
+        self.plane = 17
+        self.inches = False
+        self.line = -1
+        self.remaining = None
+        self.active = False
+
+
+    def start(self, index, firstLine=0, arcTolerance=DEFAULT_ARC_TOLERANCE):
+        # index is the job's JobIndex (None if it has not been built yet),
+        # firstLine where in the file octoprint starts (a resumed job) and
+        # arcTolerance the controller's $12
+        plannerBlocks = planner_blocks(self._plugin.grblVersion)
+        self._plugin._logger.debug("ProgressTracker: start index=[{}] plannerBlocks=[{}] arcTolerance=[{}]".format(None if index is None else index.path, plannerBlocks, arcTolerance))
+
+        # the modes in effect where we start (a resumed job is part way in)
+        state = dict(motion=0, plane=17, inches=False) if index is None else index.state(firstLine)
+
+        with self._lock:
+            self._close()
+            self._index = index
+            self._sent.clear()
+            self._numbers.clear()
+
+            self.plannerBlocks = plannerBlocks
+            self.arcTolerance = arcTolerance
+            self.motion = state["motion"]
+            self.plane = state["plane"]
+            self.inches = state["inches"]
+            self.line = -1
+            self.remaining = None if index is None else index.total_time()
+            self.active = not index is None
+
+
+    def stop(self):
+        self._plugin._logger.debug("ProgressTracker: stop line=[{}]".format(self.line))
+
+        with self._lock:
+            self._close()
+            self.active = False
+            self.remaining = None
+
+
+    def sending(self, gcode, tags):
+        # called from octoprint's send loop for every line (gcode is its
+        # GCodeLine) -- only job lines count.  fileline: skips the comments
+        # and blank lines octoprint never sends, filepos: is where the line
+        # really ends in the file
+        if not self.active or tags is None or not "source:file" in tags:
+            return
+
+        position = None
+
+        for tag in tags:
+            if tag.startswith("filepos:"):
+                position = int(tag[8:])
+
+        if position is None:
+            return
+
+        with self._lock:
+            if self._index is None:
+                return
+
+            line = self._index.line_at(max(position - 1, 0))
+
+            self._sent.append((line, self._blocks(gcode, line)))
+
+            match = LINE_NUMBER.match(gcode.line)
+            if not match is None:
+                self._numbers[int(match.group(1))] = line
+
+                while len(self._numbers) > MAX_TRACKED:
+                    self._numbers.popitem(last=False)
+
+
+    def update(self, status, inflight=0):
+        # called for every status report while a job runs -- returns the
+        # executing line, the seconds left and the percent done by time (or
+        # None if we can not tell)
+        if not self.active:
+            return None
+
+        with self._lock:
+            if self._index is None or len(self._sent) == 0:
+                return None
+
+            line = None
+
+            if not status.line is None:
+                line = self._numbers.get(status.line)
+
+            if line is None:
+                line = self._executing(inflight, None if status.blocks is None else max(self.plannerBlocks - status.blocks, 0))
+
+            # grbl never goes backwards through a job
+            line = max(line, self.line)
+
+            total = self._index.total_time()
+            elapsed = self._index.time(line)
+            remaining = total - elapsed
+
+            # feed overrides stretch (or shrink) what is left
+            if not status.overrides is None and status.overrides[0] > 0:
+                remaining = remaining * 100 / status.overrides[0]
+
+            self.line = line
+            self.remaining = max(remaining, 0)
+
+            return line, self.remaining, 100 * elapsed / total if total > 0 else 0.0
+
+
+    def _executing(self, inflight, queued):
+        # lines still in flight have not reached the planner -- behind them
+        # the oldest of the queued blocks is the one grbl is running
+        position = max(len(self._sent) - 1 - inflight, 0)
+
+        if queued is None:
+            return self._sent[position][0]
+
+        while position > 0:
+            queued -= self._sent[position][1]
+            if queued <= 0:
+                break
+            position -= 1
+
+        return self._sent[position][0]
+
+
+    def _blocks(self, gcode, line):
+        # how many planner blocks a line takes up once grbl has it (see mc_arc)
+        moves = 1
+
+        for value in gcode.codes("G"):
+            if value in (0, 1, 2, 3):
+                self.motion = int(value)
+            elif 38 <= value < 39:
+                self.motion = 1
+            elif value == 80:
+                self.motion = None
+            elif value in (17, 18, 19):
+                self.plane = int(value)
+            elif value == 20:
+                self.inches = True
+            elif value == 21:
+                self.inches = False
+            elif value in NO_MOVE:
+                moves = 0
+            elif value in (28, 30):
+                # by way of the intermediate point (if there is one)
+                return 2 if any(gcode.has(axis) for axis in AXES) else 1
+
+        if moves == 0 or self.motion is None or not any(gcode.has(axis) for axis in AXES):
+            return 0
+
+        if self.motion < 2:
+            return 1
+
+        scale = extents.MM_PER_INCH if self.inches else 1.0
+
+        if gcode.has("R"):
+            radius = abs(gcode.get("R")) * scale
+        else:
+            first, second = ARC_OFFSETS.get(self.plane, ARC_OFFSETS[17])
+            radius = math.hypot(gcode.get(first, 0.0), gcode.get(second, 0.0)) * scale
+
+        # the index has the arc's length (helix and all) in mm
+        return arc_segments(self._index.distance(line) - self._index.distance(line - 1), radius, self.arcTolerance)
+
+
+    def _close(self):
+        if not self._index is None:
+            self._index.close()
+            self._index = None
+
+
+class GrblPrintTimeEstimator(PrintTimeEstimator):
+    # octoprint's own estimate goes by bytes sent -- ours goes by the line
+    # grbl is executing (when we are tracking one)
+
+    _plugin = None
+
+    def __init__(self, job_type, _plugin):
+        PrintTimeEstimator.__init__(self, job_type)
+        self._plugin = _plugin
+
+
+    def estimate(self, progress, printTime, cleanedPrintTime, statisticalTotalPrintTime, statisticalTotalPrintTimeType):
+        tracker = self._plugin.progressTracker
+
+        if tracker.active and not tracker.remaining is None:
+            return tracker.remaining, "estimate"
+
+        return PrintTimeEstimator.estimate(self, progress, printTime, cleanedPrintTime, statisticalTotalPrintTime, statisticalTotalPrintTimeType)
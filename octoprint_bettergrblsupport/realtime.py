@@ -0,0 +1,140 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Written by:  Shell M. Shrader (https://github.com/synman/Octoprint-Bettergrblsupport)
+# Copyright [2021] [Shell M. Shrader]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# References
+#
+# https://github.com/gnea/grbl/wiki/Grbl-v1.1-Commands#grbl-v11-realtime-commands
+# https://docs.octoprint.org/en/master/plugins/hooks.html#octoprint-comm-protocol-gcode-phase
+# https://github.com/OctoPrint/OctoPrint/blob/master/src/octoprint/util/comm.py (MachineCom._send_loop)
+#
+from octoprint.util.version import is_octoprint_compatible
+
+# MachineCom has kept its port in _serial since well before this -- newer
+# versions are checked for it when we attach and we stay out of the way if it
+# has gone
+SUPPORTED_OCTOPRINT = ">=1.4.0"
+
+# lines that are nothing but a realtime command (grbl 0.9+)
+REALTIME_LINES = {
+    "?":     ("?", "Requesting status report"),
+    "!":     ("!", "Feed hold"),
+    "~":     ("~", "Cycle start / resume"),
+    "\x18":  ("\x18", "Soft reset"),
+}
+
+# Grbl 1.1 Realtime Commands (requires Octoprint 1.8.0+ when queued)
+# see https://github.com/OctoPrint/OctoPrint/pull/4390
+REALTIME_COMMANDS = {
+    "SAFETYDOOR":     ("\x84", "Triggering safety door"),
+    "CANCELJOG":      ("\x85", "Cancelling jog"),
+    "FEEDNORMAL":     ("\x90", "Setting normal feed rate"),
+    "FEEDPLUS10":     ("\x91", "Setting feed rate +10%"),
+    "FEEDMINUS10":    ("\x92", "Setting feed rate -10%"),
+    "FEEDPLUS1":      ("\x93", "Setting feed rate +1%"),
+    "FEEDMINUS1":     ("\x94", "Setting feed rate -1%"),
+    "SPINDLENORMAL":  ("\x99", "Setting normal spindle speed"),
+    "SPINDLEPLUS10":  ("\x9a", "Setting spindle speed +10%"),
+    "SPINDLEMINUS10": ("\x9b", "Setting spindle speed -10%"),
+    "SPINDLEPLUS1":   ("\x9c", "Setting spindle speed +1%"),
+    "SPINDLEMINUS1":  ("\x9d", "Setting spindle speed -1%"),
+    "TOGGLESPINDLE":  ("\x9e", "Toggling spindle stop"),
+}
+
+
+class RealtimeWriter:
+    # grbl picks realtime bytes off the serial stream the moment they arrive
+    # (even in the middle of a line) so there is no reason for them to wait
+    # behind octoprint's send queue -- or cost us a line and an "ok".
+    #
+    # octoprint's send loop writes its lines without holding any lock we could
+    # share (_sendingLock only guards enqueueing) so we take none either -- a
+    # realtime byte is fine anywhere, even in the middle of one of its lines,
+    # and a feed hold never waits on octoprint.  whole lines (send) are only
+    # safe while octoprint's send loop is parked -- CheckModeVerifier.park
+
+    _plugin = None
+    _comm = None
+    _supported = None
+    _refused = None
+
+    def __init__(self, _plugin):
+        self._plugin = _plugin
+        self._comm = None
+        self._supported = None
+        self._refused = None
+
+
+    def attach(self, comm_instance):
+        # called for every command -- only the first sight of a comm instance costs anything
+        if comm_instance is self._comm or comm_instance is self._refused:
+            return
+
+        if self._supported is None:
+            self._supported = is_octoprint_compatible(SUPPORTED_OCTOPRINT)
+
+        if not self._supported or not hasattr(comm_instance, "_serial"):
+            self._plugin._logger.warning("RealtimeWriter: no direct access to the serial port -- realtime commands will be queued")
+            self.detach()
+            self._refused = comm_instance
+            return
+
+        self._comm = comm_instance
+
+
+    def detach(self):
+        self._plugin._logger.debug("RealtimeWriter: detach")
+        self._comm = None
+
+
+    def is_available(self):
+        return not self._comm is None and not self._comm._serial is None
+
+
+    def write(self, data):
+        # a single realtime command -- true if it went out, callers fall back to the queued path if not
+        data = data.encode("latin_1")
+
+        if not self._write(data, "write [{}]".format(data.hex())):
+            return False
+
+        self._plugin._logger.debug("RealtimeWriter: wrote [{}]".format(data.hex()))
+        return True
+
+
+    def send(self, data):
+        # whole lines straight onto the wire (unlogged -- the check mode streamer lives here).
+        # only while octoprint's send loop is parked or they could land in the middle of its lines
+        return self._write(data, "send [{}] bytes".format(len(data)))
+
+
+    def _write(self, data, what):
+        comm = self._comm
+        if comm is None:
+            return False
+
+        serial = comm._serial
+        if serial is None:
+            return False
+
+        try:
+            serial.write(data)
+        except Exception as e:
+            self._plugin._logger.warning("RealtimeWriter: unable to {}: {}".format(what, e))
+            return False
+
+        return True
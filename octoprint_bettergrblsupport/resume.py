@@ -0,0 +1,131 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Written by:  Shell M. Shrader (https://github.com/synman/Octoprint-Bettergrblsupport)
+# Copyright [2021] [Shell M. Shrader]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# References
+#
+# https://github.com/gnea/grbl/blob/master/doc/markdown/commands.md#g---view-gcode-parser-state
+# https://docs.octoprint.org/en/master/plugins/hooks.html#octoprint-comm-protocol-scripts
+# https://docs.octoprint.org/en/master/modules/printer.html#octoprint.printer.PrinterInterface.start_print
+#
+from . import _bgs
+from . import extents
+from . import jobindex
+
+# seconds to let the spindle come up to speed before we plunge
+SPIN_UP = 10
+
+
+def resume_line(index, line=None, zLevel=None):
+    # line and zLevel are both 1 based (what a user counts) -- the result is not
+    if not zLevel is None:
+        # a level starts wherever the job plunges (retracts do not count)
+        levels = []
+        previous = 0.0
+
+        for number, z in index.z_levels():
+            if z < previous:
+                levels.append(number)
+            previous = z
+
+        if zLevel < 1 or zLevel > len(levels):
+            raise ValueError("job has {} z levels".format(len(levels)))
+
+        return levels[zLevel - 1]
+
+    if line is None or line < 1 or line > index.lines:
+        raise ValueError("job has {} lines".format(index.lines))
+
+    return line - 1
+
+
+def preamble(state, clearance, laser):
+    # everything the job set up before line -- and a safe way back to it
+    commands = ["G21 G90 G{} G{}".format(state["coordinate"], state["plane"])]
+
+    # up and over (grbl's laser mode keeps the beam off for G0)
+    commands.append("G0 Z{:.3f}".format(clearance))
+    commands.append("G0 X{:.3f} Y{:.3f}".format(state["x"], state["y"]))
+
+    if state["spindle"] in (3, 4):
+        commands.append("M{} S{:g}".format(state["spindle"], state["speed"]))
+
+        if not laser:
+            commands.append("G4 P{}".format(SPIN_UP))
+
+    if state["coolant"] & jobindex.MIST:
+        commands.append("M7")
+    if state["coolant"] & jobindex.FLOOD:
+        commands.append("M8")
+
+    # and down
+    if state["feed"] > 0:
+        commands.append("G1 Z{:.3f} F{:.3f}".format(state["z"], state["feed"]))
+    else:
+        commands.append("G0 Z{:.3f}".format(state["z"]))
+
+    # leave the parser the way the job had it
+    modes = []
+    if state["inches"]:
+        modes.append("G20")
+    if state["relative"]:
+        modes.append("G91")
+
+    modes.append("G80" if state["motion"] is None else "G{}".format(state["motion"]))
+
+    if state["feed"] > 0:
+        modes.append("F{:.3f}".format(state["feed"] / extents.MM_PER_INCH if state["inches"] else state["feed"]))
+
+    commands.append(" ".join(modes))
+    return commands
+
+
+def resume_job(_plugin, line=None, zLevel=None):
+    # restart the selected job part way through -- returns what we are about to do
+    _plugin._logger.debug("resume: resume_job line=[{}] zLevel=[{}]".format(line, zLevel))
+
+    job = _plugin._printer.get_current_job().get("file", {})
+    path = job.get("path")
+
+    if path is None or job.get("origin") != "local":
+        raise ValueError("no local file selected")
+
+    index = _bgs.open_job_index(_plugin, path)
+    if index is None:
+        raise ValueError("{} has not been analyzed yet".format(path))
+
+    try:
+        start = resume_line(index, line, zLevel)
+        state = index.replay(_plugin._file_manager.path_on_disk("local", path), start)
+
+        # the highest the job ever goes is as safe as anything we could pick
+        clearance = max([state["z"]] + [z for number, z in index.z_levels()])
+
+        commands = preamble(state, clearance, _bgs.is_laser_mode(_plugin))
+        offset = index.offset(start)
+    finally:
+        index.close()
+
+    _plugin._logger.info("resuming [{}] at line [{}] offset [{}] preamble=[{}]".format(path, start + 1, offset, commands))
+
+    # picked up by the beforePrintStarted script hook and PRINT_STARTED
+    _plugin.resumePreamble = commands
+    _plugin.resumeLine = start
+
+    _plugin._printer.start_print(pos=offset)
+
+    return dict(path=path, line=start + 1, offset=offset, preamble=commands)
@@ -0,0 +1,351 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Written by:  Shell M. Shrader (https://github.com/synman/Octoprint-Bettergrblsupport)
+# Copyright [2021] [Shell M. Shrader]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# References
+#
+# https://github.com/gnea/grbl/blob/master/doc/markdown/commands.md
+# https://github.com/gnea/grbl/wiki/Grbl-v1.1-Interface#grbl-push-messages
+# https://reprap.org/wiki/G-code
+#
+import re
+import time
+import subprocess
+
+from octoprint.events import Events
+
+from . import _bgs
+from . import checkmode
+from . import overrides
+from . import tokenizer
+from .realtime import REALTIME_LINES, REALTIME_COMMANDS
+
+# leading command word of an upper cased line ("M115", "$I", "G54", "SAFETYDOOR", ...)
+WORD = re.compile(r"([A-Z_$]+)(\d*\.?\d*)")
+
+
+def normalize(word):
+    match = WORD.match(word.strip().upper())
+    if match is None:
+        return word.strip().upper()[:1]
+
+    letters, number = match.groups()
+
+    # M03 and M3 are the same command
+    if len(letters) == 1 and len(number) > 1 and not "." in number:
+        number = str(int(number))
+
+    return letters + number
+
+
+class CommandRouter:
+    # a handler is called as handler(_plugin, cmd, command) where command is
+    # the upper cased cmd.  it returns None to let cmd continue on unchanged,
+    # a string to continue on with a rewritten cmd, or a tuple which is handed
+    # straight back to octoprint (e.g. (None, ) to drop the line)
+
+    _plugin = None
+    _builtins = {}
+    _handlers = {}
+    _routes = {}
+
+    def __init__(self, _plugin):
+        self._plugin = _plugin
+        self._builtins = {}
+        self._handlers = {}
+        self._routes = {}
+
+
+    def register(self, word, handler):
+        self._plugin._logger.debug("CommandRouter: register word=[{}]".format(word))
+        self._handlers[normalize(word)] = handler
+        self._merge()
+
+
+    def unregister(self, word):
+        self._plugin._logger.debug("CommandRouter: unregister word=[{}]".format(word))
+        self._handlers.pop(normalize(word), None)
+        self._merge()
+
+
+    def rebuild(self):
+        self._plugin._logger.debug("CommandRouter: rebuild")
+        self._builtins = build_routes(self._plugin)
+        self._merge()
+
+
+    def _merge(self):
+        routes = dict(self._builtins)
+        routes.update(self._handlers)
+
+        # swapped in one shot so the comm thread never sees a partial table
+        self._routes = routes
+
+
+    def route(self, command):
+        routes = self._routes
+
+        match = WORD.match(command)
+        if match is None:
+            return routes.get(command[:1])
+
+        letters, number = match.groups()
+
+        if len(letters) == 1 and len(number) > 1 and number[0] == "0" and not "." in number:
+            number = str(int(number))
+
+        handler = routes.get(letters + number)
+        if handler is None and number:
+            handler = routes.get(letters)
+
+        return handler
+
+
+    def sends(self, command):
+        # whether command reaches grbl as written -- coordinate system and
+        # coolant changes are only watched on their way by
+        handler = self.route(command)
+        return handler is None or handler in (coordinate_system, coolant_on, coolant_off)
+
+
+    def realtime(self, command):
+        # the byte for a line that is nothing but a realtime command
+        handler = self._routes.get(command)
+        return getattr(handler, "byte", None)
+
+
+def build_routes(_plugin):
+    _plugin._logger.debug("_router: build_routes")
+
+    routes = {}
+
+    routes["BGS_MULTIPOINT_ZPROBE_MOVE"] = multipoint_zprobe_move
+    routes[checkmode.PARK_COMMAND] = check_mode
+
+    for word in ("$H", "$HX", "$HY", "$HZ", "$HA", "$HB"):
+        routes[word] = homing
+
+    # suppress comments and extraneous commands that may cause wayward
+    # grbl instances to error out
+    for word in (";", "(", "%"):
+        routes[word] = ignore
+
+    if _plugin.suppressM110:
+        routes["M110"] = reset_line_numbers
+
+    # ignore all of these -- they do not apply to GRBL
+    # M21 (initialize SD)
+    # M108 (heater off)
+    # M84 (disable motors)
+    # M104 (set extruder temperature)
+    # M140 (set bed temperature)
+    # M106 (fan on/off)
+    # N -- suggests a line number and we don't roll like that
+    for word in ("M21", "M108", "M84", "M104", "M140", "M106", "N"):
+        routes[word] = ignore
+
+    for word in ("G54", "G55", "G56", "G57", "G58", "G59"):
+        routes[word] = coordinate_system
+
+    routes["M7"] = coolant_on
+    routes["M8"] = coolant_on
+    routes["M9"] = coolant_off
+
+    for word, (byte, description) in REALTIME_LINES.items():
+        routes[word] = realtime_command(byte, description)
+
+    # firmware dependent -- this is why we get rebuilt when the version changes
+    realtime = overrides.is_supported(_plugin)
+
+    for word, (byte, description) in REALTIME_COMMANDS.items():
+        routes[word] = realtime_command(byte, description) if realtime else ignore
+
+    if _plugin.suppressM115:
+        routes["M115"] = hello
+
+    if _plugin.suppressM400:
+        routes["M400"] = dwell
+
+    if _plugin.suppressM114:
+        routes["M114"] = position
+
+    if not _plugin.doSmoothie:
+        routes["M999"] = soft_reset
+
+    routes["M290"] = babystep
+    routes["$I"] = version_info
+
+    return routes
+
+
+def ignore(_plugin, cmd, command):
+    _plugin._logger.debug("ignoring [%s]", cmd)
+    return (None, )
+
+
+def multipoint_zprobe_move(_plugin, cmd, command):
+    # forward on BGS_MULTIPOINT_ZPROBE_MOVE events to _bgs
+    _bgs.multipoint_zprobe_move(_plugin)
+    return (None, )
+
+
+def check_mode(_plugin, cmd, command):
+    # a verification has the serial port until it is done
+    _plugin.checkMode.park()
+    return (None, )
+
+
+def homing(_plugin, cmd, command):
+    # hack for unacknowledged grbl commmands
+    _plugin.grblState = "Home"
+    _plugin.telemetry.publish(state="Run")
+
+
+def reset_line_numbers(_plugin, cmd, command):
+    _plugin._logger.debug('Ignoring %s', cmd)
+
+    if _plugin.connectionState == Events.CONNECTING and not _plugin.handshakeSent:
+        _plugin._logger.debug("sending initial handshake")
+        _plugin.handshakeSent = True
+        return "\n\n\x18"
+
+    return (None, )
+
+
+def coordinate_system(_plugin, cmd, command):
+    # forward on coordinate system change
+    _plugin.grblCoordinateSystem = normalize(command)
+    _plugin.telemetry.publish(coord=_plugin.grblCoordinateSystem)
+
+
+def coolant_on(_plugin, cmd, command):
+    # M8 (air assist on) processing - work in progress
+    _plugin.coolant = normalize(command)
+    _plugin.telemetry.publish(coolant=_plugin.coolant)
+
+    if _plugin.overrideM8 and _plugin.coolant == "M8":
+        _plugin._logger.debug('Turning ON Air Assist')
+        subprocess.call(_plugin.m8Command, shell=True)
+
+        return (None, )
+
+
+def coolant_off(_plugin, cmd, command):
+    # M9 (air assist off) processing - work in progress
+    _plugin.coolant = "M9"
+    _plugin.telemetry.publish(coolant=_plugin.coolant)
+
+    if _plugin.overrideM9:
+        _plugin._logger.debug('Turning OFF Air Assist')
+        subprocess.call(_plugin.m9Command, shell=True)
+
+        return (None, )
+
+
+def realtime_command(byte, description):
+    def handler(_plugin, cmd, command):
+        _plugin._logger.debug(description)
+
+        # straight onto the wire if we can
+        if _plugin.realtime.write(byte):
+            return (None, )
+
+        # plain ascii realtime commands are fine as a line of their own
+        if ord(byte) < 0x80:
+            return
+
+        # extended ascii needs octoprint's latin encoding to make it through the queue
+        if not _bgs.is_latin_encoding_available(_plugin):
+            return ignore(_plugin, cmd, command)
+
+        return "? {} ?".format(byte)
+
+    handler.byte = byte
+    return handler
+
+
+def hello(_plugin, cmd, command):
+    # rewrite M115 firmware as $$ (hello)
+    _plugin._logger.debug('Rewriting M115 as %s' % _plugin.helloCommand)
+
+    # let's not be in too big of a rush
+    time.sleep(.5)
+
+    if _plugin.doSmoothie:
+        _plugin.lastRequest.append("$$")
+        return ("Cat /sd/config", )
+
+    cmd = "$+" if _bgs.is_grbl_esp32(_plugin) else _plugin.helloCommand
+
+    # in the unlikely event our hello command has been remapped
+    if not cmd.upper() in _plugin.trackedCmds:
+        _plugin.trackedCmds.append(cmd.upper())
+
+    return cmd
+
+
+def dwell(_plugin, cmd, command):
+    # Wait for moves to finish before turning off the spindle
+    _plugin._logger.debug('Rewriting M400 as %s' % _plugin.dwellCommand)
+    return _plugin.dwellCommand
+
+
+def position(_plugin, cmd, command):
+    # rewrite M114 current position as ? (typically)
+    _plugin._logger.debug('Rewriting M114 as %s' % _plugin.positionCommand)
+    return _plugin.positionCommand
+
+
+def soft_reset(_plugin, cmd, command):
+    # soft reset / resume (stolen from Marlin)
+    _plugin._logger.debug('Sending Soft Reset')
+    _bgs.add_notifications(_plugin, ["Machine has been reset"])
+
+    _plugin.grblState = "Reset"
+    _plugin.telemetry.publish(state="Reset")
+    _bgs.queue_cmds_and_send(_plugin, ["$G"])
+
+    # sanity check on reset
+    _plugin.lastRequest = []
+    _plugin.lastResponse = ""
+
+    if _plugin.realtime.write("\x18"):
+        return (None, )
+
+    return "\x18"
+
+
+def babystep(_plugin, cmd, command):
+    # baby stepping (Marlin M290)
+    line = tokenizer.tokenize(cmd)
+    for axis in ("X", "Y", "Z", "A", "B"):
+        if line.has(axis):
+            _bgs.babystep_offset(_plugin, _plugin.grblCoordinateSystem, axis, line.get(axis))
+
+    return (None, )
+
+
+def version_info(_plugin, cmd, command):
+    # grbl version info
+    _plugin.grblVersion = ""
+    _plugin.fluidYaml = ""
+    _plugin._settings.set(["grblVersion"], _plugin.grblVersion)
+    _plugin._settings.set(["fluidYaml"], _plugin.fluidYaml)
+    _plugin._settings.save(trigger_event=True)
+
+    # our realtime commands depend on the firmware version
+    _plugin.commandRouter.rebuild()
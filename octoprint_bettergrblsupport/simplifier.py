@@ -0,0 +1,162 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Written by:  Shell M. Shrader (https://github.com/synman/Octoprint-Bettergrblsupport)
+# Copyright [2021] [Shell M. Shrader]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# References
+#
+# https://en.wikipedia.org/wiki/Ramer%E2%80%93Douglas%E2%80%93Peucker_algorithm
+# https://github.com/gnea/grbl/wiki/Grbl-v1.1-Configuration#11--junction-deviation-mm
+#
+# vector carving / relief jobs come out of cam as thousands of tiny G1 moves
+# -- more than grbl's planner can look ahead through at speed.  a run of them
+# (same feed, same power, same z -- see Optimizer) is replaced by the fewest
+# moves that never stray more than the tolerance from the original path.
+#
+import math
+
+from array import array
+
+from . import extents
+from .estimator import Estimator
+
+# runs are simplified (and written) at least this often -- keeps the work per
+# run bounded and the line map moving
+MAX_RUN = 4096
+
+
+def segment_distances(xs, ys, first, last):
+    # squared distance of every point between first and last to the chord joining them
+    x0 = xs[first]
+    y0 = ys[first]
+    dx = xs[last] - x0
+    dy = ys[last] - y0
+    length = dx * dx + dy * dy
+
+    points = zip(xs[first + 1:last], ys[first + 1:last])
+
+    # the run comes back to where it started
+    if length == 0:
+        return [(x - x0) ** 2 + (y - y0) ** 2 for x, y in points]
+
+    distances = []
+
+    for x, y in points:
+        px = x - x0
+        py = y - y0
+        along = px * dx + py * dy
+
+        # off either end of the chord it is the distance to that end
+        if along <= 0:
+            distances.append(px * px + py * py)
+        elif along >= length:
+            distances.append((x - xs[last]) ** 2 + (y - ys[last]) ** 2)
+        else:
+            cross = px * dy - py * dx
+            distances.append(cross * cross / length)
+
+    return distances
+
+
+def simplify(xs, ys, tolerance):
+    # ramer-douglas-peucker -- the indexes of the points worth keeping (first and last always are)
+    count = len(xs)
+    keep = bytearray(count)
+    keep[0] = keep[count - 1] = 1
+
+    tolerance = tolerance * tolerance
+    spans = [(0, count - 1)]
+
+    while len(spans) > 0:
+        first, last = spans.pop()
+
+        if last - first < 2:
+            continue
+
+        distances = segment_distances(xs, ys, first, last)
+        worst = max(range(len(distances)), key=distances.__getitem__)
+
+        if distances[worst] > tolerance:
+            worst += first + 1
+            keep[worst] = 1
+
+            spans.append((first, worst))
+            spans.append((worst, last))
+
+    return [n for n in range(count) if keep[n]]
+
+
+def polyline_time(profile, xs, ys, feed, indexes):
+    # how long grbl takes to follow the points (by index) from a standstill to a standstill
+    estimator = Estimator(profile)
+
+    for n in range(1, len(indexes)):
+        dx = xs[indexes[n]] - xs[indexes[n - 1]]
+        dy = ys[indexes[n]] - ys[indexes[n - 1]]
+        length = math.hypot(dx, dy)
+
+        if length > 0:
+            estimator.move(n, length, (dx / length, dy / length, 0.0), feed=feed)
+
+    return estimator.finish(len(indexes))
+
+
+class Simplifier:
+    # keeps count of what simplifying runs has done for a file
+
+    tolerance = 0.0
+    profile = None
+    runs = 0
+    removed = 0
+    saved = 0.0
+
+    def __init__(self, tolerance, profile):
+        self.tolerance = float(tolerance)
+        self.profile = profile
+        self.runs = 0
+        self.removed = 0
+        self.saved = 0.0
+
+
+    def simplify_run(self, anchor, points, feed, inches=False):
+        # anchor is where the run starts (x, y) -- points are (x, y, ...) in
+        # the job's units and feed its rate.  returns the points to keep
+        if len(points) < 2:
+            return points
+
+        scale = extents.MM_PER_INCH if inches else 1.0
+
+        xs = array("d", [float(anchor[0]) * scale] + [float(point[0]) * scale for point in points])
+        ys = array("d", [float(anchor[1]) * scale] + [float(point[1]) * scale for point in points])
+
+        indexes = simplify(xs, ys, self.tolerance)
+
+        if len(indexes) == len(xs):
+            return points
+
+        before = polyline_time(self.profile, xs, ys, feed * scale, range(len(xs)))
+        after = polyline_time(self.profile, xs, ys, feed * scale, indexes)
+
+        self.runs += 1
+        self.removed += len(xs) - len(indexes)
+        self.saved += max(before - after, 0.0)
+
+        # the anchor is not ours to keep (it has already been written)
+        return [points[n - 1] for n in indexes[1:]]
+
+
+    def summary(self):
+        return dict(tolerance=self.tolerance, runs=self.runs, removed=self.removed, saved=round(self.saved, 1))
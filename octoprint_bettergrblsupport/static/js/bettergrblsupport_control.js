@@ -390,7 +390,8 @@ $(function() {
 
                 if (data.power != undefined) {
                   var newPower = Number.parseFloat(data.power);
-                  if (data.state != "Run" && data.power != "N/A" && !self.is_printing()) {
+                  var state = data.state != undefined ? data.state : self.state();
+                  if (state != "Run" && data.power != "N/A" && !self.is_printing()) {
                     var btn = document.getElementById("grblLaserButton");
                     var oldPower = Number.parseFloat(self.power);
 
@@ -448,6 +449,63 @@ $(function() {
                 return
             }
 
+            if (plugin == 'bettergrblsupport' && data.type == 'interrupted_job') {
+                if (self.interruptedNotice != undefined) {
+                    self.interruptedNotice.remove();
+                }
+
+                self.interruptedNotice = new PNotify({
+                    title: "Interrupted Job",
+                    text: "[" + data.path + "] was interrupted at line " + data.line + ".  Select <B>RESUME</B> to continue from there once the machine is homed and ready.",
+                    type: "notice",
+                    hide: false,
+                    animation: "fade",
+                    animateSpeed: "slow",
+                    sticker: false,
+                    closer: true,
+                    confirm: {
+                        confirm: true,
+                        buttons: [{
+                                text: "RESUME",
+                                click: function(notice) {
+                                    OctoPrint.simpleApiCommand("bettergrblsupport", "resumeInterruptedJob")
+                                        .fail(
+                                            function(data, status) {
+                                                new PNotify({
+                                                    title: "Unable to resume job",
+                                                    text: data.responseText,
+                                                    hide: true,
+                                                    buttons: {
+                                                        sticker: false,
+                                                        closer: true
+                                                    },
+                                                    type: "error"
+                                                })
+                                            }
+                                        );
+                                    notice.remove();
+                                }
+                            },
+                            {
+                                text: "DISCARD",
+                                click: function(notice) {
+                                    OctoPrint.simpleApiCommand("bettergrblsupport", "discardInterruptedJob");
+                                    notice.remove();
+                                }
+                            }
+                        ]
+                    },
+                    buttons: {
+                        closer: false,
+                        sticker: false
+                    },
+                    history: {
+                        history: false
+                    }
+                });
+                return
+            }
+
             if (plugin == 'bettergrblsupport' && data.type == 'restart_required') {
                 new PNotify({
                     title: "Restart Required",
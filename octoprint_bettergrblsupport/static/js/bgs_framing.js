@@ -14,6 +14,9 @@ $(function () {
 
         self.state = ko.observable("unknown");
 
+        self.resumeBy = ko.observable("line");
+        self.resumeAt = ko.observable("");
+
         self.handleFocus = function (event, type, item) {
           window.setTimeout(function () {
               event.target.select();
@@ -107,6 +110,72 @@ $(function () {
           });
         };
 
+        self.doVerify = function() {
+          $.ajax({
+            url: API_BASEURL + "plugin/bettergrblsupport",
+            type: "POST",
+            dataType: "json",
+            data: JSON.stringify({
+              command: "verifyOnController"
+            }),
+            contentType: "application/json; charset=UTF-8",
+            error: function (data, status) {
+              var error = JSON.parse(data.responseText).error;
+              if (error == undefined) error = data.responseText;
+              new PNotify({
+                title: "Verification failed!",
+                text: error,
+                hide: true,
+                buttons: {
+                  sticker: false,
+                  closer: true
+                },
+                type: "error"
+              });
+            }
+          });
+        };
+
+        self.doResume = function() {
+          var request = { command: "resumeJob" };
+          request[self.resumeBy()] = Number.parseInt(self.resumeAt());
+
+          $.ajax({
+            url: API_BASEURL + "plugin/bettergrblsupport",
+            type: "POST",
+            dataType: "json",
+            data: JSON.stringify(request),
+            contentType: "application/json; charset=UTF-8",
+            success: function (data) {
+              new PNotify({
+                title: "Resuming " + data.path,
+                text: "Starting at line " + data.line,
+                hide: true,
+                delay: 10000,
+                buttons: {
+                  sticker: false,
+                  closer: true
+                },
+                type: "info"
+              });
+            },
+            error: function (data, status) {
+              var error = JSON.parse(data.responseText).error;
+              if (error == undefined) error = data.responseText;
+              new PNotify({
+                title: "Resume failed!",
+                text: error,
+                hide: true,
+                buttons: {
+                  sticker: false,
+                  closer: true
+                },
+                type: "error"
+              });
+            }
+          });
+        };
+
         self.onDataUpdaterPluginMessage = function(plugin, data) {
           if (plugin == 'bettergrblsupport' && data.type == 'grbl_state') {
             if (data.state != undefined) self.state(data.state);
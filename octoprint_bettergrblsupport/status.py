@@ -0,0 +1,176 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Written by:  Shell M. Shrader (https://github.com/synman/Octoprint-Bettergrblsupport)
+# Copyright [2021] [Shell M. Shrader]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# References
+#
+# https://github.com/gnea/grbl/wiki/Grbl-v1.1-Interface#real-time-status-reports
+# https://github.com/gnea/grbl/blob/edge/doc/markdown/interface.md#real-time-status-reports
+# http://wiki.fluidnc.com/en/features/grbl_compatibility
+#
+# split based status report parser -- one pass over the report, no regexes
+#
+# benchmarks/bench_status.py for a reports/sec comparison against the legacy regexes
+#
+
+
+class StatusReport:
+    __slots__ = ("raw", "state", "mode", "mpos", "wpos", "wco", "blocks", "rx", "line",
+                 "feed", "speed", "overrides", "overridesReported", "accessories", "pins")
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.state = None
+        # MPos or WPos (whichever grbl reported)
+        self.mode = None
+        self.mpos = None
+        self.wpos = None
+        # last known work coordinate offset (grbl only reports it every so often)
+        self.wco = None
+        # Bf: planner blocks / rx bytes available
+        self.blocks = None
+        self.rx = None
+        # Ln: line number being executed
+        self.line = None
+        # F: / FS:
+        self.feed = None
+        self.speed = None
+        # Ov: feed, rapids, spindle (%) -- the last ones grbl reported, which
+        # is not necessarily in this report (see overridesReported)
+        self.overrides = None
+        self.overridesReported = False
+        # A: spindle / coolant accessory flags
+        self.accessories = ""
+        # Pn: input pins
+        self.pins = ""
+
+
+    def position(self):
+        # the position grbl reported (mpos or wpos)
+        return self.mpos if self.mode == "MPos" else self.wpos
+
+
+    def key(self):
+        # everything we publish -- Bf / Ln tick constantly and are not included
+        return (self.state, self.mpos, self.wpos, self.feed, self.speed, self.overrides, self.accessories, self.pins)
+
+
+def vector(value):
+    return tuple([float(axis) for axis in value.split(",")])
+
+
+class StatusParser:
+    _wco = None
+    _overrides = None
+    _last = None
+
+    def __init__(self):
+        self._wco = None
+        self._overrides = None
+        self._last = None
+
+
+    def reset(self):
+        self._wco = None
+        self._overrides = None
+        self._last = None
+
+
+    def parse(self, msg):
+        body = msg.strip()
+        if not body.startswith("<"):
+            return None
+
+        body = body[1:body.find(">")] if ">" in body else body[1:]
+
+        if "|" in body:
+            fields = body.split("|")
+        else:
+            fields = grbl_zero_dot_nine_fields(body)
+
+        report = StatusReport(msg)
+        report.state = fields[0]
+
+        for field in fields[1:]:
+            name, _, value = field.partition(":")
+
+            if name == "MPos" or name == "WPos":
+                if report.mode is None:
+                    report.mode = name
+                if name == "MPos":
+                    report.mpos = vector(value)
+                else:
+                    report.wpos = vector(value)
+            elif name == "WCO":
+                self._wco = vector(value)
+            elif name == "Bf" or name == "Buf":
+                blocks, _, rx = value.partition(",")
+                report.blocks = int(blocks)
+                report.rx = int(rx) if rx else None
+            elif name == "RX":
+                report.rx = int(value)
+            elif name == "Ln":
+                report.line = int(value)
+            elif name == "FS":
+                feed, _, speed = value.partition(",")
+                report.feed = float(feed)
+                report.speed = float(speed)
+            elif name == "F":
+                report.feed = float(value)
+            elif name == "Ov":
+                self._overrides = tuple([int(override) for override in value.split(",")])
+                report.overridesReported = True
+            elif name == "A":
+                report.accessories = value
+            elif name == "Pn":
+                report.pins = value
+
+        if report.mode is None:
+            return None
+
+        # derive whichever position grbl didn't send us
+        report.wco = self._wco
+        if not report.wco is None:
+            if report.mpos is None:
+                report.mpos = tuple([w + o for w, o in zip(report.wpos, report.wco)])
+            elif report.wpos is None:
+                report.wpos = tuple([m - o for m, o in zip(report.mpos, report.wco)])
+
+        report.overrides = self._overrides
+        return report
+
+
+    def changed(self, report):
+        # true if report differs from the last one we saw (and remembers it)
+        key = report.key()
+        changed = key != self._last
+        self._last = key
+        return changed
+
+
+def grbl_zero_dot_nine_fields(body):
+    # <Idle,MPos:0.000,0.000,0.000,WPos:0.000,0.000,0.000,Buf:0,RX:0>
+    fields = []
+
+    for token in body.split(","):
+        if ":" in token or len(fields) == 0:
+            fields.append(token)
+        else:
+            fields[-1] = fields[-1] + "," + token
+
+    return fields
+
@@ -0,0 +1,149 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Written by:  Shell M. Shrader (https://github.com/synman/Octoprint-Bettergrblsupport)
+# Copyright [2021] [Shell M. Shrader]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# References
+#
+# https://github.com/gnea/grbl/wiki/Grbl-v1.1-Interface#streaming-protocol-character-counting-recommended-with-reservation
+# https://github.com/gnea/grbl/blob/master/doc/script/stream.py
+#
+import re
+import threading
+
+from collections import deque
+
+# Grbl's serial rx buffer is 128 bytes -- leave one for good measure
+DEFAULT_RX_BUFFER_SIZE = 127
+
+# [OPT:V,15,128] -> planner blocks, rx buffer bytes
+OPTIONS = re.compile(r"\[OPT:[^,\]]*,(\d+),(\d+)")
+
+# realtime commands are picked off before they reach the rx buffer
+REALTIME = dict.fromkeys([ord(c) for c in "?!~\x18"] + list(range(0x80, 0x100)))
+
+
+def rx_buffer_size(version):
+    # $I reports the rx buffer size on Grbl 1.1 / grblHAL
+    match = OPTIONS.search(version if not version is None else "")
+    if match is None:
+        return DEFAULT_RX_BUFFER_SIZE
+
+    return max(int(match.groups(1)[1]) - 1, 1)
+
+
+class CharacterCountingStreamer:
+    # keeps as many lines in flight as grbl's rx buffer can hold.  octoprint
+    # is handed an "ok" for a line the moment it has been written (as long as
+    # it fit) and the real acknowledgements are matched up with the oldest
+    # line still in flight as they arrive.  lines that were sent while we were
+    # not streaming keep their real acknowledgements.
+
+    _plugin = None
+    _condition = None
+    _inflight = None
+    _faked = False
+
+    bufferSize = DEFAULT_RX_BUFFER_SIZE
+    buffered = 0
+    active = False
+
+    def __init__(self, _plugin):
+        self._plugin = _plugin
+        self._condition = threading.Condition()
+        self._inflight = deque()
+        self._faked = False
+
+        self.bufferSize = DEFAULT_RX_BUFFER_SIZE
+        self.buffered = 0
+        self.active = False
+
+
+    def start(self):
+        bufferSize = rx_buffer_size(self._plugin.grblVersion)
+        self._plugin._logger.debug("CharacterCountingStreamer: start bufferSize=[{}]".format(bufferSize))
+
+        with self._condition:
+            self.bufferSize = bufferSize
+            self.active = True
+
+
+    def stop(self):
+        # lines already in flight keep draining normally
+        self._plugin._logger.debug("CharacterCountingStreamer: stop inflight=[{}] buffered=[{}]".format(len(self._inflight), self.buffered))
+
+        with self._condition:
+            self.active = False
+            self._condition.notify_all()
+
+
+    def reset(self):
+        # grbl flushed its rx buffer (soft reset / alarm / disconnect)
+        self._plugin._logger.debug("CharacterCountingStreamer: reset inflight=[{}] buffered=[{}]".format(len(self._inflight), self.buffered))
+
+        with self._condition:
+            self._inflight.clear()
+            self.buffered = 0
+            self._faked = False
+            self._condition.notify_all()
+
+
+    def reserve(self, cmd):
+        # called from octoprint's send loop right before cmd is written
+        if not self.active and len(self._inflight) == 0:
+            return False
+
+        length = len(cmd.translate(REALTIME)) + 1
+
+        with self._condition:
+            if self.active:
+                # an oversized line can only go out on its own
+                while self.active and len(self._inflight) > 0 and self.buffered + length > self.bufferSize:
+                    self._condition.wait(1)
+
+            faked = self.active
+            self._inflight.append((length, cmd, faked))
+            self.buffered += length
+            self._faked = faked
+
+        return faked
+
+
+    def sent(self):
+        # true if octoprint should get its acknowledgement right now
+        faked = self._faked
+        self._faked = False
+        return faked
+
+
+    def acknowledge(self):
+        # called for every "ok" / "error:" -- returns the line it belongs to
+        if len(self._inflight) == 0:
+            return None
+
+        with self._condition:
+            if len(self._inflight) == 0:
+                return None
+
+            entry = self._inflight.popleft()
+            self.buffered -= entry[0]
+            self._condition.notify_all()
+
+        return entry
+
+
+    def depth(self):
+        return len(self._inflight)
@@ -0,0 +1,122 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Written by:  Shell M. Shrader (https://github.com/synman/Octoprint-Bettergrblsupport)
+# Copyright [2021] [Shell M. Shrader]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# References
+#
+# https://docs.octoprint.org/en/master/modules/plugin.html#octoprint.plugin.PluginManager.send_plugin_message
+#
+import threading
+import time
+
+
+class TelemetryPublisher:
+    # grbl_state updates are merged into a single pending dict (one value per
+    # field -- so it can never grow past the number of fields we publish) and
+    # handed to the websocket fan-out from our own thread.  only fields whose
+    # value differs from what the ui was last sent go out.
+
+    _plugin = None
+    _lock = None
+    _wake = None
+    _thread = None
+
+    _pending = None
+    _published = None
+    _resync = False
+
+    window = .1
+    running = False
+
+    def __init__(self, _plugin, window=.1):
+        self._plugin = _plugin
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+        self._pending = {}
+        self._published = {}
+        self._resync = False
+
+        self.window = window
+        self.running = False
+
+
+    def start(self):
+        if self.running:
+            return
+
+        self._plugin._logger.debug("TelemetryPublisher: start window=[{}]".format(self.window))
+
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name="bgs.telemetry")
+        self._thread.daemon = True
+        self._thread.start()
+
+
+    def stop(self):
+        self._plugin._logger.debug("TelemetryPublisher: stop")
+
+        self.running = False
+        self._wake.set()
+
+
+    def publish(self, **fields):
+        # never blocks (beyond a dict update) -- safe to call from the comm thread
+        with self._lock:
+            self._pending.update(fields)
+
+        self._wake.set()
+
+
+    def resync(self):
+        # next publish carries every field (a new browser just connected)
+        with self._lock:
+            self._resync = True
+            self._pending.update(self._published)
+
+        self._wake.set()
+
+
+    def _run(self):
+        while self.running:
+            self._wake.wait()
+
+            # give the rest of this burst a chance to land
+            time.sleep(self.window)
+            self._wake.clear()
+
+            with self._lock:
+                pending = self._pending
+                resync = self._resync
+                self._pending = {}
+                self._resync = False
+
+            message = {}
+            for field, value in pending.items():
+                if resync or self._published.get(field, message) != value:
+                    message[field] = value
+
+            if len(message) == 0:
+                continue
+
+            self._published.update(message)
+
+            try:
+                self._plugin._plugin_manager.send_plugin_message(self._plugin._identifier, dict(type="grbl_state", **message))
+            except Exception as e:
+                self._plugin._logger.warning("TelemetryPublisher: unable to publish: {}".format(e))
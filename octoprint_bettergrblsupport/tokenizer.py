@@ -0,0 +1,145 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Written by:  Shell M. Shrader (https://github.com/synman/Octoprint-Bettergrblsupport)
+# Copyright [2021] [Shell M. Shrader]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# References
+#
+# https://github.com/gnea/grbl/blob/master/doc/markdown/commands.md
+# https://github.com/gnea/grbl/wiki/Grbl-v1.1-Interface
+# https://reprap.org/wiki/G-code
+#
+# single pass g-code tokenizer used by the sending hook (and anything else that
+# needs to look at the words of a line without running a regex per letter)
+#
+# benchmarks/bench_tokenizer.py for a lines/sec comparison against the legacy regexes
+#
+import re
+
+# a word is a letter followed by a number (whitespace between the two is tolerated)
+WORD = re.compile(r"([A-Za-z])[ \t]*([-+]?(?:\d+\.?\d*|\.\d+))")
+
+# parenthesized and semicolon comments
+COMMENT = re.compile(r"\([^)]*\)?|;.*")
+
+
+class GCodeLine:
+    __slots__ = ("line", "words", "_last", "_changes", "_prefix")
+
+    def __init__(self, line):
+        self.line = line
+        # (letter, value, text, start, end) for every word in the line
+        self.words = []
+        # letter -> index of its last occurrence in words
+        self._last = {}
+        self._changes = None
+        self._prefix = None
+
+        comments = None
+        if "(" in line or ";" in line:
+            comments = [m.span() for m in COMMENT.finditer(line)]
+
+        for match in WORD.finditer(line):
+            start = match.start()
+
+            if comments and any(s <= start < e for s, e in comments):
+                continue
+
+            letter = match.group(1).upper()
+            text = match.group(2)
+
+            self._last[letter] = len(self.words)
+            self.words.append((letter, float(text), text, start, match.end()))
+
+
+    def has(self, letter):
+        return letter in self._last
+
+
+    def get(self, letter, default=None):
+        # the last occurrence wins (this mirrors the greedy regexes we replaced)
+        index = self._last.get(letter)
+        return default if index is None else self.words[index][1]
+
+
+    def text(self, letter, default=None):
+        index = self._last.get(letter)
+        return default if index is None else self.words[index][2]
+
+
+    def codes(self, letter):
+        return [word[1] for word in self.words if word[0] == letter]
+
+
+    def first(self):
+        # first word of the line if (and only if) the line starts with it
+        if len(self.words) > 0 and self.words[0][3] == len(self.line) - len(self.line.lstrip()):
+            return self.words[0]
+        return None
+
+
+    def set(self, letter, value, format="{:.3f}"):
+        index = self._last.get(letter)
+        if index is None:
+            return
+
+        if self._changes is None:
+            self._changes = {}
+
+        self._changes[index] = format.format(value)
+
+
+    def prepend(self, text):
+        self._prefix = text
+
+
+    def is_changed(self):
+        return self._changes is not None or self._prefix is not None
+
+
+    def reassemble(self):
+        # only words that were changed are re-emitted -- everything else
+        # (spacing, case, comments) is passed through untouched
+        if not self.is_changed():
+            return self.line
+
+        pieces = []
+        position = 0
+
+        if self._changes:
+            for index in sorted(self._changes):
+                letter, value, text, start, end = self.words[index]
+                valueStart = end - len(text)
+
+                pieces.append(self.line[position:valueStart])
+                pieces.append(self._changes[index])
+                position = end
+
+        pieces.append(self.line[position:])
+
+        if self._prefix:
+            pieces.insert(0, self._prefix)
+
+        return "".join(pieces)
+
+
+    def __str__(self):
+        return self.reassemble()
+
+
+def tokenize(line):
+    return GCodeLine(line)
+
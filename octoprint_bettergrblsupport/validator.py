@@ -0,0 +1,612 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Written by:  Shell M. Shrader (https://github.com/synman/Octoprint-Bettergrblsupport)
+# Copyright [2021] [Shell M. Shrader]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# References
+#
+# https://github.com/gnea/grbl/blob/master/grbl/gcode.c (gc_execute_line)
+# https://github.com/gnea/grbl/blob/master/grbl/protocol.c
+# https://github.com/gnea/grbl/blob/master/doc/csv/error_codes_en_US.csv
+#
+# grbl's g-code parser without the motion -- the same error:N grbl would
+# answer a line with (see static/txt/grbl_errors.txt), found before the job
+# ever starts.  a line is checked once per shape (its words and their g/m
+# numbers) and modal state; only the numbers that matter (arcs, probes) are
+# looked at line by line.
+#
+# benchmarks/bench_validator.py [file.gcode] for a lines/sec benchmark
+#
+import math
+import mmap
+import os
+import re
+
+from . import extents
+
+# what grbl is sent of a line (protocol.c strips these before the parser sees it)
+COMMENT = re.compile(rb"\([^)\n]*\)?|;[^\n]*")
+WHITESPACE = b" \t\r"
+
+# a line's shape is the line less its numbers, plus the numbers of its G M
+# L N P and T words -- the rest only matter for their sign, which stays
+NUMBER = rb"(?:\d+\.?\d*|\.\d+)"
+DIGITS = b"0123456789."
+CODES = re.compile(rb"[GMLNPT][-+]?[\d.]*|\n")
+
+# words with no number (or one grbl can not read) would share a good line's
+# shape -- a cheap look at the chunk as letters and zeros says whether
+# there are any, MALFORMED finds them
+LETTERS_AND_ZEROS = bytes.maketrans(b"ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789+", b"A" * 26 + b"0" * 10 + b"-")
+SUSPECT = (b"AA", b"A\n", b"A-A", b"A-\n", b"A--", b"A.A", b"A.\n", b"A-.A", b"A-.\n")
+DOUBLE_POINT = re.compile(rb"\.0*\.")
+MALFORMED = re.compile(rb"[A-Z](?![-+]?(?:\d|\.\d))|\d*\.\d*\.")
+
+# F0 leaves the feed rate undefined -- a line with one can not go by its shape either
+ZERO_FEED = re.compile(rb"F[-+]?(?:0+\.?0*|\.0+)(?![\d.])")
+ZERO_FEEDS = (b"F0", b"F.0", b"F-0", b"F+0", b"F-.", b"F+.")
+
+# words of a compact line (slow path only) -- anything else is not g-code
+WORD = re.compile(rb"([A-Z])([-+]?" + NUMBER + rb"|[-+.]*)|(.)")
+AXIS_WORDS = dict((bytes([letter]), re.compile(bytes([letter]) + rb"([-+]?" + NUMBER + rb")")) for letter in b"XYZABC")
+ARC_WORDS = re.compile(rb"([IJKR])([-+]?" + NUMBER + rb")")
+
+# grbl's line buffer (less the terminator) -- see protocol.c
+LINE_BUFFER_SIZE = 80
+LONG_LINE = re.compile(rb"[^\n]{%d,}" % LINE_BUFFER_SIZE)
+
+# shapes we remember before starting over (a file of unique N words should not eat the host)
+MAX_SHAPES = 4096
+
+MAX_LINE_NUMBER = 10000000
+MAX_TOOL_NUMBER = 255
+N_COORDINATE_SYSTEM = 6
+
+# arc radius tolerances (mm) -- see gc_execute_line
+ARC_TOLERANCE = .005
+ARC_ERROR = .5
+ARC_RELATIVE_ERROR = .001
+
+# bump when a file checked before would check differently now (analysis cache)
+VERSION = 2
+
+# errors are reported up to this many (a file that is wrong is usually wrong everywhere)
+MAX_ERRORS = 100
+
+# status codes (grbl_errors.txt)
+EXPECTED_COMMAND_LETTER = 1
+BAD_NUMBER_FORMAT = 2
+NEGATIVE_VALUE = 4
+OVERFLOW = 11
+UNSUPPORTED_COMMAND = 20
+MODAL_GROUP_VIOLATION = 21
+UNDEFINED_FEED_RATE = 22
+COMMAND_VALUE_NOT_INTEGER = 23
+AXIS_COMMAND_CONFLICT = 24
+WORD_REPEATED = 25
+NO_AXIS_WORDS = 26
+INVALID_LINE_NUMBER = 27
+VALUE_WORD_MISSING = 28
+UNSUPPORTED_COORD_SYS = 29
+G53_INVALID_MOTION_MODE = 30
+AXIS_WORDS_EXIST = 31
+NO_AXIS_WORDS_IN_PLANE = 32
+INVALID_TARGET = 33
+ARC_RADIUS_ERROR = 34
+NO_OFFSETS_IN_PLANE = 35
+UNUSED_WORDS = 36
+G43_DYNAMIC_AXIS_ERROR = 37
+MAX_VALUE_EXCEEDED = 38
+
+# what a line leaves us to do once its shape checks out
+MOVE = 1
+ARC = 2
+PROBE = 4
+LOST = 8
+SET = 16
+
+PLANES = {17: (0, 1, 2), 18: (2, 0, 1), 19: (1, 2, 0)}
+
+# the modal state a line's outcome depends on
+# (motion, plane, relative, inverse time, feed set, inches)
+DEFAULT_STATE = (0, 17, False, False, False, False)
+
+
+def number(value):
+    # G01 / G1.0 and friends -- grbl reads a float and splits it
+    value = float(value)
+    integer = int(value)
+    return integer, int(round(100 * (value - integer)))
+
+
+def check_block(words, state, axes):
+    # words are (letter, value) pairs -- returns (error, state, actions)
+    motion, plane, relative, inverse, feedSet, inches = state
+
+    commands = set()
+    values = {}
+    axisCommand = None
+    nonModal = None
+    coordinate = None
+    newMotion = None
+
+    for letter, value in words:
+        if letter == b"G":
+            code, mantissa = number(value)
+
+            if code in (10, 28, 30, 92) or code in (4, 53):
+                if code in (10, 28, 30, 92) and mantissa == 0:
+                    if not axisCommand is None:
+                        return AXIS_COMMAND_CONFLICT, state, 0
+                    axisCommand = "nonModal"
+
+                if code in (28, 30, 92):
+                    if not mantissa in (0, 10):
+                        return UNSUPPORTED_COMMAND, state, 0
+                    code = code + mantissa / 100.0
+                    mantissa = 0
+
+                group = "g0"
+                nonModal = code
+            elif code in (0, 1, 2, 3, 38, 80):
+                if code != 80:
+                    if not axisCommand is None:
+                        return AXIS_COMMAND_CONFLICT, state, 0
+                    axisCommand = "motion"
+
+                if code == 38:
+                    if not mantissa in (20, 30, 40, 50):
+                        return UNSUPPORTED_COMMAND, state, 0
+                    code = 38 + mantissa / 100.0
+                    mantissa = 0
+
+                group = "g1"
+                newMotion = code
+            elif code in (17, 18, 19):
+                group = "g2"
+                plane = code
+            elif code in (90, 91):
+                if mantissa == 0:
+                    group = "g3"
+                    relative = code == 91
+                else:
+                    # G91.1 is all there is (and it is the default)
+                    if mantissa != 10 or code == 90:
+                        return UNSUPPORTED_COMMAND, state, 0
+                    group = "g4"
+                    mantissa = 0
+            elif code in (93, 94):
+                group = "g5"
+                inverse = code == 93
+            elif code in (20, 21):
+                group = "g6"
+                inches = code == 20
+            elif code == 40:
+                group = "g7"
+            elif code in (43, 49):
+                if code == 43:
+                    if mantissa != 10:
+                        return UNSUPPORTED_COMMAND, state, 0
+                    if not axisCommand is None:
+                        return AXIS_COMMAND_CONFLICT, state, 0
+                    axisCommand = "toolLength"
+                    mantissa = 0
+                group = "g8"
+            elif 54 <= code <= 59:
+                group = "g12"
+                coordinate = code
+            elif code == 61:
+                if mantissa != 0:
+                    return UNSUPPORTED_COMMAND, state, 0
+                group = "g13"
+            else:
+                return UNSUPPORTED_COMMAND, state, 0
+
+            if mantissa > 0:
+                return COMMAND_VALUE_NOT_INTEGER, state, 0
+            if group in commands:
+                return MODAL_GROUP_VIOLATION, state, 0
+            commands.add(group)
+        elif letter == b"M":
+            code, mantissa = number(value)
+
+            if mantissa > 0:
+                return COMMAND_VALUE_NOT_INTEGER, state, 0
+
+            if code in (0, 1, 2, 30):
+                group = "m4"
+            elif code in (3, 4, 5):
+                group = "m7"
+            elif code in (7, 8, 9):
+                group = "m8"
+            else:
+                return UNSUPPORTED_COMMAND, state, 0
+
+            if group in commands:
+                return MODAL_GROUP_VIOLATION, state, 0
+            commands.add(group)
+        else:
+            if not letter in b"FIJKLNPRST" and not letter in axes:
+                return UNSUPPORTED_COMMAND, state, 0
+            if letter in values:
+                return WORD_REPEATED, state, 0
+
+            if letter in b"FNPST" and float(value) < 0:
+                return NEGATIVE_VALUE, state, 0
+
+            values[letter] = value
+
+    axisWords = [letter for letter in values if letter in axes]
+    actions = 0
+
+    # axis words on their own use the modal motion
+    if len(axisWords) > 0 and axisCommand is None:
+        axisCommand = "motion"
+
+    if b"N" in values:
+        if float(values.pop(b"N")) > MAX_LINE_NUMBER:
+            return INVALID_LINE_NUMBER, state, 0
+
+    motion = motion if newMotion is None else newMotion
+
+    # F0 is as good as no feed at all
+    feed = values.pop(b"F", None)
+
+    # inverse time needs a feed on every feed move -- units per minute carries it over
+    if inverse:
+        if axisCommand == "motion" and not motion in (0, 80) and feed is None:
+            return UNDEFINED_FEED_RATE, state, 0
+        feedSet = not feed is None and float(feed) > 0
+    elif not feed is None:
+        feedSet = float(feed) > 0
+    elif state[3]:
+        # leaving inverse time mode -- the old feed no longer applies
+        feedSet = False
+
+    values.pop(b"S", None)
+
+    if b"T" in values:
+        if float(values.pop(b"T")) > MAX_TOOL_NUMBER:
+            return MAX_VALUE_EXCEEDED, state, 0
+
+    if nonModal == 4:
+        if not b"P" in values:
+            return VALUE_WORD_MISSING, state, 0
+        values.pop(b"P")
+
+    if axisCommand == "toolLength":
+        if axisWords != [b"Z"]:
+            return G43_DYNAMIC_AXIS_ERROR, state, 0
+
+    if not coordinate is None:
+        actions |= LOST
+
+    if nonModal == 10:
+        if len(axisWords) == 0:
+            return NO_AXIS_WORDS, state, 0
+        if not b"P" in values or not b"L" in values:
+            return VALUE_WORD_MISSING, state, 0
+        if int(float(values[b"P"])) > N_COORDINATE_SYSTEM:
+            return UNSUPPORTED_COORD_SYS, state, 0
+        if not float(values[b"L"]) in (2, 20):
+            return UNSUPPORTED_COMMAND, state, 0
+        values.pop(b"P")
+        values.pop(b"L")
+        actions |= LOST
+    elif nonModal in (28, 30, 28.1, 30.1, 92.1):
+        actions |= LOST
+    elif nonModal == 92:
+        if len(axisWords) == 0:
+            return NO_AXIS_WORDS, state, 0
+        actions |= SET
+    elif nonModal == 53:
+        if not motion in (0, 1):
+            return G53_INVALID_MOTION_MODE, state, 0
+        actions |= LOST
+
+    if motion == 80:
+        if len(axisWords) > 0 and axisCommand != "nonModal":
+            return AXIS_WORDS_EXIST, state, 0
+    elif axisCommand == "motion":
+        # everything but a rapid needs a feed -- even a G1 that goes nowhere
+        if motion != 0 and not feedSet:
+            return UNDEFINED_FEED_RATE, state, 0
+
+        if motion in (0, 1):
+            if len(axisWords) == 0:
+                axisCommand = None
+            else:
+                actions |= MOVE
+        elif len(axisWords) == 0:
+            # arcs and probes have to be going somewhere
+            return NO_AXIS_WORDS, state, 0
+        elif motion in (2, 3):
+            first, second, linear = PLANES[plane]
+            inPlane = (axes[first:first + 1], axes[second:second + 1])
+
+            if not inPlane[0] in axisWords and not inPlane[1] in axisWords:
+                return NO_AXIS_WORDS_IN_PLANE, state, 0
+
+            if b"R" in values:
+                values.pop(b"R")
+            else:
+                offsets = (b"IJK"[first:first + 1], b"IJK"[second:second + 1])
+                if not offsets[0] in values and not offsets[1] in values:
+                    return NO_OFFSETS_IN_PLANE, state, 0
+
+                for letter in b"IJK":
+                    values.pop(bytes([letter]), None)
+
+            actions |= MOVE | ARC
+        else:
+            actions |= MOVE | PROBE
+
+    if axisCommand in ("motion", "nonModal", "toolLength"):
+        for letter in axisWords:
+            values.pop(letter, None)
+
+    if len(values) > 0:
+        return UNUSED_WORDS, state, 0
+
+    return None, (motion, plane, relative, inverse, feedSet, inches), actions
+
+
+class Validator:
+    # fed the file a chunk of whole lines at a time.  errors is a list of
+    # (line, error) -- line is 1 based, error is grbl's status code.
+    #
+    # skip is handed a line (upper cased, comments and spaces gone) and
+    # says whether it will be kept from grbl -- see CommandRouter.sends
+
+    _cache = None
+    _position = None
+    _skip = None
+
+    axes = b"XYZ"
+    state = DEFAULT_STATE
+    lines = 0
+    errors = None
+    limit = MAX_ERRORS
+
+    def __init__(self, positioning=0, axes="XYZ", skip=None, limit=MAX_ERRORS):
+        self._cache = {}
+        self._position = [None] * len(axes)
+        self._skip = skip
+
+        self.axes = axes.upper().encode()
+        self.state = (0, 17, positioning == 1, False, False, False)
+        self.lines = 0
+        self.errors = []
+        self.limit = limit
+
+
+    def feed_chunk(self, chunk):
+        # what grbl would actually be sent -- one line each
+        compact = chunk.upper()
+        if b"(" in compact or b";" in compact:
+            compact = COMMENT.sub(b"", compact)
+        compact = compact.translate(None, WHITESPACE)
+
+        lines = compact.split(b"\n")
+        shapes = compact.translate(None, DIGITS).split(b"\n")
+        codes = b"".join(CODES.findall(compact)).split(b"\n")
+        lines.pop()
+
+        # grbl drops lines that do not fit its buffer
+        overflow = set()
+        for match in LONG_LINE.finditer(compact):
+            overflow.add(compact.count(b"\n", 0, match.start()))
+
+        # lines that can not go by their shape
+        malformed = set()
+        outline = compact.translate(LETTERS_AND_ZEROS)
+        if any(suspect in outline for suspect in SUSPECT) or not DOUBLE_POINT.search(outline) is None:
+            for match in MALFORMED.finditer(compact):
+                malformed.add(compact.count(b"\n", 0, match.start()))
+
+        if any(zero in compact for zero in ZERO_FEEDS):
+            for match in ZERO_FEED.finditer(compact):
+                malformed.add(compact.count(b"\n", 0, match.start()))
+
+        cache = self._cache
+        state = self.state
+        base = self.lines + 1
+
+        for n, line in enumerate(lines):
+            if not line:
+                continue
+
+            key = (shapes[n], codes[n], state)
+            result = cache.get(key)
+            if malformed and n in malformed:
+                result = self._check(line, state)
+            elif result is None:
+                if len(cache) >= MAX_SHAPES:
+                    cache.clear()
+                result = cache[key] = self._check(line, state)
+
+            error, newState, actions, moved = result
+
+            if n in overflow and not self._skipped(line):
+                error = OVERFLOW
+
+            if not error is None:
+                self._error(base + n, error)
+                continue
+
+            if newState[5] != state[5]:
+                # units change -- pin down what we know while we still can
+                self._resolve(state)
+
+            if actions:
+                if actions == MOVE and not newState[2]:
+                    # the common case -- remember where each axis was last set
+                    for axis in moved:
+                        self._position[axis] = line
+                else:
+                    error = self._act(line, actions, moved, newState)
+
+                    if not error is None:
+                        self._error(base + n, error)
+                        continue
+
+            state = newState
+
+        self.state = state
+        self.lines += len(lines)
+
+
+    def _skipped(self, line):
+        # lines bgs never hands to grbl as they are (see router.build_routes)
+        if line[:1] in (b"$", b"%"):
+            return True
+
+        return not self._skip is None and self._skip(line.decode("latin-1"))
+
+
+    def _check(self, line, state):
+        # the slow path -- once per shape and modal state
+        if self._skipped(line):
+            return None, state, 0, ()
+
+        words = []
+        for letter, value, other in WORD.findall(line):
+            if other:
+                return EXPECTED_COMMAND_LETTER, state, 0, ()
+            if len(value.strip(b"-+.")) == 0:
+                return BAD_NUMBER_FORMAT, state, 0, ()
+            words.append((letter, value))
+
+        error, newState, actions = check_block(words, state, self.axes)
+        moved = tuple(sorted(set(self.axes.find(letter) for letter, value in words if letter in self.axes)))
+
+        return error, newState, actions, moved
+
+
+    def _value(self, line, axis, state):
+        # an axis word from a line -- in mm
+        match = AXIS_WORDS[self.axes[axis:axis + 1]].search(line)
+        return float(match.group(1)) * (extents.MM_PER_INCH if state[5] else 1.0)
+
+
+    def _current(self, axis, state):
+        # where an axis is -- None when we can not know
+        position = self._position[axis]
+
+        if isinstance(position, bytes):
+            position = self._position[axis] = self._value(position, axis, state)
+
+        return position
+
+
+    def _resolve(self, state):
+        for axis in range(len(self._position)):
+            self._current(axis, state)
+
+
+    def _act(self, line, actions, moved, state):
+        # the part of checking a line that depends on where we are
+        position = self._position
+
+        if actions & LOST:
+            # somewhere we can not follow (G28, G53, a new work offset, ...)
+            for axis in range(len(position)):
+                position[axis] = None
+            return None
+
+        start = [self._current(axis, state) for axis in range(len(position))]
+        target = list(start)
+
+        for axis in moved:
+            value = self._value(line, axis, state)
+
+            if actions & SET or not state[2]:
+                target[axis] = value
+            elif not target[axis] is None:
+                target[axis] = target[axis] + value
+
+        error = None
+
+        if actions & PROBE:
+            if target == start and not None in target:
+                error = INVALID_TARGET
+        elif actions & ARC:
+            values = {}
+            for letter, value in ARC_WORDS.findall(line):
+                values[letter] = float(value) * (extents.MM_PER_INCH if state[5] else 1.0)
+
+            error = check_arc(start, target, values, state[1])
+
+        if error is None:
+            self._position = target
+
+        return error
+
+
+    def _error(self, line, error):
+        if len(self.errors) < self.limit:
+            self.errors.append((line, error))
+
+
+def check_arc(position, target, values, plane):
+    # grbl's radius / offset consistency checks -- skipped until we know
+    # where the arc starts
+    first, second, linear = PLANES[plane]
+
+    if len(position) <= max(first, second) or None in (position[first], position[second], target[first], target[second]):
+        return None
+
+    x = target[first] - position[first]
+    y = target[second] - position[second]
+
+    if b"R" in values:
+        if x == 0 and y == 0:
+            return INVALID_TARGET
+
+        r = values[b"R"]
+        if 4 * r * r - x * x - y * y < 0:
+            return ARC_RADIUS_ERROR
+
+        return None
+
+    i = values.get(b"IJK"[first:first + 1], 0.0)
+    j = values.get(b"IJK"[second:second + 1], 0.0)
+
+    radius = math.hypot(i, j)
+    x = x - i
+    y = y - j
+    delta = abs(math.hypot(x, y) - radius)
+
+    if delta > ARC_TOLERANCE:
+        if delta > ARC_ERROR or delta > ARC_RELATIVE_ERROR * radius:
+            return INVALID_TARGET
+
+    return None
+
+
+def validate(path, validator=None):
+    # validator is a Validator set up for the machine (stock grbl if not)
+    if validator is None:
+        validator = Validator()
+
+    if os.path.getsize(path) > 0:
+        with open(path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for chunk in extents.chunks(mm):
+                    validator.feed_chunk(chunk)
+
+    return validator
+
@@ -0,0 +1,13 @@
+import os
+import sys
+import types
+
+# the plugin's __init__ needs octoprint -- the modules under test do not, so
+# they are imported from a bare package instead
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = "octoprint_bettergrblsupport"
+
+if not PACKAGE in sys.modules:
+    package = types.ModuleType(PACKAGE)
+    package.__path__ = [os.path.join(ROOT, PACKAGE)]
+    sys.modules[PACKAGE] = package
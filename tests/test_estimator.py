@@ -0,0 +1,81 @@
+import math
+
+import pytest
+
+from octoprint_bettergrblsupport import estimator
+
+
+PROFILE = estimator.MachineProfile(rates=(6000, 6000, 600), accelerations=(100, 100, 50), junctionDeviation=.01)
+
+
+def test_limits():
+    assert PROFILE.limits((1.0, 0.0, 0.0)) == (6000.0, 100.0)
+    assert PROFILE.limits((0.0, 0.0, -1.0)) == (600.0, 50.0)
+
+    rate, acceleration = PROFILE.limits((math.sqrt(.5), math.sqrt(.5), 0.0))
+    assert rate == pytest.approx(6000 / math.sqrt(.5))
+    assert acceleration == pytest.approx(100 / math.sqrt(.5))
+
+
+def test_fingerprint():
+    assert PROFILE.fingerprint() == estimator.MachineProfile((6000, 6000, 600), (100, 100, 50), .01).fingerprint()
+    assert PROFILE.fingerprint() != estimator.MachineProfile((6000, 6000, 600), (100, 100, 50), .02).fingerprint()
+
+
+def test_trapezoid():
+    # 10 mm/sec nominal at 100 mm/sec^2 takes .5 mm (and .1 sec) to get up to speed -- and to stop
+    assert estimator.trapezoid_time(100, 0, 0, 100, 100) == pytest.approx(.2 + 99 / 10)
+
+    # too short to get there -- a triangle
+    assert estimator.trapezoid_time(.02, 0, 0, 100, 100) == pytest.approx(2 * math.sqrt(.01 / 50))
+
+
+def test_junction():
+    straight = (1.0, 0.0, 0.0)
+
+    assert estimator.junction_speed_sqr(PROFILE, straight, straight, 100) == float("inf")
+    assert estimator.junction_speed_sqr(PROFILE, straight, (-1.0, 0.0, 0.0), 100) == 0.0
+    assert 0 < estimator.junction_speed_sqr(PROFILE, straight, (0.0, 1.0, 0.0), 100) < float("inf")
+
+
+def test_single_move():
+    job = estimator.Estimator(PROFILE)
+    job.move(1, 100, (1.0, 0.0, 0.0), feed=600)
+
+    assert job.finish(2) == pytest.approx(estimator.trapezoid_time(100, 0, 0, 100, 100))
+    assert len(job.times) == 2
+    assert job.times[0] == 0
+
+
+def test_straight_line_does_not_stop():
+    # two halves of a line run as fast as the whole of it
+    whole = estimator.Estimator(PROFILE)
+    whole.move(1, 100, (1.0, 0.0, 0.0), feed=600)
+
+    halves = estimator.Estimator(PROFILE)
+    halves.move(1, 50, (1.0, 0.0, 0.0), feed=600)
+    halves.move(2, 50, (1.0, 0.0, 0.0), feed=600)
+
+    assert halves.finish(3) == pytest.approx(whole.finish(2))
+
+
+def test_times_are_per_line():
+    job = estimator.Estimator(PROFILE)
+    job.move(1, 10, (1.0, 0.0, 0.0), feed=600)
+    job.dwell(3, 2)
+    job.move(4, 10, (-1.0, 0.0, 0.0), feed=600)
+    job.finish(6)
+
+    times = list(job.times)
+
+    assert len(times) == 6
+    assert times == sorted(times)
+    assert times[3] - times[2] == pytest.approx(2)
+    assert times[5] == pytest.approx(job.total)
+
+
+def test_rapid_runs_at_max_rate():
+    job = estimator.Estimator(PROFILE)
+    job.move(1, 1000, (1.0, 0.0, 0.0))
+
+    assert job.finish(2) == pytest.approx(estimator.trapezoid_time(1000, 0, 0, 100 ** 2, 100))
@@ -0,0 +1,93 @@
+import pytest
+
+from octoprint_bettergrblsupport import extents
+
+
+def scan(tmp_path, text, positioning=0):
+    path = tmp_path / "job.gcode"
+    path.write_text(text)
+    return extents.scan(str(path), positioning=positioning, workers=1)
+
+
+def test_absolute(tmp_path):
+    result = scan(tmp_path, "G21 G90\nG0 X0 Y0\nG1 X20 Y10 F300\nG1 X-5\n")
+
+    assert result.bounds() == (-5.0, 20.0, 0.0, 10.0)
+    assert result.width() == 25
+    assert result.length() == 10
+    assert result.lines == 4
+
+
+def test_relative(tmp_path):
+    result = scan(tmp_path, "G91\nG1 X10 Y0 F300\nG1 Y5\nG1 X-20\n")
+    assert result.bounds() == (-10.0, 10.0, 0.0, 5.0)
+
+    # an axis only counts once something moves it
+    result = scan(tmp_path, "G91\nG1 X10 F300\nG1 Y5\n")
+    assert result.bounds() == (10.0, 10.0, 5.0, 5.0)
+
+    result = scan(tmp_path, "G1 X10 F300\nG1 X-20\n", positioning=1)
+    assert result.summary()["bounds"] == [-10.0, 10.0, 0.0, 0.0]
+
+
+def test_inches(tmp_path):
+    result = scan(tmp_path, "G20 G90\nG0 X0 Y0\nG1 X1 Y2 F10\n")
+    assert result.bounds() == pytest.approx((0.0, 25.4, 0.0, 50.8))
+
+
+def test_arc(tmp_path):
+    # a half circle over the top -- y goes out to the radius
+    result = scan(tmp_path, "G90\nG0 X0 Y0\nG2 X10 Y0 I5 J0 F300\n")
+    assert result.bounds() == pytest.approx((0.0, 10.0, 0.0, 5.0))
+
+    result = scan(tmp_path, "G90\nG0 X0 Y0\nG3 X10 Y0 R5 F300\n")
+    assert result.bounds() == pytest.approx((0.0, 10.0, -5.0, 0.0))
+
+
+def test_comments_and_non_motion(tmp_path):
+    result = scan(tmp_path, "G90\nG0 X0 Y0 (X100)\nG1 X10 Y10 F300 ; Y-100\nG28 X50\nG92 X0 Y0\n")
+    assert result.bounds() == (0.0, 10.0, 0.0, 10.0)
+
+
+def test_origin(tmp_path):
+    assert scan(tmp_path, "G90\nG0 X0 Y0\nG1 X20 Y20 F300\n").origin() == "grblBottomLeft"
+    assert scan(tmp_path, "G90\nG0 X-10 Y-10\nG1 X10 Y10 F300\n").origin() == "grblCenter"
+    assert scan(tmp_path, "G90\nG0 X0 Y0\nG1 X-20 Y-20 F300\n").origin() == "grblTopRight"
+
+
+@pytest.mark.parametrize("text", [
+    "G91\nG1 X5 Y5 F300\nG1 X-2\nG90\nG1 X30 Y-3\nG91\nG1 X-40\n",
+    "G91\nG1 X-3 F300\nG1 Y7\nG2 X4 Y0 I2 J0\nG1 X1 Y-9\nG1 X2 Y2\n",
+    "G90\nG0 X1 Y1\nG91\nG1 X2 F300\nG1 Y-6\nG1 X-9 Y3\n",
+])
+def test_merge_matches_one_scan(tmp_path, text):
+    # a parallel scan hands every range to a worker that does not know where
+    # the machine is -- stitched back together it has to agree with one scan
+    expected = scan(tmp_path, text)
+
+    lines = text.splitlines(True)
+
+    for split in range(1, len(lines)):
+        head = extents.Extents()
+        extents.scan_chunk(head, "".join(lines[:split]).encode())
+
+        part = extents.Extents()
+        part.set_modal(head.modal())
+        extents.scan_chunk(part, "".join(lines[split:]).encode())
+
+        if part.dependent:
+            continue
+
+        head.merge(part)
+
+        assert head.bounds() == pytest.approx(expected.bounds())
+        assert (head.x, head.y) == pytest.approx((expected.x, expected.y))
+        assert head.lines == expected.lines
+
+
+def test_nothing_moved(tmp_path):
+    result = scan(tmp_path, "")
+    assert result.summary() == dict(length=0, width=0, origin="", lines=0, bounds=[0.0, 0.0, 0.0, 0.0])
+
+    result = scan(tmp_path, "G90\nG0 X5\n")
+    assert (result.width(), result.length()) == (0, 0)
@@ -0,0 +1,136 @@
+import pytest
+
+from octoprint_bettergrblsupport import estimator
+from octoprint_bettergrblsupport import optimizer
+from octoprint_bettergrblsupport import simplifier
+
+
+def optimize(text, **kwargs):
+    rewriter = optimizer.Optimizer(**kwargs)
+    return rewriter.feed_chunk(text.encode()).decode(), rewriter
+
+
+@pytest.mark.parametrize("value, expected", [
+    (b"+010.500", b"10.5"),
+    (b"-0.25", b"-.25"),
+    (b"000", b"0"),
+    (b"-0.000", b"0"),
+    (b"12", b"12"),
+])
+def test_normalize(value, expected):
+    assert optimizer.normalize(value) == expected
+
+
+def test_decimals():
+    assert optimizer.decimals(80) == optimizer.MIN_DECIMALS
+    assert optimizer.decimals(250, inches=True) == 4
+    assert optimizer.decimals(5000) == 4
+
+
+def test_leading_modes_are_kept():
+    # grbl keeps its modes between jobs -- the file has to set them itself
+    output, rewriter = optimize("G21 G90 ; hello\n")
+
+    assert output == "G21G90\n"
+    assert rewriter.lineMap.tolist() == [1]
+
+
+def test_unknown_distance_mode_is_not_rounded():
+    output, rewriter = optimize("G1 X1.123456 F100\nG1 X1.123456\n")
+    assert output == "G1X1.123456F100\nX1.123456\n"
+
+
+def test_repeats_are_dropped():
+    output, rewriter = optimize("G21 G90 G94\nG0 X1.00000 Y2\nG1 X1 Y2 F100\nG1 X3 F100\nG21 G90\nG1 X3\n")
+
+    assert output == "G21G90G94\nG0X1Y2\nG1F100\nX3\n"
+    assert rewriter.lineMap.tolist() == [1, 2, 3, 4]
+    assert rewriter.lines == 6
+    assert rewriter.written == 4
+
+
+def test_rounds_to_a_step():
+    output, rewriter = optimize("G21 G90\nG1 X1.23456789 Y-0.0001 F100\n", stepsPerMm=(100, 100, 100))
+    assert output == "G21G90\nG1X1.235Y0F100\n"
+
+
+def test_units_change_resends_feed():
+    output, rewriter = optimize("G21 G90 G94\nG1 X1 F100\nG20\nG1 X2 F100\n")
+    assert output == "G21G90G94\nG1X1F100\nG20\nX2F100\n"
+
+
+def test_inverse_time_keeps_every_feed():
+    output, rewriter = optimize("G21 G90 G93\nG1 X1 F2\nG1 X2 F2\n")
+    assert output == "G21G90G93\nG1X1F2\nX2F2\n"
+
+
+def test_relative_moves_are_left_alone():
+    output, rewriter = optimize("G21 G91 G94\nG1 X0.10 F100\nG1 X0\nG1 X0.1\n")
+    assert output == "G21G91G94\nG1X.1F100\nX.1\n"
+
+
+def test_arcs_keep_their_end_point():
+    output, rewriter = optimize("G21 G90 G94\nG0 X0 Y0\nG2 X0 Y0 I5 J0 F100\n")
+    assert output == "G21G90G94\nG0X0Y0\nG2X0Y0I5J0F100\n"
+
+
+def test_unknown_lines_pass_through():
+    output, rewriter = optimize("G21 G90\nG0 X1\n$H\nG0 X1\nG4 P1\nG0 X1\n")
+
+    # after anything we can not follow the position (and motion) is forgotten
+    assert output == "G21G90\nG0X1\n$H\nG0X1\nG4P1\nG0X1\n"
+
+
+class Broken(simplifier.Simplifier):
+    def simplify_run(self, anchor, points, feed, inches=False):
+        raise ValueError("broken")
+
+
+def test_failed_line():
+    rewriter = optimizer.Optimizer(simplifier=Broken(.1, estimator.MachineProfile()))
+
+    with pytest.raises(ValueError):
+        rewriter.feed_chunk(b"G21 G90 G94\nG0 X0 Y0\nG1 X0 Y0 F100\nG1 X1 Y1\nG1 X2 Y2\nG0 Z5\n")
+
+    # nothing of the chunk is counted
+    assert rewriter.failedLine == 6
+    assert rewriter.lines == 0
+    assert len(rewriter.lineMap) == 0
+
+
+def test_simplified_runs():
+    rewriter = optimizer.Optimizer(simplifier=simplifier.Simplifier(.05, estimator.MachineProfile()))
+
+    moves = "".join("G1 X{:.3f} Y{:.3f}\n".format(n * .1, (n % 2) * .001) for n in range(1, 50))
+    output = rewriter.feed_chunk(("G21 G90 G94\nG0 X0 Y0\nG1 X0 Y0 F500\n" + moves + "G0 Z5\n").encode())
+
+    assert output == b"G21G90G94\nG0X0Y0\nG1F500\nX4.9Y.001\nG0Z5\n"
+    assert rewriter.lineMap.tolist() == [1, 2, 3, 52, 53]
+    assert rewriter.summary()["simplified"]["removed"] == 48
+
+
+def test_simplifier_needs_known_units():
+    rewriter = optimizer.Optimizer(simplifier=simplifier.Simplifier(.05, estimator.MachineProfile()))
+
+    moves = "".join("G1 X{:.3f} Y0\n".format(n * .1) for n in range(1, 10))
+    output = rewriter.feed_chunk(("G90 G94\nG0 X0 Y0\nG1 X0 Y0 F500\n" + moves).encode())
+
+    assert output.count(b"\n") == 12
+
+
+def test_passthrough_keeps_the_map():
+    rewriter = optimizer.Optimizer()
+    rewriter.feed_chunk(b"G21 G90\nG0 X1\n")
+
+    assert rewriter.passthrough(b"G0 X2\nG0 X3\n") == b"G0 X2\nG0 X3\n"
+    assert rewriter.lineMap.tolist() == [1, 2, 3, 4]
+
+
+def test_original_lines(tmp_path):
+    rewriter = optimizer.Optimizer()
+    rewriter.feed_chunk(b"G21 G90\n(comment)\n\nG0 X1\n")
+
+    path = tmp_path / "job.bgsm"
+    rewriter.write_map(str(path))
+
+    assert optimizer.original_lines(str(path), [1, 2, 3, None]) == [1, 4, None, None]
@@ -0,0 +1,37 @@
+import pytest
+
+from octoprint_bettergrblsupport import overrides
+
+
+COMMANDS = ("R", "+", "-", "p", "m")
+
+
+def replay(current, sequence):
+    steps = dict(zip(COMMANDS, (None, 10, -10, 1, -1)))
+
+    for byte in sequence:
+        delta = steps[byte]
+        current = 100 if delta is None else overrides.clamp(current + delta)
+
+    return current
+
+
+@pytest.mark.parametrize("current, target, steps", [
+    (100, 100, 0),
+    (100, 110, 1),
+    (100, 89, 2),
+    (150, 100, 1),
+    (103, 150, 6),
+    (200, 10, 10),
+    (10, 200, 11),
+])
+def test_sequence(current, target, steps):
+    result = overrides.sequence(current, target, COMMANDS)
+
+    assert replay(current, result) == overrides.clamp(target)
+    assert len(result) == steps
+
+
+def test_sequence_clamps():
+    assert replay(100, overrides.sequence(100, 500, COMMANDS)) == overrides.MAXIMUM
+    assert replay(100, overrides.sequence(100, 0, COMMANDS)) == overrides.MINIMUM
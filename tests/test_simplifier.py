@@ -0,0 +1,65 @@
+import pytest
+
+from octoprint_bettergrblsupport import estimator
+from octoprint_bettergrblsupport import simplifier
+
+
+def test_straight_line():
+    xs = [float(n) for n in range(10)]
+    ys = [0.0] * 10
+
+    assert simplifier.simplify(xs, ys, .01) == [0, 9]
+
+
+def test_keeps_corners():
+    xs = [0.0, 1.0, 2.0, 2.0, 2.0]
+    ys = [0.0, 0.0, 0.0, 1.0, 2.0]
+
+    assert simplifier.simplify(xs, ys, .01) == [0, 2, 4]
+
+
+def test_tolerance():
+    xs = [0.0, 1.0, 2.0]
+    ys = [0.0, .05, 0.0]
+
+    assert simplifier.simplify(xs, ys, .1) == [0, 2]
+    assert simplifier.simplify(xs, ys, .01) == [0, 1, 2]
+
+
+def test_segment_distances():
+    # squared -- and past either end it is the distance to that end
+    distances = simplifier.segment_distances([0.0, 1.0, -1.0, 3.0, 2.0], [0.0, 1.0, 0.0, 0.0, 0.0], 0, 4)
+    assert distances == pytest.approx([1.0, 1.0, 1.0])
+
+    # a run that comes back to where it started
+    assert simplifier.segment_distances([0.0, 3.0, 0.0], [0.0, 4.0, 0.0], 0, 2) == pytest.approx([25.0])
+
+
+def test_simplify_run():
+    rewriter = simplifier.Simplifier(.05, estimator.MachineProfile())
+    points = [(b"%.3f" % (n * .1), b"0", n) for n in range(1, 20)]
+
+    assert rewriter.simplify_run((0.0, 0.0), points, 500.0) == [points[-1]]
+    assert rewriter.runs == 1
+    assert rewriter.removed == 18
+    assert rewriter.saved > 0
+
+    summary = rewriter.summary()
+    assert summary["runs"] == 1
+    assert summary["removed"] == 18
+
+
+def test_simplify_run_in_inches():
+    # .05mm is well under a thou -- none of these points are within it
+    rewriter = simplifier.Simplifier(.05, estimator.MachineProfile())
+    points = [(b"1", b".01", 1), (b"2", b"0", 2)]
+
+    assert rewriter.simplify_run((0.0, 0.0), points, 10.0, inches=True) == points
+    assert rewriter.runs == 0
+
+
+def test_short_run():
+    rewriter = simplifier.Simplifier(.05, estimator.MachineProfile())
+    points = [(b"1", b"0", 1)]
+
+    assert rewriter.simplify_run((0.0, 0.0), points, 500.0) == points
@@ -0,0 +1,50 @@
+from octoprint_bettergrblsupport import status
+
+
+def test_report():
+    report = status.StatusParser().parse("<Run|MPos:1.000,2.000,-3.000|Bf:15,128|Ln:7|FS:3000,500|Pn:XZ|A:SF>")
+
+    assert report.state == "Run"
+    assert report.mode == "MPos"
+    assert report.mpos == (1.0, 2.0, -3.0)
+    assert report.wpos is None
+    assert (report.blocks, report.rx, report.line) == (15, 128, 7)
+    assert (report.feed, report.speed) == (3000.0, 500.0)
+    assert report.pins == "XZ"
+    assert report.accessories == "SF"
+
+
+def test_not_a_report():
+    assert status.StatusParser().parse("ok") is None
+    assert status.StatusParser().parse("<Idle|FS:0,0>") is None
+
+
+def test_work_offset_is_remembered():
+    parser = status.StatusParser()
+
+    parser.parse("<Idle|MPos:10.000,10.000,0.000|FS:0,0|WCO:5.000,2.000,0.000>")
+    report = parser.parse("<Idle|MPos:20.000,10.000,0.000|FS:0,0>")
+
+    assert report.wco == (5.0, 2.0, 0.0)
+    assert report.wpos == (15.0, 8.0, 0.0)
+
+
+def test_overrides_are_only_reported_when_sent():
+    parser = status.StatusParser()
+
+    report = parser.parse("<Run|MPos:0.000,0.000,0.000|FS:0,0|Ov:150,100,90>")
+    assert report.overrides == (150, 100, 90)
+    assert report.overridesReported
+
+    # the last ones grbl told us about -- but not news
+    report = parser.parse("<Run|MPos:0.000,0.000,0.000|FS:0,0>")
+    assert report.overrides == (150, 100, 90)
+    assert not report.overridesReported
+
+
+def test_grbl_zero_dot_nine():
+    report = status.StatusParser().parse("<Idle,MPos:1.000,2.000,3.000,WPos:0.000,0.000,0.000>")
+
+    assert report.state == "Idle"
+    assert report.mpos == (1.0, 2.0, 3.0)
+    assert report.wpos == (0.0, 0.0, 0.0)
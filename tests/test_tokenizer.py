@@ -0,0 +1,48 @@
+from octoprint_bettergrblsupport import tokenizer
+
+
+def test_words():
+    line = tokenizer.tokenize("g1 X10 y-2.5 F300")
+
+    assert line.has("G")
+    assert line.get("X") == 10.0
+    assert line.get("Y") == -2.5
+    assert line.text("F") == "300"
+    assert line.get("Z") is None
+    assert line.get("Z", 0) == 0
+
+
+def test_last_word_wins():
+    line = tokenizer.tokenize("G0 X1 X2")
+
+    assert line.get("X") == 2.0
+    assert line.codes("X") == [1.0, 2.0]
+
+
+def test_comments_are_not_words():
+    line = tokenizer.tokenize("G1 X1 (X5 Y5) Y2 ; Z9")
+
+    assert line.codes("X") == [1.0]
+    assert line.get("Y") == 2.0
+    assert not line.has("Z")
+
+
+def test_first():
+    assert tokenizer.tokenize("  M3 S1000").first()[0] == "M"
+    assert tokenizer.tokenize("(setup) M3 S1000").first() is None
+    assert tokenizer.tokenize("").first() is None
+
+
+def test_reassemble_keeps_everything_else():
+    text = "g1  x10 Y20 (keep me) f300"
+    line = tokenizer.tokenize(text)
+
+    assert not line.is_changed()
+    assert line.reassemble() == text
+
+    line.set("X", 12.5)
+    line.set("Z", 1)
+    line.prepend("N5 ")
+
+    assert line.is_changed()
+    assert str(line) == "N5 g1  x12.500 Y20 (keep me) f300"
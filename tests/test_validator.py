@@ -0,0 +1,59 @@
+import pytest
+
+from octoprint_bettergrblsupport import validator
+
+
+def errors(text, **kwargs):
+    checker = validator.Validator(**kwargs)
+    checker.feed_chunk(text.encode())
+    return checker.errors
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("G38.2 Z-10\n", [(1, validator.UNDEFINED_FEED_RATE)]),
+    ("G1 X1 F0\n", [(1, validator.UNDEFINED_FEED_RATE)]),
+    ("G2 F100\n", [(1, validator.NO_AXIS_WORDS)]),
+    ("G2 I5 F100\n", [(1, validator.NO_AXIS_WORDS)]),
+    ("G1\n", [(1, validator.UNDEFINED_FEED_RATE)]),
+    ("G93 G1 X1\n", [(1, validator.UNDEFINED_FEED_RATE)]),
+    ("G0\nG0 X1\nG1 F100\nG1\n", []),
+    ("G38.2 Z-10 F100\n", []),
+    ("G1 X1 F0.5\n", []),
+])
+def test_motion(text, expected):
+    assert errors(text) == expected
+
+
+def test_zero_feed_is_not_cached_by_shape():
+    # same shape as the line before it -- only the F value differs
+    assert errors("G1 X1 F100\nG1 X2 F0\nG1 X3 F100\n") == [(2, validator.UNDEFINED_FEED_RATE)]
+
+
+def test_zero_feed_clears_the_feed():
+    assert errors("G1 X1 F100\nF0\nG1 X2\n") == [(3, validator.UNDEFINED_FEED_RATE)]
+
+
+def test_arc():
+    assert errors("G1 F100\nG2 X10 I5\nG3 X0 R5\n") == []
+    assert errors("G0 X0 Y0\nG1 F100\nG2 X10 I4\n") == [(3, validator.INVALID_TARGET)]
+
+
+def test_words():
+    assert errors("G1 X1 X2 F100\n") == [(1, validator.WORD_REPEATED)]
+    assert errors("G17 G18\n") == [(1, validator.MODAL_GROUP_VIOLATION)]
+    assert errors("G0 G1 X1 F100\n") == [(1, validator.AXIS_COMMAND_CONFLICT)]
+    assert errors("G1 X F100\n") == [(1, validator.BAD_NUMBER_FORMAT)]
+
+
+def test_long_line():
+    assert errors("G0 X1 ({})\nG0 X2\n".format("a" * 100)) == []
+    assert errors("G0 X{}\n".format("1" * 100)) == [(1, validator.OVERFLOW)]
+
+
+def test_state_carries_across_chunks():
+    checker = validator.Validator()
+    checker.feed_chunk(b"G1 X1 F100\n")
+    checker.feed_chunk(b"G2 X3 I1\n")
+
+    assert checker.errors == []
+    assert checker.lines == 2